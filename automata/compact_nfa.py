@@ -0,0 +1,81 @@
+from array import array
+
+from automata.dense_dfa import DenseDFA, accepting_bitmap
+from automata.state_machine import Automaton, State
+
+
+class CompactNFA:
+    """
+    A compact automaton (NFA or DFA) where states and symbols are numbered and the transitions are an edge list.
+
+    A CompactNFA is comprised of:
+    1. A list with the ID of each state, the index of a state in this list is the number of the state
+    2. A list with the symbols, in the order they were found, the index of a symbol is the number of the symbol
+    3. Three parallel arrays (sources, symbols, targets), transition i goes from sources[i] to targets[i]
+       with symbols[i]
+    4. A bytearray with a 1 for every final state
+    5. The number of the initial state
+
+    It is what the parser builds while reading a file, it can then be turned into an Automaton or a DenseDFA.
+    """
+    def __init__(self, state_ids: list, alphabet: list, sources: array, symbols: array, targets: array,
+                 finals: bytearray, initial_state: int):
+
+        self.state_ids = state_ids
+        self.alphabet = alphabet
+        self.sources = sources
+        self.symbols = symbols
+        self.targets = targets
+        self.finals = finals
+        self.initial_state = initial_state
+
+    @property
+    def state_count(self) -> int:
+        return len(self.state_ids)
+
+    @property
+    def transition_count(self) -> int:
+        return len(self.sources)
+
+    def to_automaton(self) -> Automaton:
+        """
+        Builds the Automaton of State objects, ordered like Automaton.__init__ would order them: the initial state
+        first and then by ID
+        """
+        states = [State(state_id, is_initial=(i == self.initial_state), is_final=bool(self.finals[i]))
+                  for i, state_id in enumerate(self.state_ids)]
+
+        alphabet = self.alphabet
+        for source, symbol, target in zip(self.sources, self.symbols, self.targets):
+            states[source].transitions.add(alphabet[symbol], states[target])
+
+        initial_state = states[self.initial_state]
+        ordered_states = sorted(states, key=lambda state: (not state.is_initial, state.state_id))
+
+        return Automaton.from_trusted_states(ordered_states, initial_state, tuple(sorted(alphabet)))
+
+    def to_dense_dfa(self) -> DenseDFA:
+        """
+        Builds a DenseDFA with the states in the same order and the alphabet sorted.
+
+        Raises a ValueError if the automaton is not deterministic, missing transitions are allowed.
+        """
+        alphabet = sorted(self.alphabet)
+        alphabet_size = len(alphabet)
+        position = {symbol: i for i, symbol in enumerate(alphabet)}
+        symbol_map = [position[symbol] for symbol in self.alphabet]
+
+        transitions = array("i", [-1]) * (self.state_count * alphabet_size)
+        for source, symbol, target in zip(self.sources, self.symbols, self.targets):
+            if self.alphabet[symbol] == " ":
+                raise ValueError("State {} has an epsilon transition, convert the NFA to a DFA first"
+                                 .format(self.state_ids[source]))
+
+            cell = source * alphabet_size + symbol_map[symbol]
+            if transitions[cell] not in (-1, target):
+                raise ValueError("State {} is not deterministic for symbol '{}', convert the NFA to a DFA first"
+                                 .format(self.state_ids[source], self.alphabet[symbol]))
+            transitions[cell] = target
+
+        return DenseDFA(list(self.state_ids), tuple(alphabet), transitions,
+                        accepting_bitmap(self.finals), self.initial_state)
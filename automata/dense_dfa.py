@@ -0,0 +1,170 @@
+from array import array
+
+from automata.state_machine import Automaton, State
+
+
+class DenseDFA:
+    """
+    A compact DFA where states and symbols are numbered instead of being State objects.
+
+    A DenseDFA is comprised of:
+    1. A list with the ID of each state, the index of a state in this list is the number of the state
+    2. A tuple with the alphabet, the index of a symbol in this tuple is the number of the symbol
+    3. A flat table of transitions of size state_count * alphabet_size, where
+       transitions[state * alphabet_size + symbol] is the number of the target state, or -1 if the state has no
+       transition for the symbol (an implicit reject)
+    4. A bitmap with one bit per state telling whether the state is final or not
+    5. The number of the initial state
+
+    A state costs alphabet_size * 4 bytes plus its ID, instead of a State object with a dict of lists.
+    """
+    def __init__(self, state_ids: list, alphabet: tuple, transitions: array, accepting: bytearray,
+                 initial_state: int = 0):
+
+        state_count = len(state_ids)
+        if len(transitions) != state_count * len(alphabet):
+            raise ValueError("The transition table must have {} entries but it has {}"
+                             .format(state_count * len(alphabet), len(transitions)))
+
+        if len(accepting) != (state_count + 7) // 8:
+            raise ValueError("The accepting bitmap must have {} bytes but it has {}"
+                             .format((state_count + 7) // 8, len(accepting)))
+
+        if not 0 <= initial_state < state_count:
+            raise ValueError("The initial state {} is not a state of the automaton".format(initial_state))
+
+        self.state_ids = state_ids
+        self.alphabet = tuple(alphabet)
+        self.transitions = transitions
+        self.accepting = accepting
+        self.initial_state = initial_state
+
+    @property
+    def state_count(self) -> int:
+        return len(self.state_ids)
+
+    @property
+    def alphabet_size(self) -> int:
+        return len(self.alphabet)
+
+    def target(self, state: int, symbol: int) -> int:
+        return self.transitions[state * len(self.alphabet) + symbol]
+
+    def is_final(self, state: int) -> bool:
+        return bool(self.accepting[state >> 3] >> (state & 7) & 1)
+
+    def symbol_indexes(self) -> dict:
+        return {symbol: i for i, symbol in enumerate(self.alphabet)}
+
+    def symbol_classes(self) -> (list, list):
+        """
+        Partitions the alphabet into classes of symbols that take every state to the same target, see
+        symbol_classes(). With byte or Unicode alphabets most of the columns of the table are usually alike
+        """
+        alphabet_size = len(self.alphabet)
+        view = memoryview(self.transitions)
+
+        return symbol_classes(view[symbol::alphabet_size].tobytes() for symbol in range(alphabet_size))
+
+    def restrict_symbols(self, symbols: list) -> "DenseDFA":
+        """
+        Builds the DenseDFA with the columns of some of the symbols only, e.g. one symbol of each class
+        :param symbols: the numbers of the symbols to keep, in the order they get in the new alphabet
+        """
+        if list(symbols) == list(range(len(self.alphabet))):
+            return self
+
+        alphabet_size = len(self.alphabet)
+        transitions = self.transitions
+        restricted = array("i")
+        for offset in range(0, len(transitions), alphabet_size):
+            restricted.extend([transitions[offset + symbol] for symbol in symbols])
+
+        return DenseDFA(self.state_ids, tuple(self.alphabet[symbol] for symbol in symbols), restricted,
+                        self.accepting, self.initial_state)
+
+    @classmethod
+    def from_automaton(cls, automaton: Automaton) -> "DenseDFA":
+        """
+        Packs a DF Automaton into a DenseDFA, the states keep the order they have in the Automaton.
+
+        States that have no transition for a symbol get -1 in the table.
+        :param automaton: a DF Automaton, it may be partial
+        :return: the equivalent DenseDFA
+        """
+        states = automaton.states
+        alphabet = automaton.alphabet
+        state_index = {state: i for i, state in enumerate(states)}
+
+        transitions = array("i")
+        for state in states:
+            for symbol in alphabet:
+                targets = state.transitions.get(symbol)
+
+                if not targets:
+                    transitions.append(-1)
+                elif len(targets) == 1 and symbol != " ":
+                    transitions.append(state_index[targets[0]])
+                else:
+                    raise ValueError("State {} is not deterministic for symbol '{}', convert the NFA to a DFA first"
+                                     .format(state.state_id, symbol))
+
+        accepting = accepting_bitmap([state.is_final for state in states])
+
+        return cls([state.state_id for state in states], alphabet, transitions, accepting,
+                   state_index[automaton.initial_state])
+
+    def to_automaton(self) -> Automaton:
+        """
+        Unpacks the DenseDFA into an Automaton of State objects, in the same order and with the same alphabet.
+        :return: the equivalent Automaton
+        """
+        alphabet = self.alphabet
+        alphabet_size = len(alphabet)
+        states = [State(state_id, is_initial=(i == self.initial_state), is_final=self.is_final(i))
+                  for i, state_id in enumerate(self.state_ids)]
+
+        transitions = self.transitions
+        for i, state in enumerate(states):
+            offset = i * alphabet_size
+            for symbol_index, symbol in enumerate(alphabet):
+                target = transitions[offset + symbol_index]
+                if target != -1:
+                    state.transitions[symbol] = [states[target]]
+
+        return Automaton.from_trusted_states(states, states[self.initial_state], alphabet)
+
+
+def accepting_bitmap(flags: list) -> bytearray:
+    """
+    Packs a list of booleans in a bitmap of one bit per element, the bit of element i is (i & 7) of byte (i >> 3)
+    """
+    bitmap = bytearray((len(flags) + 7) // 8)
+
+    for i, flag in enumerate(flags):
+        if flag:
+            bitmap[i >> 3] |= 1 << (i & 7)
+
+    return bitmap
+
+
+def symbol_classes(columns) -> (list, list):
+    """
+    Groups symbols into classes of symbols with the same column, i.e. that behave the same in every state, so that
+    the algorithms can look at one symbol per class instead of every symbol
+    :param columns: a hashable description of the transitions of every symbol, e.g. its column of the table
+    :return: a list with the number of the class of every symbol, and a list with the first symbol of every class.
+             The classes are numbered in the order of their first symbol
+    """
+    class_numbers = {}
+    class_of = []
+    representatives = []
+
+    for symbol, column in enumerate(columns):
+        number = class_numbers.get(column)
+        if number is None:
+            number = class_numbers[column] = len(representatives)
+            representatives.append(symbol)
+        class_of.append(number)
+
+    return class_of, representatives
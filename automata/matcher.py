@@ -0,0 +1,577 @@
+from array import array
+
+try:
+    import numpy
+    IS_NUMPY_AVAILABLE = True
+except ImportError:
+    IS_NUMPY_AVAILABLE = False
+
+from automata.dense_dfa import DenseDFA, symbol_classes
+from automata.state_machine import Automaton
+from utils.automata_utils import epsilon_free_transitions
+
+EPSILON = " "
+
+
+def compile_automaton(automaton: Automaton, max_cached_states: int = 10000):
+    """
+    Compiles an Automaton into a matcher that can validate many strings without walking State objects.
+
+    DFA (including partial ones) get a DFAMatcher, which does a single table lookup per character. NFA get a
+    LazyDFAMatcher, which builds the DFA states as the input reaches them.
+    :param automaton: the Automaton to compile
+    :param max_cached_states: how many DFA states a LazyDFAMatcher can keep
+    :return: a DFAMatcher or a LazyDFAMatcher
+    """
+    if is_deterministic(automaton):
+        return DFAMatcher(DenseDFA.from_automaton(automaton))
+
+    return LazyDFAMatcher(automaton, max_cached_states)
+
+
+def is_deterministic(automaton: Automaton) -> bool:
+    """
+    Tells whether an Automaton has at most one transition per symbol and no epsilon transitions, unlike is_dfa()
+    missing transitions are allowed
+    """
+    for state in automaton.states:
+        for symbol, targets in state.transitions.items():
+            if len(targets) > 1 or (targets and symbol == EPSILON):
+                return False
+
+    return True
+
+
+class DFAMatcher:
+    """
+    Matches strings against a DenseDFA.
+
+    The characters are mapped to symbol classes with a dict (for str) or a 256-entry list (for bytes, where each
+    byte stands for the character with the same code point), then every character costs one lookup in the
+    transition table. The table has a column per class of symbols that behave the same in every state (see
+    DenseDFA.symbol_classes), so big alphabets like bytes or Unicode ranges don't make it wider than it needs to be.
+    A table that is a memoryview, like the one of map_binary_dfa, keeps a column per symbol so that it isn't copied.
+    Symbols longer than one character can never match a single character, so they are ignored.
+
+    States from which no final state can be reached are dead: they are folded into -1 in the table, so that the
+    match stops as soon as the input gets into one.
+    """
+    def __init__(self, dfa: DenseDFA, find_dead_states: bool = True):
+        self.dfa = dfa
+        self._initial_state = dfa.initial_state
+        self._accepting = dfa.accepting
+
+        if isinstance(dfa.transitions, memoryview):
+            # A table mapped from a file (see map_binary_dfa) is used as it is, merging its columns would copy it
+            class_of = representatives = list(range(dfa.alphabet_size))
+        else:
+            class_of, representatives = dfa.symbol_classes()
+        self._alphabet_size = len(representatives)
+
+        self._symbol_codes = {}
+        self._byte_codes = [-1] * 256
+        for symbol, symbol_class in zip(dfa.alphabet, class_of):
+            if len(symbol) == 1:
+                self._symbol_codes[symbol] = symbol_class
+                if ord(symbol) < 256:
+                    self._byte_codes[ord(symbol)] = symbol_class
+
+        self._numpy_tables = None   # Built the first time accepts_many is called
+
+        self._table = dfa.restrict_symbols(representatives).transitions
+        if find_dead_states:
+            dead_states = _find_dead_states(dfa)
+
+            if dead_states[self._initial_state]:
+                self._initial_state = -1
+            elif any(dead_states):
+                self._table = array("i", (-1 if target == -1 or dead_states[target] else target
+                                          for target in self._table))
+
+    def matches(self, input_string) -> bool:
+        """
+        Tells whether the DFA recognizes the input
+        :param input_string: a str, or bytes/bytearray/memoryview
+        :return: True if the input is accepted, False otherwise
+        """
+        return self._is_accepting(self._advance(self._initial_state, input_string))
+
+    def session(self) -> "MatchSession":
+        """
+        Starts a MatchSession to match an input that comes in chunks
+        """
+        return MatchSession(self)
+
+    def _start(self) -> int:
+        return self._initial_state
+
+    def _advance(self, state: int, input_string) -> int:
+        """
+        Reads the input from a state
+        :return: the state the DFA is in after reading it, or -1 if it got into a dead state
+        """
+        if state < 0:
+            return -1
+
+        table = self._table
+        alphabet_size = self._alphabet_size
+
+        if isinstance(input_string, str):
+            symbol_codes = self._symbol_codes
+            for char in input_string:
+                code = symbol_codes.get(char)
+                if code is None:
+                    return -1
+
+                state = table[state * alphabet_size + code]
+                if state < 0:
+                    return -1
+        else:
+            byte_codes = self._byte_codes
+            for byte in memoryview(input_string).cast("B"):
+                code = byte_codes[byte]
+                if code < 0:
+                    return -1
+
+                state = table[state * alphabet_size + code]
+                if state < 0:
+                    return -1
+
+        return state
+
+    def _is_accepting(self, state: int) -> bool:
+        return state >= 0 and bool(self._accepting[state >> 3] >> (state & 7) & 1)
+
+    @staticmethod
+    def _is_dead(state: int) -> bool:
+        return state < 0
+
+    def accepts_many(self, input_strings, chunk_size: int = 65536):
+        """
+        Validates a batch of strings at once.
+
+        With numpy, the strings are packed into a matrix of symbol numbers padded to the longest string, and all of
+        the strings are advanced together one column at a time with a fancy-indexed lookup in the transition table.
+        A length mask keeps the shorter strings in the state they ended in. Without numpy, each string goes through
+        matches().
+        :param input_strings: an iterable of str, or of bytes-like objects, all of the same kind
+        :param chunk_size: how many strings are packed in a matrix at a time, it bounds the memory used
+        :return: a numpy array of booleans (a list of booleans without numpy), True where the string is accepted
+        """
+        if not IS_NUMPY_AVAILABLE:
+            return [self.matches(input_string) for input_string in input_strings]
+
+        input_strings = list(input_strings)
+        results = [self._accepts_chunk(input_strings[start:start + chunk_size])
+                   for start in range(0, len(input_strings), chunk_size)]
+
+        return numpy.concatenate(results) if results else numpy.zeros(0, dtype=bool)
+
+    def _accepts_chunk(self, input_strings: list):
+        row_offsets, accepting, code_lookup = self._batch_tables()
+        row_width = self._alphabet_size + 1
+        reject_state, unknown_code = self.dfa.state_count, self._alphabet_size
+
+        lengths = numpy.fromiter(map(len, input_strings), dtype=numpy.intp, count=len(input_strings))
+        max_length = int(lengths.max())
+        initial_state = self._initial_state if self._initial_state >= 0 else reject_state
+
+        # States are kept as the offset of their row in the flat table, which saves a multiplication per step
+        states = numpy.full(len(input_strings), initial_state * row_width, dtype=numpy.intp)
+
+        if max_length > 0:
+            if isinstance(input_strings[0], str):
+                code_points = numpy.frombuffer("".join(input_strings).encode("utf-32-le"), dtype="<u4")
+            else:
+                code_points = numpy.frombuffer(b"".join(input_strings), dtype=numpy.uint8)
+
+            known = code_points < len(code_lookup)
+            codes = numpy.where(known, code_lookup[numpy.where(known, code_points, 0)], unknown_code)
+
+            # Row i holds the symbol numbers of string i, padded with unknown_code after lengths[i]
+            length_mask = numpy.arange(max_length) < lengths[:, None]
+            code_matrix = numpy.full((len(input_strings), max_length), unknown_code, dtype=numpy.intp)
+            code_matrix[length_mask] = codes
+
+            for column in range(max_length):
+                next_states = row_offsets[states + code_matrix[:, column]]
+                states = numpy.where(length_mask[:, column], next_states, states)
+
+        return accepting[states // row_width]
+
+    def _batch_tables(self):
+        """
+        Builds (once) the numpy tables for accepts_many:
+        1. The transition table flattened, with an extra reject row and an extra column for unknown characters,
+           where each target is stored as the offset of its row
+        2. The accepting flag of every row
+        3. A lookup from code point to symbol number
+        """
+        if self._numpy_tables is None:
+            state_count, alphabet_size = self.dfa.state_count, self._alphabet_size
+            reject_state, unknown_code = state_count, alphabet_size
+
+            table = numpy.full((state_count + 1, alphabet_size + 1), reject_state, dtype=numpy.intp)
+            targets = numpy.asarray(self._table, dtype=numpy.intp).reshape(state_count, alphabet_size)
+            table[:state_count, :alphabet_size] = numpy.where(targets < 0, reject_state, targets)
+            row_offsets = table.ravel() * (alphabet_size + 1)
+
+            accepting = numpy.zeros(state_count + 1, dtype=bool)
+            accepting[:state_count] = numpy.unpackbits(numpy.frombuffer(bytes(self._accepting), dtype=numpy.uint8),
+                                                       bitorder="little")[:state_count].astype(bool)
+
+            code_lookup = numpy.full(max([256] + [ord(symbol) + 1 for symbol in self._symbol_codes]), unknown_code,
+                                     dtype=numpy.intp)
+            for symbol, code in self._symbol_codes.items():
+                code_lookup[ord(symbol)] = code
+
+            self._numpy_tables = (row_offsets, accepting, code_lookup)
+
+        return self._numpy_tables
+
+
+class NFAMatcher:
+    """
+    Matches strings against a NF Automaton.
+
+    The states are numbered and a set of states is kept as an int bitmask. For every state and symbol class we
+    precompute the mask of states it goes to, epsilon closure included, so each character costs one OR per active
+    state.
+
+    States from which no final state can be reached are left out of the masks, so the mask becomes empty as soon as
+    the input can't be accepted anymore.
+    """
+    def __init__(self, automaton: Automaton):
+        states = automaton.states
+        state_index = {state: i for i, state in enumerate(states)}
+        transition_masks, finals = epsilon_free_transitions(states, state_index)
+
+        # _steps[code][state] is the mask of states reached from state with the symbols of a class, after the
+        #  epsilon closure. Symbols with the same steps share a class (and a column in the cache of LazyDFAMatcher)
+        live_mask = _find_live_mask(transition_masks, finals)
+        alphabet = [symbol for symbol in automaton.alphabet if symbol != EPSILON and len(symbol) == 1]
+        steps = [[masks.get(symbol, 0) & live_mask for masks in transition_masks] for symbol in alphabet]
+        class_of, representatives = symbol_classes(map(tuple, steps))
+        self._steps = [steps[symbol] for symbol in representatives]
+
+        self._symbol_codes = {}
+        self._byte_codes = [-1] * 256
+        for symbol, symbol_class in zip(alphabet, class_of):
+            self._symbol_codes[symbol] = symbol_class
+            if ord(symbol) < 256:
+                self._byte_codes[ord(symbol)] = symbol_class
+
+        self._initial_mask = 1 << state_index[automaton.initial_state] & live_mask
+        self._accepting_mask = 0
+        for i, is_final in enumerate(finals):
+            if is_final:
+                self._accepting_mask |= 1 << i
+
+    def matches(self, input_string) -> bool:
+        """
+        Tells whether the NFA recognizes the input
+        :param input_string: a str, or bytes/bytearray/memoryview
+        :return: True if the input is accepted, False otherwise
+        """
+        return self._is_accepting(self._advance(self._initial_mask, input_string))
+
+    def session(self) -> "MatchSession":
+        """
+        Starts a MatchSession to match an input that comes in chunks
+        """
+        return MatchSession(self)
+
+    def _start(self) -> int:
+        return self._initial_mask
+
+    def _advance(self, mask: int, input_string) -> int:
+        """
+        Reads the input from a set of states
+        :return: the mask of the states the NFA is in after reading it, 0 if the input can't be accepted anymore
+        """
+        return self._simulate(mask, self._codes(input_string))
+
+    def _simulate(self, mask: int, codes) -> int:
+        for code in codes:
+            if code < 0:
+                return 0
+
+            mask = _step(mask, self._steps[code])
+            if not mask:
+                return 0
+
+        return mask
+
+    def _is_accepting(self, mask: int) -> bool:
+        return bool(mask & self._accepting_mask)
+
+    @staticmethod
+    def _is_dead(mask: int) -> bool:
+        return not mask
+
+    def accepts_many(self, input_strings) -> list:
+        """
+        Validates a batch of strings, one at a time
+        :return: a list of booleans, True where the string is accepted
+        """
+        return [self.matches(input_string) for input_string in input_strings]
+
+    def _codes(self, input_string):
+        """
+        Maps the characters (or bytes) of the input to symbol numbers, -1 for the ones out of the alphabet
+        """
+        if isinstance(input_string, str):
+            symbol_codes = self._symbol_codes
+            return (symbol_codes.get(char, -1) for char in input_string)
+
+        byte_codes = self._byte_codes
+        return (byte_codes[byte] for byte in memoryview(input_string).cast("B"))
+
+
+class LazyDFAMatcher(NFAMatcher):
+    """
+    Matches strings against a NF Automaton by building its DFA on the fly, the way RE2 does.
+
+    A DFA state is the mask of NFA states the input can be in. DFA states are only built when the input reaches
+    them and their transitions are only calculated the first time a symbol is read from them, so NFA whose full DFA
+    would be exponential can be matched as long as the input visits few subsets.
+
+    The DFA states are kept in a cache of at most max_cached_states states. When the cache is full it is flushed,
+    which is the eviction policy of RE2: it is cheap and the states that are still in use are rebuilt on demand. If
+    the cache thrashes, i.e. it fills up again before reading min_symbols_per_state symbols per cached state, the
+    match falls back to simulating the NFA for the rest of the input. The fallback only lasts for that input, the
+    cache is flushed and the next one goes through the cache again.
+
+    The counters hits, misses (transitions calculated), flushes and fallbacks add up over all the matches.
+    """
+    _UNKNOWN = -1   # The transition hasn't been calculated
+    _DEAD = -2      # The transition goes to the empty subset, the input can't be accepted
+
+    def __init__(self, automaton: Automaton, max_cached_states: int = 10000, min_symbols_per_state: int = 10):
+        super().__init__(automaton)
+
+        if max_cached_states < 2:
+            raise ValueError("The cache must hold at least 2 states, the current one and the next one")
+
+        self.max_cached_states = max_cached_states
+        self.min_symbols_per_state = min_symbols_per_state
+
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.fallbacks = 0
+
+        self._flush_cache()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "flushes": self.flushes,
+            "fallbacks": self.fallbacks,
+            "cached_states": len(self._cached_masks),
+        }
+
+    def _advance(self, mask: int, input_string) -> int:
+        """
+        Reads the input from a set of states, going through the cached DFA states
+        :return: the mask of the states the NFA is in after reading it, 0 if the input can't be accepted anymore
+        """
+        if not mask:
+            return 0
+
+        steps = self._steps
+        dead = self._DEAD
+
+        if len(self._cached_masks) >= self.max_cached_states and mask not in self._cached_index:
+            self._flush_cache()
+            self.flushes += 1
+
+        state = self._cached_state(mask)
+        cached_masks, cached_transitions = self._cached_masks, self._cached_transitions
+        transitions = cached_transitions[state]
+        symbols_read = self._symbols_since_flush
+        hits = 0
+
+        codes = self._codes(input_string)
+        try:
+            for code in codes:
+                if code < 0:
+                    return 0
+
+                symbols_read += 1
+                next_state = transitions[code]
+
+                if next_state >= 0:
+                    hits += 1
+                elif next_state == dead:
+                    hits += 1
+                    return 0
+                else:
+                    self.misses += 1
+                    mask = cached_masks[state]
+                    next_mask = _step(mask, steps[code])
+
+                    if not next_mask:
+                        transitions[code] = dead
+                        return 0
+
+                    if len(cached_masks) >= self.max_cached_states and next_mask not in self._cached_index:
+                        if symbols_read < self.min_symbols_per_state * self.max_cached_states:
+                            # The cache thrashes, keep going on the NFA from here on. The cache is flushed so that
+                            #  the next input gets a full budget, otherwise it would fall back at its first miss
+                            self.fallbacks += 1
+                            self._flush_cache()
+                            self.flushes += 1
+                            symbols_read = 0
+                            return self._simulate(next_mask, codes)
+
+                        self._flush_cache()
+                        self.flushes += 1
+                        cached_masks, cached_transitions = self._cached_masks, self._cached_transitions
+                        symbols_read = 0
+                        state = self._cached_state(mask)
+                        transitions = cached_transitions[state]
+
+                    next_state = self._cached_state(next_mask)
+                    transitions[code] = next_state
+
+                state = next_state
+                transitions = cached_transitions[state]
+
+            return cached_masks[state]
+        finally:
+            self.hits += hits
+            self._symbols_since_flush = symbols_read
+
+    def _cached_state(self, mask: int) -> int:
+        state = self._cached_index.get(mask)
+
+        if state is None:
+            state = len(self._cached_masks)
+            self._cached_index[mask] = state
+            self._cached_masks.append(mask)
+            self._cached_transitions.append([self._UNKNOWN] * len(self._steps))
+
+        return state
+
+    def _flush_cache(self):
+        self._cached_index = {}         # mask -> number of the cached DFA state
+        self._cached_masks = []         # number -> mask
+        self._cached_transitions = []   # number -> list with the number of the next state for every symbol
+        self._symbols_since_flush = 0
+
+
+class MatchSession:
+    """
+    Matches an input that comes in chunks, e.g. read from a socket or a big file, against a compiled matcher.
+
+    Only the state the matcher is in is kept between chunks (the DFA state or the mask of NFA states), so the memory
+    used doesn't grow with the input. Chunks can be str, bytes, bytearray or memoryview, and a str chunk can follow a
+    bytes one. Once the input gets into a dead state, i.e. no continuation of it can be accepted, the rest of the
+    chunks are not read.
+    """
+    __slots__ = ("_matcher", "_state")
+
+    def __init__(self, matcher):
+        self._matcher = matcher
+        self._state = matcher._start()
+
+    def feed(self, chunk) -> bool:
+        """
+        Reads the next chunk of the input
+        :param chunk: a str, or bytes/bytearray/memoryview
+        :return: False if the input got into a dead state and can't be accepted anymore, True otherwise
+        """
+        if not self._matcher._is_dead(self._state):
+            self._state = self._matcher._advance(self._state, chunk)
+
+        return not self._matcher._is_dead(self._state)
+
+    def is_accepting(self) -> bool:
+        """
+        Tells whether the input read so far is accepted
+        """
+        return self._matcher._is_accepting(self._state)
+
+    def is_dead(self) -> bool:
+        """
+        Tells whether the input read so far got into a dead state, so it is rejected whatever comes next
+        """
+        return self._matcher._is_dead(self._state)
+
+    def reset(self):
+        """
+        Starts matching a new input
+        """
+        self._state = self._matcher._start()
+
+
+def _step(mask: int, step: list) -> int:
+    next_mask = 0
+
+    while mask:
+        lowest_bit = mask & -mask
+        next_mask |= step[lowest_bit.bit_length() - 1]
+        mask ^= lowest_bit
+
+    return next_mask
+
+
+def _find_live_mask(transition_masks: list, finals: list) -> int:
+    """
+    Finds the NFA states that can reach a final state, by walking the transitions backwards from the final states
+    :return: the mask of the live states
+    """
+    inverse = [[] for _ in transition_masks]
+    for source, masks in enumerate(transition_masks):
+        targets = 0
+        for mask in masks.values():
+            targets |= mask
+
+        while targets:
+            lowest_bit = targets & -targets
+            inverse[lowest_bit.bit_length() - 1].append(source)
+            targets ^= lowest_bit
+
+    live_mask = 0
+    pending = [state for state, is_final in enumerate(finals) if is_final]
+    for state in pending:
+        live_mask |= 1 << state
+
+    while pending:
+        state = pending.pop()
+        for source in inverse[state]:
+            if not live_mask >> source & 1:
+                live_mask |= 1 << source
+                pending.append(source)
+
+    return live_mask
+
+
+def _find_dead_states(dfa: DenseDFA) -> bytearray:
+    """
+    Finds the states that can't reach a final state by walking the inverse transitions back from the final states
+    :return: a bytearray with 1 for every dead state
+    """
+    alphabet_size = dfa.alphabet_size
+    transitions = dfa.transitions
+    inverse = [[] for _ in range(dfa.state_count)]
+
+    for i, target in enumerate(transitions):
+        if target != -1:
+            inverse[target].append(i // alphabet_size)
+
+    dead = bytearray(b"\x01") * dfa.state_count
+    pending = [state for state in range(dfa.state_count) if dfa.is_final(state)]
+    for state in pending:
+        dead[state] = 0
+
+    while pending:
+        state = pending.pop()
+        for source in inverse[state]:
+            if dead[source]:
+                dead[source] = 0
+                pending.append(source)
+
+    return dead
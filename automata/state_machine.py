@@ -1,4 +1,111 @@
-from collections import defaultdict
+import sys
+
+
+class Transitions:
+    """
+    The transitions of a State, a mapping of symbols (including epsillon) to the list of States they lead to.
+
+    It works like the defaultdict(list) it replaces: looking up a symbol with [] that has no transitions adds an empty
+    list for it, so transitions[symbol].append(state) works. The difference is how they are kept: in a DFA every
+    symbol leads to a single State, so a single target is kept as the State itself instead of a list of one, and
+    get() and items() give it back as a tuple of one. The list is only created if transitions[symbol] asks for it,
+    add(symbol, state) adds a target without creating it.
+
+    Symbols are interned, so that the millions of transitions with the same symbol share a single string.
+    """
+    __slots__ = ("_targets",)
+
+    def __init__(self):
+        self._targets = {}
+
+    def __getitem__(self, symbol: str) -> list:
+        targets = self._targets.get(symbol)
+
+        if targets is None:
+            targets = self._targets[sys.intern(symbol)] = []
+        elif type(targets) is not list:
+            targets = self._targets[symbol] = [targets]     # The caller may add targets to the list
+
+        return targets
+
+    def __setitem__(self, symbol: str, targets):
+        self._targets[sys.intern(symbol)] = targets[0] if len(targets) == 1 else list(targets)
+
+    def __delitem__(self, symbol: str):
+        del self._targets[symbol]
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._targets
+
+    def __iter__(self):
+        return iter(self._targets)
+
+    def __len__(self) -> int:
+        return len(self._targets)
+
+    def __eq__(self, other):
+        # Lists and tuples of the same targets are the same transitions
+        if not isinstance(other, (Transitions, dict)):
+            return NotImplemented
+
+        return {symbol: list(targets) for symbol, targets in self.items()} == \
+            {symbol: list(targets) for symbol, targets in other.items()}
+
+    def __repr__(self):
+        return "Transitions({})".format(dict(self.items()))
+
+    def get(self, symbol: str, default=None):
+        """
+        Gets the States a symbol leads to, as a list or a tuple, or default if the symbol has no transitions
+        """
+        targets = self._targets.get(symbol)
+
+        if targets is None:
+            return default
+        if type(targets) is list:
+            return targets
+        return targets,
+
+    def add(self, symbol: str, target: "State"):
+        """
+        Adds a transition to target with symbol, like transitions[symbol].append(target) but a first target is kept
+        as a single State
+        """
+        targets = self._targets.get(symbol)
+
+        if targets is None:
+            self._targets[sys.intern(symbol)] = target
+        elif type(targets) is list:
+            targets.append(target)
+        else:
+            self._targets[symbol] = [targets, target]
+
+    def target(self, symbol: str):
+        """
+        Gets the State a symbol leads to, for a DFA. It is None if the symbol has no transitions and it raises a
+        ValueError if it has more than one
+        """
+        targets = self._targets.get(symbol)
+
+        if type(targets) is list:
+            if len(targets) > 1:
+                raise ValueError("The symbol '{}' leads to {} states".format(symbol, len(targets)))
+            return targets[0] if targets else None
+
+        return targets
+
+    def keys(self):
+        return self._targets.keys()
+
+    def values(self) -> list:
+        return [targets if type(targets) is list else (targets,) for targets in self._targets.values()]
+
+    def items(self) -> list:
+        return [(symbol, targets if type(targets) is list else (targets,))
+                for symbol, targets in self._targets.items()]
+
+    def clear(self):
+        self._targets.clear()
 
 
 class State:
@@ -9,18 +116,23 @@ class State:
     1. An ID
     2. A flag to determine whether the state is initial or not
     3. A flag to determine whether the state is final or not
-    4. A dict (map) of transitions where:
+    4. A map of Transitions where:
        a. The key is the symbol used to transition (including epsillon)
        b. The value is a list of references to States. In a DFA, this list must be of length 1 per symbol,
           but on NFAs this list can be of an arbitrary lenght >= 1, this is because one symbol can lead
           to more than one state
+
+    States have __slots__ instead of an instance __dict__, which together with the Transitions keeps big automata
+    small in memory.
     """
+    __slots__ = ("state_id", "is_initial", "is_final", "transitions")
+
     def __init__(self, state_id: str = None, is_initial: bool = False, is_final: bool = False):
 
         self.state_id = state_id
         self.is_initial = is_initial
         self.is_final = is_final
-        self.transitions = defaultdict(lambda: [])
+        self.transitions = Transitions()
 
     def __str__(self):
         return "s{}".format(self.state_id)
@@ -130,28 +242,64 @@ class Automaton:
         #  modified
         self._initial_heads = [self.initial_state]
 
+    @classmethod
+    def from_trusted_states(cls, states: list, initial_state: State, alphabet: tuple) -> "Automaton":
+        """
+        Builds an Automaton without validating, upper-casing or sorting the states.
+
+        This is meant for code that already produces valid states in bulk (e.g. unpacking a DenseDFA), the caller
+        must guarantee that the IDs are unique and upper case and that initial_state is the only initial state.
+        :param states: the states of the automaton, in the order they should be kept
+        :param initial_state: the initial State, it must be one of the states
+        :param alphabet: the symbols of the automaton
+        :return: a new Automaton
+        """
+        automaton = cls.__new__(cls)
+        automaton.initial_state = initial_state
+        automaton.states = states
+        automaton.alphabet = tuple(alphabet)
+        automaton.heads = [initial_state]
+        automaton._initial_heads = [initial_state]
+
+        return automaton
+
     def is_string_valid(self, input_string: str) -> bool:
         # Reset the heads first
         self.heads = self._initial_heads.copy()
 
-        string_queue = [c for c in input_string]
-
-        while string_queue:
-            symbol = string_queue.pop(0)
-            current_head_count = len(self.heads)
+        for symbol in input_string:
+            new_heads = []
 
             # Follow and transition for the current heads pointing to different states
-            for i in range(current_head_count):
-                head = self.heads.pop(0)
+            for head in self.heads:
                 new_states = head.transitions.get(symbol)
 
                 if new_states:
                     # If there is a transition for the symbol, replace the head with the new list of states to follow,
                     #  for DFA this will be one state only, for NFA, they could be more than one state
-                    self.heads.extend(new_states)
+                    new_heads.extend(new_states)
+
+            # Two heads pointing to the same state would only repeat the same work, keep one of them
+            self.heads = list(dict.fromkeys(new_heads)) if len(new_heads) > 1 else new_heads
+
+            if not self.heads:
+                break   # No head is left, the string can't be recognized
 
         return self._are_heads_in_accepting_states()
 
+    def compile(self, max_cached_states: int = 10000):
+        """
+        Compiles the automaton into a matcher that validates strings with table lookups instead of following the
+        State objects, use it when many strings need to be validated against the same automaton.
+
+        The matcher is a snapshot, changes made to the states after compiling are not seen by it.
+        :param max_cached_states: for a NFA, how many of the DFA states built while matching are kept
+        :return: a DFAMatcher for a DFA or a LazyDFAMatcher for a NFA, both with a matches(input_string) method
+        """
+        from automata.matcher import compile_automaton     # The matchers are built on top of this module
+
+        return compile_automaton(self, max_cached_states)
+
     def _are_heads_in_accepting_states(self):
 
         for head in self.heads:
@@ -1,7 +1,13 @@
+import argparse
 import sys
+from contextlib import nullcontext
 
-from utils.file_utils import deserialize_automaton, serialize_automaton, save_str_to_file, serialize_graph_automaton
+from utils.batch_minimizer import find_automaton_files, minimize_files
+from utils.cache import MinimizationCache, DEFAULT_CACHE_SIZE
+from utils.file_utils import serialize_automaton, serialize_graph_automaton, load_automaton_file, \
+    save_automaton_file
 from utils.minimizer import minimize_automaton
+from utils.stats import collect_stats, format_stats_table, format_stats_json, phase
 
 VERSION = "0.0.1"
 OUTPUT_FILE = "minimized_automaton.txt"
@@ -11,31 +17,88 @@ def main():
     _print_project_info()
     args = _parse_args()
 
+    if args.get("batch"):
+        run_batch(args)
+        return
+
+    # The stats of every phase are collected only if they were asked for, they are printed at the end
+    with collect_stats() if args.get("stats") else nullcontext() as collector:
+        minimize_file(args)
+
+    if collector is not None:
+        print_stats(collector.to_list(), args.get("stats"))
+
+
+def minimize_file(args: dict):
     # Read the automaton from file
     input_file_path = args.get("input_file_path")
     print("Reading automaton from {}...".format(input_file_path))
-    input_automaton = deserialize_automaton(input_file_path)
+    input_automaton = load_automaton_file(input_file_path)
 
-    # Minimize the automaton, the automaton will be automatically converted to a DFA if it is a NFA
+    # Minimize the automaton, the automaton will be automatically converted to a DFA if it is a NFA. With a cache,
+    #  an automaton that was already minimized is read from it instead
     print("Minimizing automaton...")
-    minimized_automaton = minimize_automaton(input_automaton)
+    if args.get("cache_dir"):
+        minimized_automaton = MinimizationCache(args.get("cache_dir"), args.get("cache_size")).minimize(input_automaton)
+    else:
+        minimized_automaton = minimize_automaton(input_automaton)
 
     # Prepare the automata for printing by converting them to Byron TXT format
-    original_automaton_str = serialize_automaton(input_automaton)
-    mini_automaton_str = serialize_automaton(minimized_automaton)
+    with phase("format_results"):
+        original_automaton_str = serialize_automaton(input_automaton)
+        mini_automaton_str = serialize_automaton(minimized_automaton)
 
     # Print the results to stdout
     print_results(original_automaton_str, mini_automaton_str)
 
-    # Save the results to file for later inspection
-    print("Saving results to {}...".format(OUTPUT_FILE))
-    save_str_to_file(OUTPUT_FILE, mini_automaton_str)
+    # Save the results to file for later inspection, in binary format if the output file has the binary extension
+    output_file_path = args.get("output_file_path")
+    print("Saving results to {}...".format(output_file_path))
+    save_automaton_file(output_file_path, minimized_automaton)
 
     # The automaton will be drawn only if the graphviz library is installed in the system
     serialize_graph_automaton(minimized_automaton)
     print("DONE!")
 
 
+def run_batch(args: dict):
+    input_paths = find_automaton_files(args.get("batch"))
+    if not input_paths:
+        raise ValueError("No automaton files were found in {}".format(", ".join(args.get("batch"))))
+
+    print("Minimizing {} automata with {} workers...".format(len(input_paths), args.get("workers") or "all the"))
+    results = minimize_files(input_paths, output_dir=args.get("output_dir"), workers=args.get("workers"),
+                             chunksize=args.get("chunksize"), binary=args.get("binary"),
+                             stats=bool(args.get("stats")), cache_dir=args.get("cache_dir"),
+                             cache_size=args.get("cache_size"))
+
+    failed = 0
+    for result in results:
+        if result.error:
+            failed += 1
+            print("FAILED {}: {}".format(result.input_path, result.error))
+        else:
+            print("{} ({} states) -> {} ({} states)".format(result.input_path, result.original_states,
+                                                             result.output_path, result.minimized_states))
+
+    print("DONE! {} minimized, {} failed".format(len(results) - failed, failed))
+
+    if args.get("stats") == "json":
+        print(format_stats_json([dict(phase_stats, file=result.input_path)
+                                 for result in results for phase_stats in result.stats or []]), file=sys.stderr)
+    elif args.get("stats"):
+        for result in results:
+            print("\n{}\n{}".format(result.input_path, format_stats_table(result.stats or [])), file=sys.stderr)
+
+
+def print_stats(phases: list, stats_format: str):
+    # The stats go to stderr, so that they can be saved on their own
+    if stats_format == "json":
+        print(format_stats_json(phases), file=sys.stderr)
+    else:
+        print(format_stats_table(phases), file=sys.stderr)
+
+
 def _print_project_info():
     project_info = """
     ********** ITESM - MCC - Computer Fundamentals **********
@@ -56,18 +119,36 @@ def _print_project_info():
 
 
 def _parse_args() -> dict:
-
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Minimizes NFAutomatas and DFAutomatas")
+    parser.add_argument("input_file_path", nargs="?", help="the file with the automaton, in Byron TXT or binary format")
+    parser.add_argument("output_file_path", nargs="?", default=OUTPUT_FILE,
+                        help="where to save the minimized automaton, a path ending in .dfab gets the binary format")
+    parser.add_argument("--batch", nargs="+", metavar="PATH",
+                        help="minimize every automaton file in these directories or glob patterns")
+    parser.add_argument("--workers", type=int, help="how many processes minimize in batch mode (all the CPUs)")
+    parser.add_argument("--chunksize", type=int, default=1, help="how many files a worker takes at a time")
+    parser.add_argument("--output-dir", help="where to save the batch results (next to each input file)")
+    parser.add_argument("--binary", action="store_true", help="save the batch results in binary format")
+    parser.add_argument("--cache-dir", help="reuse the results saved in this directory by previous runs")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="how many bytes the cache can take, the least recently used results are deleted first")
+    parser.add_argument("--stats", nargs="?", const="table", choices=["table", "json"],
+                        help="print the time, peak memory and counters of every phase to stderr")
+    args = vars(parser.parse_args(sys.argv[1:]))
+
+    if args["batch"]:
+        return args
+
+    input_path = args["input_file_path"]
+
+    if input_path is None:
         raise ValueError("The input file path with the automata was not provided")
 
-    input_path = sys.argv[1]
-
     if not input_path:
         raise ValueError("The input file path is empty!")
 
-    args = {
-        "input_file_path": input_path
-    }
+    if not args["output_file_path"]:
+        raise ValueError("The output file path is empty!")
 
     return args
 
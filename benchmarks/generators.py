@@ -0,0 +1,117 @@
+import random
+import string
+
+from automata.state_machine import Automaton, State
+
+EPSILON = " "
+SYMBOLS = string.ascii_lowercase + string.digits
+
+
+def alphabet_of_size(alphabet_size: int) -> tuple:
+    """
+    The first alphabet_size symbols of SYMBOLS, they are single characters so that strings can be matched directly
+    """
+    if not 1 <= alphabet_size <= len(SYMBOLS):
+        raise ValueError("The alphabet size must be between 1 and {} but it is {}".format(len(SYMBOLS), alphabet_size))
+
+    return tuple(SYMBOLS[:alphabet_size])
+
+
+def random_dfa(state_count: int, alphabet_size: int = 2, density: float = 1.0, final_ratio: float = 0.3,
+               seed: int = 0) -> Automaton:
+    """
+    Builds a random DFA, the same arguments always give the same automaton.
+    :param state_count: how many states the DFA has
+    :param alphabet_size: how many symbols the DFA has
+    :param density: the probability of each state having a transition for each symbol, below 1.0 the DFA is partial
+    :param final_ratio: the probability of each state being final
+    :param seed: the seed of the random generator
+    :return: a new Automaton, Q0 is its initial state
+    """
+    rnd = random.Random(seed)
+    alphabet = alphabet_of_size(alphabet_size)
+    states = _random_states(rnd, state_count, final_ratio)
+
+    for state in states:
+        for symbol in alphabet:
+            if rnd.random() < density:
+                state.transitions[symbol] = [rnd.choice(states)]
+
+    return Automaton(states)
+
+
+def random_nfa(state_count: int, alphabet_size: int = 2, density: float = 1.5, epsilon_density: float = 0.0,
+               final_ratio: float = 0.3, seed: int = 0) -> Automaton:
+    """
+    Builds a random NFA, the same arguments always give the same automaton.
+    :param state_count: how many states the NFA has
+    :param alphabet_size: how many symbols the NFA has, not counting epsilon
+    :param density: the average number of transitions each state has for each symbol
+    :param epsilon_density: the average number of epsilon transitions each state has
+    :param final_ratio: the probability of each state being final
+    :param seed: the seed of the random generator
+    :return: a new Automaton, Q0 is its initial state
+    """
+    rnd = random.Random(seed)
+    alphabet = alphabet_of_size(alphabet_size)
+    states = _random_states(rnd, state_count, final_ratio)
+
+    for state in states:
+        for symbol, average in [(symbol, density) for symbol in alphabet] + [(EPSILON, epsilon_density)]:
+            targets = rnd.sample(states, min(state_count, _poisson(rnd, average)))
+            if targets:
+                state.transitions[symbol] = targets
+
+    return Automaton(states)
+
+
+def nth_symbol_from_the_end_nfa(n: int, symbol: str = "a", alphabet_size: int = 2) -> Automaton:
+    """
+    Builds the NFA of n + 1 states that recognizes the strings whose n-th symbol from the end is symbol, its minimal
+    DFA has 2 ** n states, which makes it the worst case of the subset construction
+    """
+    alphabet = alphabet_of_size(alphabet_size)
+    if symbol not in alphabet:
+        raise ValueError("The symbol '{}' is not one of {}".format(symbol, alphabet))
+
+    states = [State("Q{}".format(i), is_initial=(i == 0), is_final=(i == n)) for i in range(n + 1)]
+
+    for other_symbol in alphabet:
+        states[0].transitions[other_symbol] = [states[0]]
+    states[0].transitions[symbol].append(states[1])
+
+    for i in range(1, n):
+        for other_symbol in alphabet:
+            states[i].transitions[other_symbol] = [states[i + 1]]
+
+    return Automaton(states)
+
+
+def random_strings(alphabet: tuple, count: int, max_length: int, seed: int = 0) -> list:
+    """
+    Builds count random strings over the symbols of alphabet with lengths between 0 and max_length
+    """
+    rnd = random.Random(seed)
+    symbols = [symbol for symbol in alphabet if symbol != EPSILON]
+
+    return ["".join(rnd.choices(symbols, k=rnd.randint(0, max_length))) for _ in range(count)]
+
+
+def _random_states(rnd: random.Random, state_count: int, final_ratio: float) -> list:
+    if state_count < 1:
+        raise ValueError("An automaton needs at least 1 state but {} were asked".format(state_count))
+
+    return [State("Q{}".format(i), is_initial=(i == 0), is_final=rnd.random() < final_ratio)
+            for i in range(state_count)]
+
+
+def _poisson(rnd: random.Random, average: float) -> int:
+    # The number of transitions of a state for a symbol, it follows a Poisson distribution with the given average
+    count = 0
+    remaining = rnd.expovariate(1.0) if average > 0 else 0.0
+
+    while 0 < remaining < average:
+        count += 1
+        remaining += rnd.expovariate(1.0)
+
+    return count
@@ -0,0 +1,328 @@
+"""
+Runs the benchmarks of the minimizer and compares them against a baseline.
+
+    python3 -m benchmarks.run_benchmarks [--save] [--baseline FILE] [--scale N] [--only NAME...]
+
+Every benchmark is timed a few times (the best time is kept) and run once more under tracemalloc to record its peak
+memory. With --save the results become the new baseline, otherwise they are compared to the baseline and the exit
+code is 1 if any benchmark got slower or bigger than the tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict, namedtuple
+
+from automata.dense_dfa import DenseDFA
+from automata.matcher import DFAMatcher, LazyDFAMatcher
+from benchmarks.generators import random_dfa, random_nfa, nth_symbol_from_the_end_nfa, random_strings
+from utils.automata_utils import nfa_2_dfa, clean_epsilon_transition, automata_are_equivalent
+from utils.file_utils import deserialize_automaton, parse_automaton, serialize_automaton, save_str_to_file
+from utils.minimizer import minimize_automaton
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_REPEAT = 3
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.10
+MIN_TIME_DIFFERENCE = 0.005     # Seconds, smaller differences are timer noise rather than regressions
+
+# A benchmark is a setup function that takes the scale and returns the arguments of run, only run is measured.
+#  Setup is called again before each measurement because some of the functions modify the automata they get.
+#  states tells from the scale how many states run builds, to report the memory per state, which is compared to the
+#  one of the reference benchmark
+Benchmark = namedtuple("Benchmark", ["name", "setup", "run", "states", "reference"], defaults=[None, None])
+Result = namedtuple("Result", ["name", "seconds", "peak_bytes", "states"], defaults=[None])
+
+
+def _scaled(count: int, scale: float) -> int:
+    return max(1, int(count * scale))
+
+
+def _text_file_setup(scale: float) -> tuple:
+    path = os.path.join(tempfile.gettempdir(), "benchmark_automaton.txt")
+    save_str_to_file(path, serialize_automaton(random_nfa(_scaled(20000, scale), alphabet_size=4, seed=1)))
+    return (path,)
+
+
+def _large_text_file_setup(scale: float) -> tuple:
+    # A million lines at scale 1, the size of the files parse_automaton is meant for (the goal is 10x faster than the
+    #  State based parser it replaced, which took about 8.5 seconds for them). Writing the file takes longer than
+    #  parsing it, so it is only written once for every size
+    state_count = _scaled(100000, scale)
+    path = os.path.join(tempfile.gettempdir(), "benchmark_large_automaton_{}.txt".format(state_count))
+
+    if not os.path.exists(path):
+        temporary_path = path + ".tmp"
+        save_str_to_file(temporary_path, serialize_automaton(random_dfa(state_count, alphabet_size=10, seed=10)))
+        os.replace(temporary_path, path)
+
+    return (path,)
+
+
+class _DictLayoutState:
+    """
+    A State as it was before it had __slots__: its fields in a __dict__ and a list of targets for every symbol
+    """
+    def __init__(self, state_id: str, is_initial: bool = False, is_final: bool = False):
+        self.state_id = state_id
+        self.is_initial = is_initial
+        self.is_final = is_final
+        self.transitions = defaultdict(lambda: [])
+
+
+def _dict_layout_states(dfa: DenseDFA) -> list:
+    states = [_DictLayoutState(state_id, state == dfa.initial_state, dfa.is_final(state))
+              for state, state_id in enumerate(dfa.state_ids)]
+
+    alphabet_size = dfa.alphabet_size
+    for state, dict_layout_state in enumerate(states):
+        for symbol, target in enumerate(dfa.transitions[state * alphabet_size:(state + 1) * alphabet_size]):
+            dict_layout_state.transitions[dfa.alphabet[symbol]].append(states[target])
+
+    return states
+
+
+def _equivalence_setup(scale: float) -> tuple:
+    automaton = random_dfa(_scaled(5000, scale), alphabet_size=4, seed=4)
+    return automaton, minimize_automaton(random_dfa(_scaled(5000, scale), alphabet_size=4, seed=4))
+
+
+def _dfa_matching_setup(scale: float) -> tuple:
+    automaton = random_dfa(_scaled(1000, scale), alphabet_size=4, seed=5)
+    return DFAMatcher(DenseDFA.from_automaton(automaton)), random_strings(automaton.alphabet, 2000, 200, seed=5)
+
+
+def _lazy_matching_setup(scale: float) -> tuple:
+    return (LazyDFAMatcher(nth_symbol_from_the_end_nfa(_scaled(12, scale))),
+            random_strings(("a", "b"), 2000, 200, seed=6))
+
+
+def _state_walk_setup(scale: float) -> tuple:
+    automaton = random_nfa(_scaled(200, scale), alphabet_size=4, density=1.2, seed=7)
+    return automaton, random_strings(automaton.alphabet, 200, 100, seed=7)
+
+
+BENCHMARKS = [
+    Benchmark("build_dfa_states", lambda scale: (_scaled(20000, scale),),
+              lambda state_count: random_dfa(state_count, alphabet_size=4, seed=8),
+              states=lambda scale: _scaled(20000, scale), reference="build_dfa_states_dict_layout"),
+    # The same states in the layout State had before __slots__, as a reference for the memory per state
+    Benchmark("build_dfa_states_dict_layout",
+              lambda scale: (DenseDFA.from_automaton(random_dfa(_scaled(20000, scale), alphabet_size=4, seed=8)),),
+              _dict_layout_states, states=lambda scale: _scaled(20000, scale)),
+    Benchmark("deserialize_automaton", _text_file_setup, deserialize_automaton),
+    Benchmark("parse_automaton_large", _large_text_file_setup, parse_automaton),
+    Benchmark("nfa_2_dfa_random",
+              lambda scale: (random_nfa(_scaled(60, scale), alphabet_size=3, density=1.0, seed=2),), nfa_2_dfa),
+    Benchmark("nfa_2_dfa_nth_symbol_from_the_end",
+              lambda scale: (nth_symbol_from_the_end_nfa(_scaled(12, scale)),), nfa_2_dfa),
+    Benchmark("clean_epsilon_transition",
+              lambda scale: (random_nfa(_scaled(2000, scale), alphabet_size=3, epsilon_density=1.5, seed=3),),
+              clean_epsilon_transition),
+    Benchmark("minimize_automaton",
+              lambda scale: (random_dfa(_scaled(5000, scale), alphabet_size=4, seed=4),), minimize_automaton),
+    Benchmark("minimize_partial_dfa",
+              lambda scale: (random_dfa(_scaled(5000, scale), alphabet_size=36, density=0.08, seed=9),),
+              minimize_automaton),
+    Benchmark("minimize_automaton_nfa",
+              lambda scale: (nth_symbol_from_the_end_nfa(_scaled(10, scale)),), minimize_automaton),
+    Benchmark("automata_are_equivalent", _equivalence_setup, automata_are_equivalent),
+    Benchmark("dfa_matcher", _dfa_matching_setup,
+              lambda matcher, input_strings: [matcher.matches(input_string) for input_string in input_strings]),
+    Benchmark("lazy_dfa_matcher", _lazy_matching_setup,
+              lambda matcher, input_strings: [matcher.matches(input_string) for input_string in input_strings]),
+    Benchmark("is_string_valid", _state_walk_setup,
+              lambda automaton, input_strings: [automaton.is_string_valid(input_string)
+                                                for input_string in input_strings]),
+]
+
+
+def run_benchmark(benchmark: Benchmark, scale: float = 1.0, repeat: int = DEFAULT_REPEAT) -> Result:
+    """
+    Measures a benchmark.
+    :param benchmark: the Benchmark to measure
+    :param scale: multiplies the size of the automata the benchmark builds
+    :param repeat: how many times the benchmark is timed, the best time is kept
+    :return: a Result with the best time in seconds and the peak memory in bytes allocated by run
+    """
+    best_seconds = None
+    for _ in range(repeat):
+        args = benchmark.setup(scale)
+        start = time.perf_counter()
+        benchmark.run(*args)
+        seconds = time.perf_counter() - start
+        best_seconds = seconds if best_seconds is None else min(best_seconds, seconds)
+
+    # tracemalloc slows everything down, so the memory is measured in a run of its own
+    args = benchmark.setup(scale)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        benchmark.run(*args)
+        peak_bytes = tracemalloc.get_traced_memory()[1] - baseline_bytes
+    finally:
+        tracemalloc.stop()
+
+    states = benchmark.states(scale) if benchmark.states is not None else None
+    return Result(benchmark.name, best_seconds, peak_bytes, states)
+
+
+def run_benchmarks(names: list = None, scale: float = 1.0, repeat: int = DEFAULT_REPEAT) -> list:
+    """
+    Measures the BENCHMARKS, or only the ones in names, and returns a list of Result
+    """
+    benchmarks = BENCHMARKS
+    if names:
+        unknown = set(names) - {benchmark.name for benchmark in BENCHMARKS}
+        if unknown:
+            raise ValueError("Unknown benchmarks: {}".format(", ".join(sorted(unknown))))
+        benchmarks = [benchmark for benchmark in BENCHMARKS if benchmark.name in names]
+
+    return [run_benchmark(benchmark, scale, repeat) for benchmark in benchmarks]
+
+
+def save_baseline(path: str, results: list, scale: float):
+    baseline = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": scale,
+        "benchmarks": {result.name: {"seconds": result.seconds, "peak_bytes": result.peak_bytes}
+                       for result in results},
+    }
+
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_regressions(results: list, baseline: dict, time_tolerance: float = DEFAULT_TIME_TOLERANCE,
+                     memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE) -> list:
+    """
+    Compares the results against a baseline.
+    :param results: a list of Result
+    :param baseline: a baseline as written by save_baseline
+    :param time_tolerance: how much slower than the baseline a benchmark can be, 0.25 is 25% slower
+    :param memory_tolerance: how much more memory than the baseline a benchmark can use
+    :return: a list of messages, one for each benchmark that got slower or bigger than allowed
+    """
+    regressions = []
+    recorded = baseline.get("benchmarks", {})
+
+    for result in results:
+        previous = recorded.get(result.name)
+        if previous is None:
+            continue    # A new benchmark, there is nothing to compare it to
+
+        allowed_seconds = max(previous["seconds"] * (1 + time_tolerance), previous["seconds"] + MIN_TIME_DIFFERENCE)
+        if result.seconds > allowed_seconds:
+            regressions.append("{}: {:.4f}s vs {:.4f}s in the baseline"
+                               .format(result.name, result.seconds, previous["seconds"]))
+
+        if result.peak_bytes > previous["peak_bytes"] * (1 + memory_tolerance):
+            regressions.append("{}: {} bytes vs {} bytes in the baseline"
+                               .format(result.name, result.peak_bytes, previous["peak_bytes"]))
+
+    return regressions
+
+
+def print_results(results: list, baseline: dict = None):
+    recorded = baseline.get("benchmarks", {}) if baseline else {}
+
+    print("{:<36} {:>10} {:>9} {:>14} {:>9} {:>10}".format("benchmark", "seconds", "vs base", "peak bytes", "vs base",
+                                                            "bytes/state"))
+    for result in results:
+        previous = recorded.get(result.name)
+        time_change = _change(result.seconds, previous["seconds"]) if previous else ""
+        memory_change = _change(result.peak_bytes, previous["peak_bytes"]) if previous else ""
+        bytes_per_state = "{:.0f}".format(result.peak_bytes / result.states) if result.states else ""
+
+        print("{:<36} {:>10.4f} {:>9} {:>14} {:>9} {:>10}".format(result.name, result.seconds, time_change,
+                                                                  result.peak_bytes, memory_change, bytes_per_state))
+
+    for comparison in compare_to_references(results):
+        print(comparison)
+
+
+def compare_to_references(results: list) -> list:
+    """
+    Compares the memory per state of the benchmarks that have a reference with the one of their reference, e.g.
+    build_dfa_states with the old layout of State
+    :return: a list of messages, for the benchmarks whose reference is among the results
+    """
+    by_name = {result.name: result for result in results}
+    references = {benchmark.name: benchmark.reference for benchmark in BENCHMARKS}
+    comparisons = []
+
+    for result in results:
+        reference = by_name.get(references.get(result.name))
+        if reference is None or not result.states or not reference.states:
+            continue
+
+        bytes_per_state = result.peak_bytes / result.states
+        reference_bytes_per_state = reference.peak_bytes / reference.states
+        comparisons.append("{}: {:.0f} bytes per state vs {:.0f} in {} ({})"
+                           .format(result.name, bytes_per_state, reference_bytes_per_state, reference.name,
+                                   _change(bytes_per_state, reference_bytes_per_state)))
+
+    return comparisons
+
+
+def _change(value: float, previous: float) -> str:
+    if not previous:
+        return ""
+
+    return "{:+.0%}".format(value / previous - 1)
+
+
+def _parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks the minimizer and compares it against a baseline")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="the baseline file (benchmarks/baseline.json)")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the size of the automata")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="how many times each benchmark is timed")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="run only these benchmarks")
+    parser.add_argument("--time-tolerance", type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    results = run_benchmarks(args.only, args.scale, args.repeat)
+
+    if args.save:
+        print_results(results)
+        save_baseline(args.baseline, results, args.scale)
+        print("Baseline saved to {}".format(args.baseline))
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print_results(results)
+        print("There is no baseline at {}, run with --save to create one".format(args.baseline))
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get("scale") != args.scale:
+        print("The baseline was recorded with scale {}, the results can't be compared".format(baseline.get("scale")))
+        return 1
+
+    print_results(results, baseline)
+    regressions = find_regressions(results, baseline, args.time_tolerance, args.memory_tolerance)
+    for regression in regressions:
+        print("REGRESSION {}".format(regression))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
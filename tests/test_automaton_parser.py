@@ -0,0 +1,111 @@
+import unittest
+
+from tests.automata_examples import state_machine_1
+from utils.automata_utils import automata_are_equivalent, nfa_2_dfa
+from utils.file_utils import AutomatonFormatError, parse_automaton, parse_automaton_lines
+
+
+class AutomatonParserTest(unittest.TestCase):
+
+    def test_parse_dfa(self):
+        compact = parse_automaton("./resources/state_machine03.txt")
+
+        self.assertEqual(7, compact.state_count)
+        self.assertEqual(14, compact.transition_count)
+        self.assertEqual("1", compact.state_ids[compact.initial_state])
+        self.assertEqual(["6"], [state_id for i, state_id in enumerate(compact.state_ids) if compact.finals[i]])
+
+        automaton, _ = state_machine_1()
+        self.assertTrue(automata_are_equivalent(automaton, compact.to_automaton()))
+        self.assertTrue(automata_are_equivalent(automaton, compact.to_dense_dfa().to_automaton()))
+
+    def test_small_batches(self):
+        """
+        The result must not depend on how the lines are split in batches
+        """
+        expected = parse_automaton("./resources/state_machine_26.txt")
+
+        for batch_size in (1, 2, 7, 1000):
+            compact = parse_automaton("./resources/state_machine_26.txt", batch_size=batch_size)
+
+            self.assertEqual(expected.state_ids, compact.state_ids)
+            self.assertEqual(expected.alphabet, compact.alphabet)
+            self.assertEqual(list(zip(expected.sources, expected.symbols, expected.targets)),
+                             list(zip(compact.sources, compact.symbols, compact.targets)))
+            self.assertEqual(expected.finals, compact.finals)
+            self.assertEqual(expected.initial_state, compact.initial_state)
+
+    def test_comments_blank_lines_and_marks(self):
+        lines = ["# A comment\n", "\n", ">q0|a|q1\r\n", "   \n", "q1|b|*q2\n", "# q2|a|q0\n", "*q2| |q0"]
+        compact = parse_automaton_lines(line for line in lines)
+
+        self.assertEqual(["Q0", "Q1", "Q2"], compact.state_ids)
+        self.assertEqual(["a", "b", " "], compact.alphabet)
+        self.assertEqual(bytearray([0, 0, 1]), compact.finals)
+        self.assertEqual(0, compact.initial_state)
+
+        automaton = compact.to_automaton()
+        self.assertIs(automaton.initial_state, automaton.states[0])
+        self.assertTrue(nfa_2_dfa(automaton).is_string_valid("abab"))
+
+    def test_errors_tell_the_line(self):
+        with self.assertRaises(AutomatonFormatError) as context:
+            parse_automaton_lines([">q0|a|q1\n", "# comment\n", "q1|a\n"])
+        self.assertEqual(3, context.exception.line_number)
+        self.assertIn("Line 3", str(context.exception))
+
+        with self.assertRaises(AutomatonFormatError) as context:
+            parse_automaton_lines([">q0|a|q1\n", "q1|a|*\n"])
+        self.assertEqual(2, context.exception.line_number)
+
+        # A missing initial state is still a ValueError
+        with self.assertRaises(ValueError):
+            parse_automaton("./resources/state_machine02.txt")
+
+        with self.assertRaises(ValueError):
+            parse_automaton_lines([">q0|a|q1\n", "Q1|a|q0\n"])
+
+    def test_symbol_ranges(self):
+        lines = [">q0|[a-c_]|q1\n", "q1|[0-9]|*q2\n", "*q2|[0-9]|q2\n", "q2|-|q0\n", "q2|[-x-z]|q0\n"]
+        compact = parse_automaton_lines(lines)
+
+        self.assertEqual(["_", "a", "b", "c", "0", "1", "2", "3", "4", "5", "6", "7", "8", "9", "-", "x", "y", "z"],
+                         compact.alphabet)
+        self.assertEqual(4 + 10 + 10 + 1 + 4, compact.transition_count)
+        self.assertEqual(["q0", "q1", "q2"], [state_id.lower() for state_id in compact.state_ids])
+
+        # The same transitions written one per line
+        symbols = {"q0": "abc_", "q1": "0123456789", "q2": "0123456789-xyz"}
+        targets = {"q0": "q1", "q1": "*q2"}
+        expanded = ["{}|{}|{}\n".format(">q0" if source == "q0" else source, symbol,
+                                        targets.get(source, "q2" if symbol.isdigit() else "q0"))
+                    for source, source_symbols in symbols.items() for symbol in source_symbols]
+        automaton = compact.to_automaton()
+        self.assertTrue(automaton.is_string_valid("b7"))
+        self.assertTrue(automata_are_equivalent(nfa_2_dfa(automaton),
+                                                nfa_2_dfa(parse_automaton_lines(expanded).to_automaton())))
+
+        # Brackets without a range inside are a plain symbol
+        self.assertEqual(["[]", "["], parse_automaton_lines([">q0|[]|q1\n", "q1|[|*q0\n"]).alphabet)
+
+    def test_symbol_range_errors(self):
+        with self.assertRaises(AutomatonFormatError) as context:
+            parse_automaton_lines([">q0|a|q1\n", "q1|[z-a]|q0\n"])
+        self.assertEqual(2, context.exception.line_number)
+
+        with self.assertRaises(AutomatonFormatError) as context:
+            parse_automaton_lines([">q0|[ -~]|q1\n"])
+        self.assertEqual(1, context.exception.line_number)
+
+        with self.assertRaises(AutomatonFormatError):
+            parse_automaton_lines([">q0|[!-~]|q1\n"])
+
+    def test_nfa_is_not_a_dense_dfa(self):
+        compact = parse_automaton("./resources/state_machine01.txt")
+
+        with self.assertRaises(ValueError):
+            compact.to_dense_dfa()
+
+
+if __name__ == '__main__':
+    unittest.main()
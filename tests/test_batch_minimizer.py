@@ -0,0 +1,144 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from utils.automata_utils import automata_are_equivalent
+from utils.batch_minimizer import find_automaton_files, minimize_files, minimized_file_path, _minimize_file
+from utils.file_utils import deserialize_automaton, deserialize_binary, load_automaton_file
+from utils.minimizer import minimize_automaton
+
+
+class TestBatchMinimizer(unittest.TestCase):
+    FILES = ["state_machine01.txt", "state_machine03.txt", "state_machine_24.txt", "state_machine_26.txt"]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for file_name in self.FILES:
+            shutil.copy(os.path.join("./resources", file_name), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_find_automaton_files(self):
+        expected = [os.path.join(self.directory, file_name) for file_name in sorted(self.FILES)]
+        self.assertEqual(expected, find_automaton_files([self.directory]))
+        self.assertEqual(expected[1:], find_automaton_files([os.path.join(self.directory, "*_2*.txt"),
+                                                              os.path.join(self.directory, "state_machine03.txt")]))
+
+        # Files that were already minimized are not picked up again
+        minimize_files(expected, workers=1)
+        self.assertEqual(expected, find_automaton_files([self.directory]))
+
+    def test_minimize_files(self):
+        input_paths = find_automaton_files([self.directory])
+        output_dir = os.path.join(self.directory, "minimized")
+        results = minimize_files(input_paths, output_dir=output_dir, workers=2, snapshots=True)
+
+        self.assertEqual(input_paths, [result.input_path for result in results])
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(minimized_file_path(result.input_path, output_dir), result.output_path)
+
+            expected = minimize_automaton(deserialize_automaton(result.input_path))
+            saved = deserialize_automaton(result.output_path)
+            self.assertEqual(len(expected.states), result.minimized_states)
+            self.assertEqual(len(expected.states), len(saved.states))
+            self.assertTrue(automata_are_equivalent(expected, saved))
+            self.assertTrue(automata_are_equivalent(expected, result.snapshot.to_automaton()))
+
+    def test_minimize_files_binary(self):
+        input_paths = find_automaton_files([self.directory])
+        results = minimize_files(input_paths, workers=2, chunksize=2, binary=True, snapshots=True)
+
+        for result in results:
+            self.assertTrue(result.output_path.endswith(".min.dfab"))
+            self.assertEqual(os.path.dirname(result.input_path), os.path.dirname(result.output_path))
+            self.assertTrue(automata_are_equivalent(deserialize_binary(result.output_path),
+                                                    result.snapshot.to_automaton()))
+
+    def test_invalid_file_does_not_stop_the_batch(self):
+        shutil.copy("./resources/state_machine02.txt", self.directory)
+        with open(os.path.join(self.directory, "empty.txt"), "w"):
+            pass
+
+        results = minimize_files(find_automaton_files([self.directory]), workers=2)
+        failed = {os.path.basename(result.input_path) for result in results if result.error}
+
+        self.assertIn("empty.txt", failed)
+        self.assertEqual(len(self.FILES), len([result for result in results if result.error is None]))
+
+    def test_any_error_does_not_stop_the_batch(self):
+        # Run in this process, so that the patch is seen
+        input_path = os.path.join(self.directory, "state_machine01.txt")
+        with mock.patch("utils.batch_minimizer.minimize_automaton", side_effect=KeyError("Q9")):
+            result = _minimize_file((input_path, minimized_file_path(input_path), False, None, False))
+
+        self.assertEqual("KeyError: 'Q9'", result.error)
+        self.assertIsNone(result.output_path)
+
+    def test_single_state_results_can_be_loaded(self):
+        """
+        Automata whose minimal DFA has one state (only the empty string, or nothing at all) are saved so that they can
+        be loaded back
+        """
+        input_paths = []
+        for name, text in (("empty_string.txt", ">*q0|a|q1\nq1|b|q1\n"), ("nothing.txt", ">q0|a|q1\nq1|b|q1\n")):
+            input_paths.append(os.path.join(self.directory, name))
+            with open(input_paths[-1], "w") as f:
+                f.write(text)
+
+        for binary in (False, True):
+            for result in minimize_files(input_paths, workers=1, binary=binary):
+                self.assertIsNone(result.error)
+                saved = load_automaton_file(result.output_path)
+                self.assertEqual(result.minimized_states, len(saved.states))
+                self.assertEqual(result.input_path.endswith("empty_string.txt"), saved.is_string_valid(""))
+                self.assertFalse(saved.is_string_valid("ab"))
+
+    def test_snapshot_is_picklable(self):
+        result = minimize_files([os.path.join(self.directory, "state_machine03.txt")], workers=1, snapshots=True)[0]
+        snapshot = pickle.loads(pickle.dumps(result.snapshot))
+
+        self.assertEqual(result.snapshot.state_ids, snapshot.state_ids)
+        self.assertEqual(result.snapshot.transitions, snapshot.transitions)
+
+    def test_stats(self):
+        input_paths = find_automaton_files([self.directory])
+        results = minimize_files(input_paths, workers=2, stats=True)
+
+        for result in results:
+            names = [phase_stats["name"] for phase_stats in result.stats]
+            self.assertEqual(["parse", "build_states", "minimize"], names[:3])
+            self.assertIn("save", names)
+
+        self.assertIsNone(minimize_files(input_paths[:1], workers=1)[0].stats)
+
+    def test_snapshots_are_optional(self):
+        result = minimize_files([os.path.join(self.directory, "state_machine03.txt")], workers=1)[0]
+
+        self.assertIsNone(result.snapshot)
+        self.assertEqual(len(load_automaton_file(result.output_path).states), result.minimized_states)
+
+    def test_cache(self):
+        input_paths = find_automaton_files([self.directory])
+        cache_dir = os.path.join(self.directory, "cache")
+
+        first = minimize_files(input_paths, workers=2, cache_dir=cache_dir, snapshots=True)
+        second = minimize_files(input_paths, workers=2, cache_dir=cache_dir, stats=True, snapshots=True)
+
+        self.assertEqual(len(input_paths), len(os.listdir(cache_dir)))
+        for first_result, second_result in zip(first, second):
+            self.assertEqual(first_result.snapshot.transitions, second_result.snapshot.transitions)
+            self.assertNotIn("minimize", [phase_stats["name"] for phase_stats in second_result.stats])
+
+    def test_repeated_output_paths(self):
+        other_directory = os.path.join(self.directory, "other")
+        os.makedirs(other_directory)
+        shutil.copy("./resources/state_machine01.txt", other_directory)
+
+        with self.assertRaises(ValueError):
+            minimize_files([os.path.join(self.directory, "state_machine01.txt"),
+                            os.path.join(other_directory, "state_machine01.txt")], output_dir=self.directory)
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks.generators import random_dfa, random_nfa, nth_symbol_from_the_end_nfa, random_strings, \
+    alphabet_of_size
+from benchmarks.run_benchmarks import BENCHMARKS, Result, run_benchmark, run_benchmarks, find_regressions, \
+    save_baseline, load_baseline, compare_to_references
+from automata.matcher import NFAMatcher
+from utils.automata_utils import is_dfa, automata_are_equivalent
+from utils.file_utils import serialize_automaton
+from utils.minimizer import minimize_automaton
+
+
+class TestGenerators(unittest.TestCase):
+    def test_same_seed_same_automaton(self):
+        self.assertEqual(serialize_automaton(random_dfa(50, 3, seed=1)), serialize_automaton(random_dfa(50, 3, seed=1)))
+        self.assertNotEqual(serialize_automaton(random_dfa(50, 3, seed=1)),
+                            serialize_automaton(random_dfa(50, 3, seed=2)))
+        self.assertEqual(serialize_automaton(random_nfa(50, 3, epsilon_density=0.5, seed=1)),
+                         serialize_automaton(random_nfa(50, 3, epsilon_density=0.5, seed=1)))
+
+    def test_random_dfa(self):
+        automaton = random_dfa(100, alphabet_size=4)
+        self.assertEqual(100, len(automaton.states))
+        self.assertEqual(("a", "b", "c", "d"), automaton.alphabet)
+        self.assertTrue(is_dfa(automaton))
+
+        partial = random_dfa(100, alphabet_size=4, density=0.5)
+        transitions = sum(len(state.transitions) for state in partial.states)
+        self.assertLess(transitions, 100 * 4)
+        self.assertFalse(is_dfa(partial))
+
+    def test_random_nfa(self):
+        automaton = random_nfa(200, alphabet_size=2, density=2.0, epsilon_density=0.5)
+        transitions = [len(state.transitions.get(symbol, [])) for state in automaton.states for symbol in "ab"]
+        epsilon_transitions = sum(len(state.transitions.get(" ", [])) for state in automaton.states)
+
+        self.assertAlmostEqual(2.0, sum(transitions) / len(transitions), delta=0.3)
+        self.assertAlmostEqual(0.5, epsilon_transitions / len(automaton.states), delta=0.15)
+        self.assertFalse(is_dfa(automaton))
+
+        self.assertFalse(any(" " in state.transitions for state in random_nfa(200).states))
+
+    def test_nth_symbol_from_the_end(self):
+        for n in range(1, 7):
+            automaton = nth_symbol_from_the_end_nfa(n)
+            matcher = NFAMatcher(automaton)
+
+            self.assertEqual(n + 1, len(automaton.states))
+            self.assertEqual(2 ** n, len(minimize_automaton(nth_symbol_from_the_end_nfa(n)).states))
+
+            for input_string in random_strings(automaton.alphabet, 100, 12, seed=n):
+                self.assertEqual(len(input_string) >= n and input_string[-n] == "a", matcher.matches(input_string))
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            alphabet_of_size(0)
+        with self.assertRaises(ValueError):
+            random_dfa(0)
+        with self.assertRaises(ValueError):
+            nth_symbol_from_the_end_nfa(3, symbol="z")
+
+
+class TestRunBenchmarks(unittest.TestCase):
+    def test_every_benchmark_runs(self):
+        results = run_benchmarks(scale=0.02, repeat=1)
+
+        self.assertEqual([benchmark.name for benchmark in BENCHMARKS], [result.name for result in results])
+        for result in results:
+            self.assertGreaterEqual(result.seconds, 0)
+            self.assertGreaterEqual(result.peak_bytes, 0)
+
+        with self.assertRaises(ValueError):
+            run_benchmarks(["no_such_benchmark"])
+
+    def test_setup_is_repeated(self):
+        # clean_epsilon_transition changes the automaton it gets, every run must start from a fresh one
+        benchmark = next(benchmark for benchmark in BENCHMARKS if benchmark.name == "clean_epsilon_transition")
+        automata = []
+        run_benchmark(benchmark._replace(run=automata.append), scale=0.01, repeat=3)
+
+        self.assertEqual(4, len(automata))
+        self.assertEqual(4, len(set(map(id, automata))))
+        self.assertTrue(automata_are_equivalent(minimize_automaton(automata[0]), minimize_automaton(automata[1])))
+
+    def test_bytes_per_state(self):
+        results = run_benchmarks(["build_dfa_states", "build_dfa_states_dict_layout"], scale=0.1, repeat=1)
+        self.assertEqual([2000, 2000], [result.states for result in results])
+
+        comparisons = compare_to_references(results)
+        self.assertEqual(1, len(comparisons))
+        self.assertTrue(comparisons[0].startswith("build_dfa_states: "))
+        # __slots__ and single targets take less memory than a __dict__ and a list per symbol
+        self.assertLess(results[0].peak_bytes, results[1].peak_bytes)
+
+        self.assertEqual([], compare_to_references(results[:1]))
+
+    def test_find_regressions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            save_baseline(path, [Result("fast", 0.1, 1000), Result("small", 0.001, 1000)], 1.0)
+            baseline = load_baseline(path)
+
+            with open(path) as f:
+                self.assertEqual(1.0, json.load(f)["scale"])
+
+        self.assertEqual([], find_regressions([Result("fast", 0.12, 1050), Result("new", 10.0, 10 ** 9)], baseline))
+        # Tiny benchmarks don't regress because of timer noise
+        self.assertEqual([], find_regressions([Result("small", 0.003, 1000)], baseline))
+
+        regressions = find_regressions([Result("fast", 0.2, 1000), Result("small", 0.001, 2000)], baseline)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(regressions[0].startswith("fast"))
+        self.assertTrue(regressions[1].startswith("small"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from utils.automata_utils import automata_are_equivalent
+from utils.cache import MinimizationCache, cache_key, STALE_TEMPORARY_SECONDS
+from utils.file_utils import deserialize_automaton, parse_automaton_lines, serialize_automaton
+from utils.minimizer import minimize_automaton
+from utils.stats import collect_stats
+
+
+class TestMinimizationCache(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = self.temporary_directory.name
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_key_ignores_the_order_of_the_lines(self):
+        with open("./resources/state_machine_26.txt") as f:
+            lines = f.readlines()
+
+        shuffled = list(lines)
+        random.Random(1).shuffle(shuffled)
+
+        automaton = parse_automaton_lines(lines).to_automaton()
+        self.assertEqual(cache_key(automaton), cache_key(parse_automaton_lines(shuffled).to_automaton()))
+
+        # Any change of the automaton changes the key
+        automaton.states[-1].is_final = not automaton.states[-1].is_final
+        self.assertNotEqual(cache_key(automaton), cache_key(parse_automaton_lines(lines).to_automaton()))
+        self.assertNotEqual(cache_key(deserialize_automaton("./resources/state_machine03.txt")),
+                            cache_key(parse_automaton_lines(lines).to_automaton()))
+
+    def test_hit_skips_the_minimization(self):
+        cache = MinimizationCache(self.directory)
+
+        with collect_stats(trace_memory=False) as collector:
+            first = cache.minimize(deserialize_automaton("./resources/state_machine_26.txt"))
+            second = cache.minimize(deserialize_automaton("./resources/state_machine_26.txt"))
+
+        names = [phase_stats["name"] for phase_stats in collector.to_list()]
+        self.assertEqual(1, names.count("minimize"))
+        self.assertEqual(1, names.count("determinize"))
+        lookups = [phase_stats["counters"] for phase_stats in collector.to_list()
+                   if phase_stats["name"] == "cache_lookup"]
+        self.assertEqual([{"cache_misses": 1}, {"cache_hits": 1}], lookups)
+
+        expected = minimize_automaton(deserialize_automaton("./resources/state_machine_26.txt"))
+        for result in (first, second):
+            self.assertEqual(serialize_automaton(expected), serialize_automaton(result))
+            self.assertTrue(automata_are_equivalent(expected, result))
+
+        self.assertEqual([], [name for name in os.listdir(self.directory) if name.endswith(".tmp")])
+
+    def test_lru_eviction(self):
+        cache = MinimizationCache(self.directory)
+        keys = []
+        for i, file_name in enumerate(["state_machine01.txt", "state_machine03.txt", "state_machine_24.txt"]):
+            automaton = deserialize_automaton(os.path.join("./resources", file_name))
+            keys.append(cache_key(automaton))
+            cache.minimize(automaton)
+            os.utime(cache.path_of(keys[-1]), ns=(i * 10 ** 9, i * 10 ** 9))
+
+        # Reading the oldest result makes it the most recently used one
+        self.assertIsNotNone(cache.get(keys[0]))
+
+        cache.max_bytes = cache.size() - 1
+        cache.evict()
+
+        self.assertFalse(os.path.exists(cache.path_of(keys[1])))
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+        cache.max_bytes = 0
+        cache.evict()
+        self.assertEqual(0, cache.size())
+
+    def test_stale_temporary_files(self):
+        cache = MinimizationCache(self.directory)
+        stale_path = os.path.join(self.directory, ".crashed.tmp")
+        fresh_path = os.path.join(self.directory, ".writing.tmp")
+        for path in (stale_path, fresh_path):
+            with open(path, "wb") as f:
+                f.write(b"DFAB" * 100)
+        stale_time = time.time_ns() - (STALE_TEMPORARY_SECONDS + 60) * 10 ** 9
+        os.utime(stale_path, ns=(stale_time, stale_time))
+
+        # The temporary files take room too
+        self.assertEqual(800, cache.size())
+
+        with collect_stats(trace_memory=False) as collector:
+            cache.evict()
+        self.assertEqual(1, collector.to_list()[0]["counters"]["cache_stale_temporaries"])
+        self.assertFalse(os.path.exists(stale_path))
+        self.assertTrue(os.path.exists(fresh_path))
+
+    def test_scans_only_when_full(self):
+        automata = [deserialize_automaton(os.path.join("./resources", file_name))
+                    for file_name in ("state_machine01.txt", "state_machine03.txt", "state_machine_24.txt")]
+        cache = MinimizationCache(self.directory)
+
+        with mock.patch.object(cache, "_entries", wraps=cache._entries) as entries:
+            cache.minimize(automata[0])
+            cache.minimize(automata[1])
+            self.assertEqual(1, entries.call_count)     # The first save finds the size of the cache
+
+            cache.max_bytes = cache.size()
+            entries.reset_mock()
+            cache.minimize(automata[2])
+            self.assertEqual(1, entries.call_count)
+
+        self.assertLessEqual(cache.size(), cache.max_bytes)
+        self.assertIsNotNone(cache.get(cache_key(automata[2])))
+
+    def test_damaged_file(self):
+        cache = MinimizationCache(self.directory)
+        automaton = deserialize_automaton("./resources/state_machine03.txt")
+        key = cache_key(automaton)
+
+        with open(cache.path_of(key), "wb") as f:
+            f.write(b"DFAB garbage")
+
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(os.path.exists(cache.path_of(key)))
+        self.assertTrue(automata_are_equivalent(minimize_automaton(deserialize_automaton(
+            "./resources/state_machine03.txt")), cache.minimize(automaton)))
+
+        # An offset past the end of the file
+        minimized = cache.minimize(automaton)
+        with open(cache.path_of(key), "r+b") as f:
+            f.seek(24)
+            f.write(b"\xff" * 8)
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(os.path.exists(cache.path_of(key)))
+        self.assertEqual(len(minimized.states), len(cache.minimize(automaton).states))
+
+        with self.assertRaises(ValueError):
+            MinimizationCache(self.directory, max_bytes=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
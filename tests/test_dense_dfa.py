@@ -0,0 +1,113 @@
+import unittest
+from array import array
+
+from automata.dense_dfa import DenseDFA, accepting_bitmap
+from automata.state_machine import Automaton, State
+from tests.automata_examples import state_machine_1, state_machine_2, state_machine_nfa_1
+from utils.automata_utils import automata_are_equivalent
+
+
+class DenseDFATest(unittest.TestCase):
+
+    def test_round_trip(self):
+        """
+        Converting a DFA to a DenseDFA and back must give the same states, in the same order, with the same language
+        """
+        for automaton in (state_machine_1()[0], state_machine_2()[0], state_machine_2()[1]):
+            dense = DenseDFA.from_automaton(automaton)
+            result = dense.to_automaton()
+
+            self.assertEqual([state.state_id for state in automaton.states],
+                             [state.state_id for state in result.states])
+            self.assertEqual(automaton.states, result.states)
+            self.assertEqual(automaton.alphabet, result.alphabet)
+            self.assertTrue(result.initial_state.is_initial)
+            self.assertTrue(automata_are_equivalent(automaton, result))
+
+    def test_transition_table(self):
+        automaton, _ = state_machine_1()
+        dense = DenseDFA.from_automaton(automaton)
+
+        self.assertEqual(7, dense.state_count)
+        self.assertEqual(("0", "1"), dense.alphabet)
+        self.assertEqual(7 * 2, len(dense.transitions))
+        self.assertEqual("1", dense.state_ids[dense.initial_state])
+
+        for i, state in enumerate(automaton.states):
+            self.assertEqual(state.is_final, dense.is_final(i))
+
+            for symbol_index, symbol in enumerate(dense.alphabet):
+                target = dense.transitions[i * dense.alphabet_size + symbol_index]
+                self.assertIs(state.transitions[symbol][0], automaton.states[target])
+                self.assertEqual(target, dense.target(i, symbol_index))
+
+    def test_partial_dfa(self):
+        """
+        Missing transitions are stored as -1 and are left out when converting back
+        """
+        s0 = State("S0", is_initial=True)
+        s1 = State("S1", is_final=True)
+        s0.transitions["a"] = [s1]
+        s1.transitions["b"] = [s0]
+
+        dense = DenseDFA.from_automaton(Automaton([s0, s1]))
+        self.assertEqual(array("i", [1, -1, -1, 0]), dense.transitions)
+
+        result = dense.to_automaton()
+        self.assertNotIn("b", result.states[0].transitions)
+        self.assertNotIn("a", result.states[1].transitions)
+
+    def test_nfa_is_rejected(self):
+        nfa, _ = state_machine_nfa_1()
+
+        with self.assertRaises(ValueError):
+            DenseDFA.from_automaton(nfa)
+
+    def test_invalid_tables(self):
+        with self.assertRaises(ValueError):
+            DenseDFA(["A", "B"], ("a",), array("i", [0]), bytearray(1))
+
+        with self.assertRaises(ValueError):
+            DenseDFA(["A"], ("a",), array("i", [0]), bytearray(2))
+
+        with self.assertRaises(ValueError):
+            DenseDFA(["A"], ("a",), array("i", [0]), bytearray(1), initial_state=1)
+
+    def test_accepting_bitmap(self):
+        flags = [i % 3 == 0 for i in range(20)]
+        bitmap = accepting_bitmap(flags)
+
+        self.assertEqual(3, len(bitmap))
+        dense = DenseDFA([str(i) for i in range(20)], ("a",), array("i", [0] * 20), bitmap)
+        self.assertEqual(flags, [dense.is_final(i) for i in range(20)])
+
+    def test_symbol_classes(self):
+        # b and d behave like a in every state, c doesn't
+        transitions = array("i", [1, 1, 0, 1,
+                                  0, 0, 0, 0,
+                                  -1, -1, 2, -1])
+        dense = DenseDFA(["A", "B", "C"], ("a", "b", "c", "d"), transitions, accepting_bitmap([False, True, False]))
+
+        class_of, representatives = dense.symbol_classes()
+        self.assertEqual([0, 0, 1, 0], class_of)
+        self.assertEqual([0, 2], representatives)
+
+        restricted = dense.restrict_symbols(representatives)
+        self.assertEqual(("a", "c"), restricted.alphabet)
+        self.assertEqual([1, 0, 0, 0, -1, 2], list(restricted.transitions))
+        self.assertIs(dense, dense.restrict_symbols([0, 1, 2, 3]))
+
+    def test_trusted_constructor_keeps_order(self):
+        s1 = State("B")
+        s2 = State("A", is_initial=True)
+        s1.transitions["x"] = [s2]
+
+        automaton = Automaton.from_trusted_states([s1, s2], s2, ("x",))
+
+        self.assertIs(s1, automaton.states[0])
+        self.assertIs(s2, automaton.initial_state)
+        self.assertEqual(("x",), automaton.alphabet)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import itertools
+import unittest
+
+from automata.state_machine import Automaton, State
+from tests.automata_examples import state_machine_nfa_2, state_machine_nfa_3
+from utils.automata_utils import clean_epsilon_transition, epsilon_closures, nfa_2_dfa
+
+
+class EpsilonTransitionsTest(unittest.TestCase):
+
+    def test_epsilon_closures(self):
+        """
+        A <-> B form a cycle that reaches C, D only reaches itself
+        """
+        s_a = State("A", is_initial=True)
+        s_b = State("B")
+        s_c = State("C", is_final=True)
+        s_d = State("D")
+        s_a.transitions[" "] = [s_b]
+        s_b.transitions[" "] = [s_a, s_c]
+        s_d.transitions["x"] = [s_a]
+
+        states = [s_a, s_b, s_c, s_d]
+        closures = epsilon_closures(states, {state: i for i, state in enumerate(states)})
+
+        self.assertEqual([0b0111, 0b0111, 0b0100, 0b1000], closures)
+
+    def test_clean_epsilon_transition(self):
+        automaton = state_machine_nfa_2()
+        expected = {}
+        for length in range(6):
+            for chars in itertools.product("01", repeat=length):
+                input_string = "".join(chars)
+                expected[input_string] = automaton.compile().matches(input_string)
+
+        result = clean_epsilon_transition(automaton)
+
+        for state in result.states:
+            self.assertNotIn(" ", state.transitions)
+            for targets in state.transitions.values():
+                self.assertEqual(len(targets), len(set(targets)), "A transition was repeated")
+
+        for input_string, is_valid in expected.items():
+            self.assertEqual(is_valid, result.is_string_valid(input_string), input_string)
+
+    def test_result_does_not_depend_on_the_order_of_the_states(self):
+        """
+        A -eps-> B -eps-> C(final), all of them must become final no matter which one is cleaned first
+        """
+        for order in itertools.permutations(range(3)):
+            states = [State("A", is_initial=True), State("B"), State("C", is_final=True)]
+            states[0].transitions[" "] = [states[1]]
+            states[1].transitions[" "] = [states[2]]
+            states[2].transitions["a"] = [states[0]]
+
+            automaton = Automaton.from_trusted_states([states[i] for i in order], states[0], (" ", "a"))
+            clean_epsilon_transition(automaton)
+
+            self.assertTrue(all(state.is_final for state in states))
+            self.assertTrue(all(state.transitions["a"] == [states[0]] for state in states))
+
+    def test_long_epsilon_chain(self):
+        """
+        Each state of a 3000-state epsilon chain reaches every state after it
+        """
+        states = [State(str(i), is_initial=(i == 0), is_final=(i == 2999)) for i in range(3000)]
+        for i in range(2999):
+            states[i].transitions[" "] = [states[i + 1]]
+            states[i].transitions["a"] = [states[i]]
+
+        dfa = nfa_2_dfa(Automaton(states))
+
+        self.assertTrue(dfa.initial_state.is_final)
+        self.assertTrue(dfa.is_string_valid("aaa"))
+
+    def test_nfa_2_dfa_with_epsilon(self):
+        nfa = state_machine_nfa_3()
+        matcher = nfa.compile()
+        dfa = nfa_2_dfa(nfa)
+
+        # The NFA is not modified by the conversion
+        self.assertIn(" ", nfa.initial_state.transitions)
+
+        for length in range(6):
+            for chars in itertools.product("01", repeat=length):
+                input_string = "".join(chars)
+                self.assertEqual(matcher.matches(input_string), dfa.is_string_valid(input_string), input_string)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,11 @@
+import random
 import unittest
 
-from automata.state_machine import State
+from automata.dense_dfa import DenseDFA
+from automata.state_machine import Automaton, State
 from tests.automata_examples import state_machine_1, state_machine_2, state_machine_3
-from utils.automata_utils import automata_are_equivalent, states_are_compatible
+from utils.automata_utils import automata_are_equivalent, dense_dfas_are_equivalent, states_are_compatible
+from utils.minimizer import minimize_automaton
 
 
 class EquivalentAutomataTest(unittest.TestCase):
@@ -94,6 +97,50 @@ class EquivalentAutomataTest(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertFalse(result)
 
+    def test_missing_transitions_go_to_a_sink(self):
+        """
+        A partial DFA is equivalent to the complete one with an explicit reject state, and a symbol that only leads
+        to the reject state doesn't change the language
+        """
+        s0 = State("0", is_initial=True)
+        s1 = State("1", is_final=True)
+        s0.transitions["a"] = [s1]
+        partial = Automaton([s0, s1])
+
+        c0 = State("0", is_initial=True)
+        c1 = State("1", is_final=True)
+        sink = State("SINK")
+        c0.transitions["a"] = [c1]
+        c0.transitions["b"] = [sink]
+        for state in (c1, sink):
+            state.transitions["a"] = [sink]
+            state.transitions["b"] = [sink]
+        complete = Automaton([c0, c1, sink])
+
+        self.assertTrue(automata_are_equivalent(partial, complete))
+        self.assertTrue(automata_are_equivalent(complete, partial))
+
+        # Now "b" is accepted too, so they are not equivalent anymore
+        c0.transitions["b"] = [c1]
+        self.assertFalse(automata_are_equivalent(partial, complete))
+        self.assertFalse(automata_are_equivalent(complete, partial))
+
+    def test_big_random_automata(self):
+        rnd = random.Random(3)
+        states = [State(str(i), is_initial=(i == 0), is_final=rnd.random() < 0.2) for i in range(2000)]
+        for state in states:
+            for symbol in "abc":
+                state.transitions[symbol] = [rnd.choice(states)]
+        big_automaton = Automaton(states)
+        mini_automaton = minimize_automaton(big_automaton)
+
+        self.assertTrue(automata_are_equivalent(big_automaton, mini_automaton))
+
+        # Flipping the initial state changes whether the empty string is accepted
+        dense = DenseDFA.from_automaton(mini_automaton)
+        dense.accepting[dense.initial_state >> 3] ^= 1 << (dense.initial_state & 7)
+        self.assertFalse(dense_dfas_are_equivalent(DenseDFA.from_automaton(big_automaton), dense))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,137 @@
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from automata.state_machine import Automaton, State
+from benchmarks.generators import random_dfa
+from tests.automata_examples import state_machine_1, state_machine_2, state_machine_nfa_1
+from utils.automata_utils import automata_are_equivalent
+from utils.file_utils import deserialize_automaton
+from utils.fingerprint import canonical_dfa, fingerprint, LanguageRegistry
+from utils.minimizer import minimize_automaton
+
+
+def _renamed(automaton: Automaton, seed: int) -> Automaton:
+    """
+    The same automaton with other state IDs, and its states and transitions added in another order
+    """
+    generator = random.Random(seed)
+    states = list(automaton.states)
+    generator.shuffle(states)
+    renamed = {state: State("X{}".format(generator.random()), is_initial=state.is_initial, is_final=state.is_final)
+               for state in states}
+
+    for state in states:
+        transitions = list(state.transitions.items())
+        generator.shuffle(transitions)
+        for symbol, targets in transitions:
+            renamed[state].transitions[symbol] = [renamed[target] for target in targets]
+
+    return Automaton(list(renamed.values()))
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_equivalent_automata(self):
+        nfa, dfa = state_machine_nfa_1()
+        self.assertEqual(fingerprint(nfa), fingerprint(dfa))
+        self.assertEqual(fingerprint(dfa), fingerprint(minimize_automaton(dfa)))
+
+        automaton = random_dfa(200, alphabet_size=3, seed=3)
+        renamed = _renamed(automaton, seed=3)
+        self.assertTrue(automata_are_equivalent(automaton, renamed))
+        self.assertEqual(fingerprint(automaton), fingerprint(renamed))
+
+    def test_different_languages(self):
+        automata = (state_machine_1()[0], state_machine_2()[0], state_machine_nfa_1()[0],
+                    deserialize_automaton("./resources/state_machine_26.txt"))
+        fingerprints = {fingerprint(automaton) for automaton in automata}
+        self.assertEqual(4, len(fingerprints))
+
+    def test_canonical_form(self):
+        """
+        The states are numbered in breadth first order and dead states and the symbols only they use are dropped
+        """
+        s_a = State("A", is_initial=True)
+        s_b = State("B")
+        s_c = State("C", is_final=True)
+        s_dead = State("D")
+        s_a.transitions["z"] = [s_c]
+        s_a.transitions["y"] = [s_b]
+        s_a.transitions["w"] = [s_dead]
+        s_b.transitions["z"] = [s_c]
+        s_c.transitions["y"] = [s_b]
+        s_dead.transitions["w"] = [s_dead]
+        automaton = Automaton([s_a, s_b, s_c, s_dead])
+
+        canonical = canonical_dfa(automaton)
+        self.assertEqual(["C0", "C1", "C2"], canonical.state_ids)
+        self.assertEqual(("y", "z"), canonical.alphabet)
+        self.assertEqual([1, 2, -1, 2, 1, -1], list(canonical.transitions))
+        self.assertEqual([False, False, True], [canonical.is_final(state) for state in range(3)])
+        self.assertTrue(automata_are_equivalent(automaton, canonical.to_automaton()))
+
+        # Without the dead state the language is the same
+        del s_a.transitions["w"]
+        self.assertEqual(fingerprint(automaton), fingerprint(Automaton([s_a, s_b, s_c])))
+
+    def test_independent_of_file_format(self):
+        automaton = state_machine_1()[0]
+        expected = fingerprint(automaton)
+
+        with mock.patch("utils.file_utils.BINARY_VERSION", 99), mock.patch("utils.file_utils.BINARY_MAGIC", b"XXXX"):
+            self.assertEqual(expected, fingerprint(automaton))
+
+    def test_empty_language(self):
+        s_a = State("A", is_initial=True)
+        s_b = State("B")
+        s_a.transitions["0"] = [s_b]
+        s_b.transitions["1"] = [s_a]
+        s_c = State("C", is_initial=True)
+
+        canonical = canonical_dfa(Automaton([s_a, s_b]))
+        self.assertEqual((["C0"], ()), (canonical.state_ids, canonical.alphabet))
+        self.assertEqual(fingerprint(Automaton([s_a, s_b])), fingerprint(Automaton([s_c])))
+
+
+class LanguageRegistryTest(unittest.TestCase):
+
+    def test_register_and_find(self):
+        nfa, dfa = state_machine_nfa_1()
+        registry = LanguageRegistry()
+
+        self.assertEqual("nfa", registry.register("nfa", nfa))
+        self.assertEqual("sm1", registry.register("sm1", state_machine_1()[0]))
+        self.assertEqual("nfa", registry.register("dfa", dfa))
+        self.assertEqual("nfa", registry.register("dfa", dfa))
+
+        self.assertEqual(2, len(registry))
+        self.assertIn("dfa", registry)
+        self.assertEqual(["nfa", "dfa"], registry.equivalent_ids("dfa"))
+        self.assertEqual("nfa", registry.find(minimize_automaton(dfa)))
+        self.assertIsNone(registry.find(state_machine_2()[0]))
+
+        with self.assertRaises(ValueError):
+            registry.register("sm1", state_machine_2()[0])
+
+    def test_save_and_load(self):
+        registry = LanguageRegistry()
+        for i in range(6):
+            registry.register(str(i), random_dfa(30, alphabet_size=2, seed=i % 3))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "registry.json")
+            registry.save(path)
+            loaded = LanguageRegistry.load(path)
+
+        self.assertEqual(3, len(registry))
+        self.assertEqual(3, len(loaded))
+        for i in range(6):
+            self.assertEqual(registry.equivalent_ids(str(i)), loaded.equivalent_ids(str(i)))
+            self.assertEqual(registry.fingerprint_of(str(i)), loaded.fingerprint_of(str(i)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import random
+import unittest
+
+from automata.state_machine import Automaton, State
+from benchmarks.generators import random_dfa
+from tests.automata_examples import state_machine_1
+from utils.automata_utils import automata_are_equivalent
+from utils.incremental_minimizer import IncrementalMinimizer
+from utils.minimizer import minimize_automaton, _hopcroft_partition
+
+
+class TestIncrementalMinimizer(unittest.TestCase):
+    def test_initial_partition(self):
+        automaton, _ = state_machine_1()
+        minimizer = IncrementalMinimizer.from_automaton(automaton)
+        expected = minimize_automaton(state_machine_1()[0])
+
+        self.assertEqual(len(expected.states), minimizer.state_count)
+        self.assertTrue(automata_are_equivalent(expected, minimizer.to_automaton()))
+
+    def test_random_edits(self):
+        for seed in range(60):
+            rnd = random.Random(seed)
+            automaton = random_dfa(rnd.randint(1, 20), alphabet_size=rnd.randint(1, 3),
+                                   density=rnd.choice([1.0, 0.7]), final_ratio=rnd.random(), seed=seed)
+            minimizer = IncrementalMinimizer.from_automaton(automaton)
+            state_ids = minimizer.state_ids
+
+            for _ in range(20):
+                operation = rnd.random()
+                symbol = rnd.choice(minimizer.alphabet or ["x"])
+
+                if operation < 0.5:
+                    minimizer.set_transition(rnd.choice(state_ids), symbol, rnd.choice(state_ids))
+                elif operation < 0.75:
+                    minimizer.remove_transition(rnd.choice(state_ids), symbol)
+                else:
+                    minimizer.set_final(rnd.choice(state_ids), rnd.random() < 0.5)
+
+                self.assertEqual(self._full_partition(minimizer), self._partition(minimizer))
+
+            edited = minimizer.to_dense_dfa().to_automaton()
+            self.assertTrue(automata_are_equivalent(minimize_automaton(edited), minimizer.to_automaton()))
+
+    def test_unreachable_states_are_left_out(self):
+        """
+        The partition covers the states that can't be reached, the minimal DFA doesn't
+        """
+        automaton = random_dfa(12, seed=0)
+        minimizer = IncrementalMinimizer.from_automaton(automaton)
+        self.assertEqual(len(minimize_automaton(random_dfa(12, seed=0)).states), minimizer.state_count)
+
+        rnd = random.Random(5)
+        for _ in range(200):
+            # Redirecting transitions to the initial state disconnects the states behind them
+            source, symbol, operation = rnd.choice(minimizer.state_ids), rnd.choice(minimizer.alphabet), rnd.random()
+            if operation < 0.6:
+                minimizer.set_transition(source, symbol, minimizer.state_ids[0])
+            elif operation < 0.8:
+                minimizer.set_transition(source, symbol, rnd.choice(minimizer.state_ids))
+            else:
+                minimizer.remove_transition(source, symbol)
+
+            result = minimizer.to_automaton()
+            expected = minimize_automaton(minimizer.to_dense_dfa().to_automaton())
+            self.assertEqual(len(expected.states), minimizer.state_count)
+            self.assertEqual(len(expected.states), len(result.states))
+            self.assertTrue(automata_are_equivalent(expected, result))
+
+    def test_new_symbol(self):
+        minimizer = IncrementalMinimizer.from_automaton(random_dfa(10, alphabet_size=2, seed=3))
+        minimizer.set_transition("Q1", "z", "Q2")
+
+        self.assertEqual(("a", "b", "z"), tuple(minimizer.alphabet))
+        self.assertEqual(self._full_partition(minimizer), self._partition(minimizer))
+
+        with self.assertRaises(ValueError):
+            minimizer.set_transition("Q1", " ", "Q2")
+        with self.assertRaises(ValueError):
+            minimizer.set_final("Q99")
+
+    def test_edits_are_local(self):
+        # A chain 0 -a-> 1 -a-> ... -a-> 99, only the states before an edit are affected by it
+        states = [State(str(i), is_initial=(i == 0), is_final=(i % 10 == 9)) for i in range(100)]
+        for state, next_state in zip(states, states[1:]):
+            state.transitions["a"] = [next_state]
+        minimizer = IncrementalMinimizer.from_automaton(Automaton(states))
+
+        self.assertEqual(100, minimizer.state_count)
+        self.assertEqual(6, minimizer.set_final("5"))
+        self.assertEqual(0, minimizer.set_final("5"))
+        self.assertEqual(91, minimizer.remove_transition("90", "a"))
+
+        # Dropping the last final state makes the tail dead, so it is merged with the implicit reject state
+        minimizer.set_final("99", False)
+        self.assertEqual(self._full_partition(minimizer), self._partition(minimizer))
+        self.assertIn({str(i) for i in range(90, 100)}, minimizer.equivalence_classes())
+
+    def test_loops(self):
+        # Two copies of the loop (ab)*, editing one of them and undoing the edit makes them equivalent again
+        states = [State("S", is_initial=True), State("A1", is_final=True), State("B1"), State("A2", is_final=True),
+                  State("B2")]
+        start, a1, b1, a2, b2 = states
+        start.transitions["a"] = [a1]
+        start.transitions["b"] = [a2]
+        a1.transitions["a"] = [b1]
+        b1.transitions["b"] = [a1]
+        a2.transitions["a"] = [b2]
+        b2.transitions["b"] = [a2]
+        minimizer = IncrementalMinimizer.from_automaton(Automaton(states))
+        self.assertIn({"A1", "A2"}, minimizer.equivalence_classes())
+
+        minimizer.set_transition("B2", "a", "B2")
+        self.assertNotIn({"A1", "A2"}, minimizer.equivalence_classes())
+        self.assertEqual(self._full_partition(minimizer), self._partition(minimizer))
+
+        minimizer.remove_transition("B2", "a")
+        self.assertIn({"A1", "A2"}, minimizer.equivalence_classes())
+        self.assertIn({"B1", "B2"}, minimizer.equivalence_classes())
+
+    @staticmethod
+    def _partition(minimizer: IncrementalMinimizer) -> list:
+        return sorted(sorted(members) for members in minimizer.equivalence_classes())
+
+    @staticmethod
+    def _full_partition(minimizer: IncrementalMinimizer) -> list:
+        dfa = minimizer.to_dense_dfa()
+        sink = dfa.state_count
+        transitions = [sink if target == -1 else target for target in dfa.transitions] + [sink] * dfa.alphabet_size
+        finals = [dfa.is_final(state) for state in range(sink)] + [False]
+        block_of = _hopcroft_partition(sink + 1, dfa.alphabet_size, transitions, finals)
+
+        blocks = {}
+        for state, block in enumerate(block_of):
+            blocks.setdefault(block, set()).add(dfa.state_ids[state] if state < sink else None)
+
+        return sorted(sorted(members - {None}) for members in blocks.values() if members != {None})
+
+
+if __name__ == '__main__':
+    unittest.main()
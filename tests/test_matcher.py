@@ -0,0 +1,241 @@
+import itertools
+import random
+import unittest
+
+from automata.dense_dfa import DenseDFA
+from automata.matcher import DFAMatcher, NFAMatcher, LazyDFAMatcher
+from automata.state_machine import Automaton, State
+from tests.automata_examples import state_machine_1, state_machine_2, state_machine_nfa_1, state_machine_nfa_4
+from utils.automata_utils import nfa_2_dfa
+from utils.file_utils import deserialize_automaton_str
+
+
+class MatcherTest(unittest.TestCase):
+
+    def test_dfa_matches_like_is_string_valid(self):
+        """
+        The compiled matcher must agree with is_string_valid on every string up to length 6
+        """
+        for automaton in (state_machine_1()[0], state_machine_2()[0]):
+            matcher = automaton.compile()
+            self.assertIsInstance(matcher, DFAMatcher)
+
+            for length in range(7):
+                for chars in itertools.product("01", repeat=length):
+                    input_string = "".join(chars)
+                    self.assertEqual(automaton.is_string_valid(input_string), matcher.matches(input_string),
+                                     input_string)
+                    self.assertEqual(automaton.is_string_valid(input_string),
+                                     matcher.matches(input_string.encode("ascii")), input_string)
+
+    def test_nfa_matches_like_is_string_valid(self):
+        nfa, dfa = state_machine_nfa_1()
+        matcher = nfa.compile()
+        self.assertIsInstance(matcher, NFAMatcher)
+
+        for length in range(7):
+            for chars in itertools.product("01", repeat=length):
+                input_string = "".join(chars)
+                self.assertEqual(dfa.is_string_valid(input_string), matcher.matches(input_string), input_string)
+                self.assertEqual(nfa.is_string_valid(input_string), matcher.matches(input_string), input_string)
+
+        nfa = state_machine_nfa_4()
+        matcher = nfa.compile()
+        self.assertTrue(matcher.matches(b"0100111"))
+        self.assertFalse(matcher.matches(b"0101010"))
+
+    def test_nfa_epsilon_closure(self):
+        """
+        A -a-> B -eps-> C(final), "a" is recognized through the epsilon transition
+        """
+        s_a = State("A", is_initial=True)
+        s_b = State("B")
+        s_c = State("C", is_final=True)
+        s_a.transitions["a"] = [s_b]
+        s_b.transitions[" "] = [s_c]
+
+        matcher = Automaton([s_a, s_b, s_c]).compile()
+        self.assertTrue(matcher.matches("a"))
+        self.assertFalse(matcher.matches(""))
+        self.assertFalse(matcher.matches("aa"))
+
+    def test_unknown_symbols_and_dead_states(self):
+        big_automaton, _ = state_machine_2()
+        matcher = big_automaton.compile()
+
+        # State 12 of state_machine_2 is dead, once "100" is read nothing can be accepted anymore
+        self.assertFalse(matcher.matches("1100" + "1" * 10000))
+        self.assertTrue(matcher.matches("0101"))
+        self.assertFalse(matcher.matches("01x01"))
+        self.assertFalse(matcher.matches(memoryview(b"01x01")))
+
+    def test_long_input(self):
+        automaton, _ = state_machine_1()
+        matcher = automaton.compile()
+        input_string = "01" * 50000 + "10"
+
+        self.assertTrue(matcher.matches(input_string))
+        self.assertTrue(automaton.is_string_valid(input_string))
+        self.assertFalse(matcher.matches(input_string + "1"))
+
+    def test_accepts_many(self):
+        """
+        The batch API must give the same answers as matches(), including for empty strings and unknown characters
+        """
+        for automaton in (state_machine_1()[0], state_machine_2()[0], state_machine_nfa_1()[0]):
+            matcher = automaton.compile()
+            input_strings = ["".join(chars) for length in range(6) for chars in itertools.product("01", repeat=length)]
+            input_strings.extend(["0x1", "é", "11" * 40])
+
+            expected = [matcher.matches(input_string) for input_string in input_strings]
+            self.assertEqual(expected, [bool(result) for result in matcher.accepts_many(input_strings)])
+
+            input_bytes = [input_string.encode("utf8") for input_string in input_strings]
+            self.assertEqual(expected, [bool(result) for result in matcher.accepts_many(input_bytes)])
+
+            if isinstance(matcher, DFAMatcher):
+                chunked = matcher.accepts_many(input_strings, chunk_size=7)
+                self.assertEqual(expected, [bool(result) for result in chunked])
+
+        self.assertEqual(0, len(state_machine_1()[0].compile().accepts_many([])))
+
+    def test_lazy_dfa_cache(self):
+        """
+        The n-th symbol from the end NFA with n = 20 has a DFA of 2^20 states, the lazy matcher only builds the ones
+        the input visits
+        """
+        nfa = self._nth_symbol_from_the_end(20)
+        rnd = random.Random(7)
+        input_strings = ["".join(rnd.choice("01") for _ in range(rnd.randint(0, 60))) for _ in range(200)]
+
+        simulation = NFAMatcher(nfa)
+        expected = [simulation.matches(input_string) for input_string in input_strings]
+
+        lazy = nfa.compile()
+        self.assertIsInstance(lazy, LazyDFAMatcher)
+        self.assertEqual(expected, [lazy.matches(input_string) for input_string in input_strings])
+        self.assertEqual(expected, [lazy.matches(input_string) for input_string in input_strings])
+
+        stats = lazy.stats()
+        self.assertGreater(stats["hits"], 0)
+        self.assertGreater(stats["misses"], 0)
+        self.assertEqual(0, stats["flushes"])
+        self.assertGreaterEqual(stats["misses"], stats["cached_states"] - 1)
+
+        # A small cache gets flushed, a cache that thrashes falls back to the NFA, the answers are the same
+        small = LazyDFAMatcher(nfa, max_cached_states=50, min_symbols_per_state=0)
+        self.assertEqual(expected, [small.matches(input_string) for input_string in input_strings])
+        self.assertGreater(small.stats()["flushes"], 0)
+        self.assertLessEqual(small.stats()["cached_states"], 50)
+
+        thrashing = LazyDFAMatcher(nfa, max_cached_states=50, min_symbols_per_state=1000)
+        self.assertEqual(expected, [thrashing.matches(input_string) for input_string in input_strings])
+        self.assertGreater(thrashing.stats()["fallbacks"], 0)
+
+    def test_cache_is_tried_again_after_a_fallback(self):
+        """
+        An input that makes the cache thrash doesn't make the next ones skip the cache
+        """
+        nfa = self._nth_symbol_from_the_end(20)
+        matcher = LazyDFAMatcher(nfa, max_cached_states=50, min_symbols_per_state=10)
+        thrashing = format(random.Random(3).getrandbits(400), "0400b")
+
+        self.assertEqual(NFAMatcher(nfa).matches(thrashing), matcher.matches(thrashing))
+        self.assertEqual(1, matcher.stats()["fallbacks"])
+
+        # A long run of 1 only visits the 21 subsets {0}, {0, 1}, ..., {0, 1, ..., 20}
+        hits = matcher.stats()["hits"]
+        self.assertTrue(matcher.matches("1" * 1000))
+        self.assertEqual(1, matcher.stats()["fallbacks"])
+        self.assertGreater(matcher.stats()["hits"] - hits, 900)
+
+    def test_symbol_classes(self):
+        """
+        Symbols that behave the same share a column of the table, or of the cache of the LazyDFAMatcher
+        """
+        nfa = deserialize_automaton_str(">q0|[a-z]|q1\n>q0|[a-e]|q2\nq1|[0-9]|*q3\nq2|[0-4]|*q3\n*q3|[0-9]|*q3\n")
+        dfa = nfa_2_dfa(nfa)
+        dfa_matcher = DFAMatcher(DenseDFA.from_automaton(dfa))
+        lazy_matcher = LazyDFAMatcher(nfa)
+
+        self.assertEqual(3, dfa_matcher._alphabet_size)     # a-e, f-z and the digits
+        self.assertEqual(4, len(lazy_matcher._steps))       # In the NFA 0-4 and 5-9 are different
+
+        generator = random.Random(7)
+        for _ in range(300):
+            input_string = "".join(generator.choice("aez09x5?") for _ in range(generator.randint(0, 4)))
+            expected = dfa.is_string_valid(input_string)
+            self.assertEqual(expected, dfa_matcher.matches(input_string), input_string)
+            self.assertEqual(expected, dfa_matcher.matches(input_string.encode("ascii")), input_string)
+            self.assertEqual(expected, lazy_matcher.matches(input_string), input_string)
+        self.assertEqual([True, False, False], list(dfa_matcher.accepts_many(["e4", "f", "f5?"])))
+
+    def test_session_matches_like_matches(self):
+        """
+        Feeding the input in chunks of any size and type must give the same answer as matching it at once
+        """
+        nfa = self._nth_symbol_from_the_end(6)
+        matchers = [automaton.compile() for automaton in (state_machine_1()[0], state_machine_2()[0],
+                                                          state_machine_nfa_1()[0])]
+        matchers.extend([NFAMatcher(nfa), LazyDFAMatcher(nfa, max_cached_states=4, min_symbols_per_state=0)])
+        rnd = random.Random(3)
+        input_strings = ["".join(rnd.choice("01") for _ in range(rnd.randint(0, 40))) for _ in range(100)]
+
+        for matcher in matchers:
+            session = matcher.session()
+            for input_string in input_strings:
+                session.reset()
+                position = 0
+                while position < len(input_string):
+                    chunk_size = rnd.randint(1, 7)
+                    chunk = input_string[position:position + chunk_size]
+                    session.feed(rnd.choice((chunk, chunk.encode("ascii"), memoryview(chunk.encode("ascii")))))
+                    position += chunk_size
+
+                self.assertEqual(matcher.matches(input_string), session.is_accepting(), input_string)
+
+    def test_session_dead_states(self):
+        big_automaton, _ = state_machine_2()
+        session = big_automaton.compile().session()
+
+        self.assertTrue(session.feed("11"))
+        self.assertFalse(session.is_dead())
+        # State 12 of state_machine_2 is dead, the session knows the input is rejected before it ends
+        self.assertFalse(session.feed(b"00"))
+        self.assertTrue(session.is_dead())
+        self.assertFalse(session.feed("0101"))
+        self.assertFalse(session.is_accepting())
+
+        session.reset()
+        self.assertTrue(session.feed("01"))
+        self.assertTrue(session.feed(memoryview(b"01")))
+        self.assertTrue(session.is_accepting())
+        self.assertFalse(session.feed("x"))
+
+        # In the NFA the set of states gets empty once the input can't reach a final state anymore
+        s_a = State("A", is_initial=True)
+        s_b = State("B", is_final=True)
+        s_c = State("C")
+        s_a.transitions["a"] = [s_b, s_c]
+        s_c.transitions["a"] = [s_c]
+        for matcher in (NFAMatcher(Automaton([s_a, s_b, s_c])), LazyDFAMatcher(Automaton([s_a, s_b, s_c]))):
+            session = matcher.session()
+            self.assertTrue(session.feed("a"))
+            self.assertTrue(session.is_accepting())
+            self.assertFalse(session.feed("a"))
+            self.assertTrue(session.is_dead())
+
+    @staticmethod
+    def _nth_symbol_from_the_end(n: int) -> Automaton:
+        states = [State(str(i), is_initial=(i == 0), is_final=(i == n)) for i in range(n + 1)]
+        states[0].transitions["0"] = [states[0]]
+        states[0].transitions["1"] = [states[0], states[1]]
+        for i in range(1, n):
+            states[i].transitions["0"] = [states[i + 1]]
+            states[i].transitions["1"] = [states[i + 1]]
+
+        return Automaton(states)
+
+
+if __name__ == '__main__':
+    unittest.main()
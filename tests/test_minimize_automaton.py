@@ -1,8 +1,17 @@
+import random
 import unittest
 
-from tests.automata_examples import state_machine_1
+from automata.dense_dfa import DenseDFA
+from automata.matcher import _find_dead_states
+from automata.state_machine import Automaton, State
+from tests.automata_examples import state_machine_1, state_machine_2, state_machine_nfa_1, state_machine_nfa_4
 from utils.automata_utils import automata_are_equivalent
-from utils.minimizer import minimize_automaton
+from utils.file_utils import deserialize_automaton, deserialize_automaton_str, serialize_automaton
+from benchmarks.generators import random_dfa, random_nfa, nth_symbol_from_the_end_nfa
+from utils.automata_utils import is_dfa, nfa_2_dfa
+from utils.minimizer import minimize_automaton, minimize_automaton_by_table_filling, minimize_automaton_by_brzozowski, \
+    choose_minimization_algorithm, minimize_partial_dfa
+from utils.stats import collect_stats
 
 
 class MinimizedAutomataTest(unittest.TestCase):
@@ -33,6 +42,175 @@ class MinimizedAutomataTest(unittest.TestCase):
                         "Expected automaton is not equivalent to result automaton")
         self.assertEqual(len(mini_automaton.states), len(result.states))
 
+    def test_hopcroft_matches_table_filling(self):
+        """
+        Hopcroft's algorithm must give an automaton equivalent to, and as big as, the one from the table-filling
+        algorithm
+        """
+        # nfa_2_dfa reuses the states of the NFA, so every algorithm gets a fresh copy of the automaton
+        factories = [
+            lambda: state_machine_1()[0],
+            lambda: state_machine_2()[0],
+            lambda: state_machine_nfa_1()[0],
+            state_machine_nfa_4,
+            lambda: deserialize_automaton("./resources/state_machine03.txt"),
+            lambda: deserialize_automaton("./resources/state_machine_26.txt"),
+        ]
+        factories.extend(lambda seed=seed: self._random_dfa(seed) for seed in range(10))
+
+        for factory in factories:
+            expected = minimize_automaton_by_table_filling(factory())
+            result = minimize_automaton(factory())
+
+            self.assertTrue(automata_are_equivalent(result, expected),
+                            "Expected automaton is not equivalent to result automaton")
+            self.assertEqual(len(expected.states), len(result.states))
+
+    def test_brzozowski_matches_hopcroft(self):
+        """
+        Brzozowski's algorithm must give an automaton equivalent to, and as big as, the one from Hopcroft's, also for
+        NFA with epsilon transitions and automata that recognize nothing
+        """
+        automata = [state_machine_1()[0], state_machine_2()[0], state_machine_nfa_1()[0], state_machine_nfa_4(),
+                    deserialize_automaton("./resources/state_machine_26.txt"), nth_symbol_from_the_end_nfa(6)]
+        automata.extend(random_nfa(25, density=1.3, epsilon_density=0.3, final_ratio=0.1 * (seed % 3), seed=seed)
+                        for seed in range(10))
+
+        for automaton in automata:
+            expected = minimize_automaton(automaton, algorithm="hopcroft")
+            result = minimize_automaton_by_brzozowski(automaton)
+
+            self.assertTrue(automata_are_equivalent(result, expected),
+                            "Expected automaton is not equivalent to result automaton")
+            self.assertEqual(len(expected.states), len(result.states))
+
+        with self.assertRaises(ValueError):
+            minimize_automaton(automata[0], algorithm="moore")
+
+    def test_automatic_algorithm(self):
+        """
+        DFA and NFA with a small DFA are minimized with Hopcroft's algorithm, NFA whose DFA blows up with
+        Brzozowski's, and the choice is in the stats
+        """
+        self.assertEqual("hopcroft", choose_minimization_algorithm(state_machine_1()[0])[0])
+
+        algorithm, dfa = choose_minimization_algorithm(state_machine_nfa_1()[0])
+        self.assertEqual("hopcroft", algorithm)
+        self.assertIsNotNone(dfa)
+
+        nfa = nth_symbol_from_the_end_nfa(8)
+        self.assertEqual(("brzozowski", None), choose_minimization_algorithm(nfa, subset_budget=100))
+        self.assertEqual("hopcroft", choose_minimization_algorithm(nfa, subset_budget=1000)[0])
+
+        with collect_stats(trace_memory=False) as collector:
+            result = minimize_automaton(nth_symbol_from_the_end_nfa(11))
+            minimize_automaton(state_machine_1()[0])
+
+        self.assertEqual(2 ** 11, len(result.states))
+        counters = [phase_stats["counters"] for phase_stats in collector.to_list() if phase_stats["name"] == "minimize"]
+        self.assertEqual(1, counters[0]["algorithm_brzozowski"])
+        self.assertEqual(1, counters[0]["branching_transitions"])
+        self.assertEqual(1, counters[1]["algorithm_hopcroft"])
+
+    def test_symbol_classes(self):
+        """
+        The identifiers and the keyword 'if': 63 symbols but only the letters i and f behave differently from the rest
+        """
+        nfa = deserialize_automaton_str(">q0|[a-zA-Z_]|*q1\n*q1|[a-zA-Z0-9_]|*q1\n>q0|i|q2\nq2|f|*q3\n")
+        self.assertEqual(63, len(nfa.alphabet))
+
+        with collect_stats(trace_memory=False) as collector:
+            dfa = nfa_2_dfa(nfa)
+            results = [minimize_automaton(nfa, algorithm="hopcroft"),
+                       minimize_automaton(dfa, algorithm="valmari", add_sink=True),
+                       minimize_automaton(nfa, algorithm="brzozowski")]
+
+        counters = {}
+        for phase_stats in collector.to_list():
+            counters.setdefault(phase_stats["name"], []).append(phase_stats["counters"])
+        self.assertEqual(4, counters["determinize"][0]["symbol_classes"])   # i, f, the other letters and the digits
+        self.assertLessEqual(counters["refinement"][0]["symbol_classes"], 4)
+        self.assertLessEqual(counters["refinement"][1]["symbol_classes"], 4)
+
+        expected = minimize_automaton_by_table_filling(dfa)
+        for result in results:
+            self.assertEqual(len(expected.states), len(result.states))
+            self.assertTrue(automata_are_equivalent(expected, result))
+
+    def test_partial_dfa(self):
+        """
+        A partial DFA is minimized without a sink, to the states of the complete minimal DFA that can reach a final
+        state, and with add_sink it gets the complete minimal DFA
+        """
+        for seed in range(40):
+            automaton = random_dfa(40, alphabet_size=3, density=(0.3, 0.6, 0.9, 1.0)[seed % 4],
+                                   final_ratio=(0.05, 0.3, 0.0, 1.0)[seed % 4], seed=seed)
+            expected = minimize_automaton(nfa_2_dfa(automaton), algorithm="hopcroft")
+            dead_states = sum(_find_dead_states(DenseDFA.from_automaton(expected)))
+
+            result = minimize_partial_dfa(automaton)
+            self.assertTrue(automata_are_equivalent(result, automaton))
+            self.assertEqual(max(1, len(expected.states) - dead_states), len(result.states))
+
+            result = minimize_automaton(automaton, add_sink=True)
+            self.assertTrue(is_dfa(result))
+            self.assertTrue(automata_are_equivalent(result, automaton))
+            self.assertEqual(len(expected.states), len(result.states))
+
+    def test_partial_dfa_drops_useless_states(self):
+        """
+        A -a-> B(final), A -b-> C -a-> C: C can't reach a final state and D can't be reached, both are dropped
+        """
+        s_a = State("A", is_initial=True)
+        s_b = State("B", is_final=True)
+        s_c = State("C")
+        s_d = State("D", is_final=True)
+        s_a.transitions["a"] = [s_b]
+        s_a.transitions["b"] = [s_c]
+        s_c.transitions["a"] = [s_c]
+        s_d.transitions["a"] = [s_b]
+        automaton = Automaton([s_a, s_b, s_c, s_d])
+
+        self.assertEqual("valmari", choose_minimization_algorithm(automaton)[0])
+        result = minimize_automaton(automaton)
+        self.assertEqual(["A", "B"], [state.state_id for state in result.states])
+        self.assertEqual(["a"], list(result.states[0].transitions.keys()))
+        self.assertTrue(result.is_string_valid("a"))
+        self.assertFalse(result.is_string_valid("ba"))
+
+        result = minimize_partial_dfa(automaton, add_sink=True)
+        self.assertEqual(3, len(result.states))
+        self.assertTrue(is_dfa(result))
+
+        nothing = minimize_partial_dfa(Automaton([State("A", is_initial=True)]), add_sink=True)
+        self.assertEqual(1, len(nothing.states))
+
+    def test_single_state_result_round_trip(self):
+        """
+        A minimal DFA of one state without transitions can't be written in Byron TXT, so it keeps a sink
+        """
+        for text, accepts_empty_string in ((">*q0|a|q1\nq1|b|q1\n", True), (">q0|a|q1\nq1|b|q1\n", False)):
+            result = minimize_automaton(deserialize_automaton_str(text))
+            self.assertTrue(serialize_automaton(result))
+
+            loaded = deserialize_automaton_str(serialize_automaton(result))
+            self.assertTrue(is_dfa(loaded))
+            self.assertTrue(automata_are_equivalent(result, loaded))
+            self.assertEqual(accepts_empty_string, loaded.is_string_valid(""))
+            self.assertFalse(loaded.is_string_valid("a"))
+            self.assertFalse(loaded.is_string_valid("ab"))
+
+    @staticmethod
+    def _random_dfa(seed: int, state_count: int = 30, symbols: tuple = ("a", "b", "c")) -> Automaton:
+        rnd = random.Random(seed)
+        states = [State(str(i), is_initial=(i == 0), is_final=rnd.random() < 0.3) for i in range(state_count)]
+
+        for state in states:
+            for symbol in symbols:
+                state.transitions[symbol] = [rnd.choice(states)]
+
+        return Automaton(states)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from automata.state_machine import Automaton
+from automata.state_machine import Automaton, State
 from tests.automata_examples import state_machine_nfa_1, state_machine_nfa_2, state_machine_nfa_4
 from utils.automata_utils import nfa_2_dfa, is_dfa, automata_are_equivalent
 
@@ -96,6 +96,47 @@ class NFA2DFATest(unittest.TestCase):
         self.assertEqual(4, len(normal_states))
         self.assertEqual(4, len(final_states))
 
+    def test_subset_names(self):
+        """
+        The subset behind each DFA state is only described when a dict is given
+        """
+        nfa, expected_dfa = state_machine_nfa_1()
+        subset_names = {}
+        result = nfa_2_dfa(nfa, subset_names)
+
+        self._check_validity_of_dfa(result)
+        self.assertEqual(len(result.states), len(subset_names))
+        self.assertEqual("A", subset_names[result.initial_state.state_id])
+        self.assertEqual(set(subset_names.values()),
+                         {"A", "A-B", "A-B-C", "A-B-C-D", "A-C-D", "A-B-D", "A-C", "A-D"})
+
+    def test_nfa_is_not_modified(self):
+        nfa, expected_dfa = state_machine_nfa_1()
+        transitions_before = {state.state_id: dict(state.transitions) for state in nfa.states}
+
+        nfa_2_dfa(nfa)
+        nfa_2_dfa(nfa)
+
+        self.assertEqual(transitions_before, {state.state_id: dict(state.transitions) for state in nfa.states})
+        self.assertTrue(automata_are_equivalent(nfa_2_dfa(nfa), expected_dfa))
+
+    def test_nth_symbol_from_the_end(self):
+        """
+        The NFA for "the n-th symbol from the end is a 1" has n + 1 states, its DFA has 2^n states
+        """
+        n = 10
+        states = [State(str(i), is_initial=(i == 0), is_final=(i == n)) for i in range(n + 1)]
+        states[0].transitions["0"] = [states[0]]
+        states[0].transitions["1"] = [states[0], states[1]]
+        for i in range(1, n):
+            states[i].transitions["0"] = [states[i + 1]]
+            states[i].transitions["1"] = [states[i + 1]]
+
+        result = nfa_2_dfa(Automaton(states))
+
+        self._check_validity_of_dfa(result)
+        self.assertEqual(2 ** n, len(result.states))
+
 
 if __name__ == '__main__':
     unittest.main()
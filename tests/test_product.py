@@ -0,0 +1,130 @@
+import itertools
+import unittest
+
+from automata.state_machine import Automaton, State
+from benchmarks.generators import random_dfa, random_nfa
+from tests.automata_examples import state_machine_1, state_machine_2, state_machine_nfa_1
+from utils.automata_utils import automata_are_equivalent, is_dfa
+from utils.minimizer import minimize_automaton
+from utils.product import intersect, union, difference, complement, product, find_product_string, is_empty, \
+    intersection_is_empty, is_subset
+
+
+class ProductTest(unittest.TestCase):
+
+    def test_operations_match_is_string_valid(self):
+        """
+        Every string up to length 7 must be recognized by the product as the operation says, for DFA, NFA and
+        partial DFA
+        """
+        operands = [state_machine_1()[0], state_machine_2()[0], state_machine_nfa_1()[0],
+                    random_nfa(8, alphabet_size=2, density=1.2, seed=1), self._ends_with("01")]
+        input_strings = ["".join(chars) for length in range(8) for chars in itertools.product("01", repeat=length)]
+        operations = {
+            intersect: lambda a, b: a and b,
+            union: lambda a, b: a or b,
+            difference: lambda a, b: a and not b,
+        }
+
+        for automaton_a, automaton_b in itertools.product(operands, repeat=2):
+            expected_a = [automaton_a.is_string_valid(input_string) for input_string in input_strings]
+            expected_b = [automaton_b.is_string_valid(input_string) for input_string in input_strings]
+
+            for operation, expected in operations.items():
+                result = operation(automaton_a, automaton_b)
+                self.assertTrue(is_dfa(result))
+                for input_string, a, b in zip(input_strings, expected_a, expected_b):
+                    self.assertEqual(expected(a, b), result.is_string_valid(input_string),
+                                     (operation.__name__, input_string))
+
+            result = complement(automaton_a, alphabet=("0", "1"))
+            for input_string, a in zip(input_strings, expected_a):
+                self.assertEqual(not a, result.is_string_valid(input_string), input_string)
+
+    def test_result_can_be_minimized(self):
+        automaton_a, _ = state_machine_1()
+        automaton_b = self._ends_with("01")
+
+        result = intersect(automaton_a, automaton_b)
+        self.assertTrue(automata_are_equivalent(result, minimize_automaton(result)))
+
+        # The complement of the complement is the same language
+        self.assertTrue(automata_are_equivalent(automaton_a, minimize_automaton(complement(complement(automaton_a)))))
+
+        # A∩B is disjoint from A∖B, and A∩B together with A∖B is A
+        self.assertTrue(is_empty(intersect(intersect(automaton_a, automaton_b), difference(automaton_a, automaton_b))))
+        self.assertTrue(automata_are_equivalent(
+            automaton_a, union(intersect(automaton_a, automaton_b), difference(automaton_a, automaton_b))))
+
+    def test_alphabets_and_symmetric_difference(self):
+        """
+        Symbols that one automaton doesn't have go to its implicit reject state
+        """
+        automaton_a = self._ends_with("01")
+        automaton_b = self._ends_with("ab", symbols="ab")
+
+        result = union(automaton_a, automaton_b)
+        self.assertEqual(("0", "1", "a", "b"), result.alphabet)
+        self.assertTrue(result.is_string_valid("101"))
+        self.assertTrue(result.is_string_valid("bab"))
+        self.assertFalse(result.is_string_valid("0ab"))
+        self.assertTrue(intersection_is_empty(automaton_a, automaton_b))
+
+        result = complement(automaton_a, alphabet=("0", "1", "2"))
+        self.assertTrue(result.is_string_valid("012"))
+        self.assertTrue(result.is_string_valid("201"))
+        self.assertFalse(result.is_string_valid("1101"))
+
+        big_automaton, mini_automaton = state_machine_2()
+        self.assertTrue(is_empty(product(big_automaton, mini_automaton, "symmetric_difference")))
+        self.assertFalse(is_empty(product(big_automaton, state_machine_1()[0], "symmetric_difference")))
+
+        with self.assertRaises(ValueError):
+            product(automaton_a, automaton_b, "concatenation")
+
+    def test_emptiness_checks(self):
+        automaton_a = random_dfa(20, alphabet_size=3, seed=5)
+        automaton_b = random_dfa(20, alphabet_size=3, seed=6)
+
+        word = find_product_string(automaton_a, automaton_b, "intersection")
+        self.assertIsNotNone(word)
+        self.assertTrue(automaton_a.is_string_valid(word))
+        self.assertTrue(automaton_b.is_string_valid(word))
+        self.assertFalse(intersection_is_empty(automaton_a, automaton_b))
+
+        # The search returns a shortest string of the product
+        shortest = min((len(word) for word in self._strings(intersect(automaton_a, automaton_b), len(word))),
+                       default=None)
+        self.assertEqual(shortest, len(word))
+
+        self.assertTrue(is_subset(intersect(automaton_a, automaton_b), automaton_a))
+        self.assertTrue(is_subset(automaton_a, union(automaton_a, automaton_b)))
+        self.assertFalse(is_subset(automaton_a, automaton_b))
+        self.assertEqual("", find_product_string(complement(self._ends_with("01")), automaton_a, "union"))
+
+        no_finals = Automaton([State("A", is_initial=True)])
+        self.assertTrue(is_empty(no_finals))
+        self.assertTrue(is_empty(intersect(no_finals, automaton_a)))
+        self.assertEqual(1, len(intersect(no_finals, automaton_a).states))
+        self.assertFalse(is_empty(automaton_a))
+
+    @staticmethod
+    def _strings(automaton: Automaton, max_length: int):
+        for length in range(max_length + 1):
+            for chars in itertools.product(automaton.alphabet, repeat=length):
+                if automaton.is_string_valid("".join(chars)):
+                    yield "".join(chars)
+
+    @staticmethod
+    def _ends_with(suffix: str, symbols: str = "01") -> Automaton:
+        """
+        A partial NFA that recognizes the strings that end with a suffix
+        """
+        states = [State("S{}".format(i), is_initial=(i == 0), is_final=(i == len(suffix)))
+                  for i in range(len(suffix) + 1)]
+        for symbol in symbols:
+            states[0].transitions[symbol] = [states[0]]
+        for i, symbol in enumerate(suffix):
+            states[i].transitions[symbol].append(states[i + 1])
+
+        return Automaton(states)
@@ -1,8 +1,15 @@
+import os
+import struct
+import tempfile
 import unittest
 
-from tests.automata_examples import state_machine_1
+from tests.automata_examples import state_machine_1, state_machine_2
 from utils.automata_utils import automata_are_equivalent
-from utils.file_utils import deserialize_automaton
+from utils.file_utils import deserialize_automaton, deserialize_automaton_str, serialize_binary, deserialize_binary, \
+    binary_to_dense_dfa, read_binary_sections, is_binary_automaton_file, save_bytes_to_file, AutomatonFormatError, \
+    BINARY_MAGIC, BINARY_VERSION, map_binary_dfa
+from automata.matcher import DFAMatcher
+from utils.minimizer import minimize_automaton
 
 
 class TestSerializer(unittest.TestCase):
@@ -13,6 +20,115 @@ class TestSerializer(unittest.TestCase):
         self.assertEqual(len(automata1.states), len(result.states))
         self.assertTrue(automata_are_equivalent(automata1, result))
 
+    def test_binary_round_trip(self):
+        for automaton in (state_machine_1()[0], state_machine_2()[1],
+                          minimize_automaton(deserialize_automaton("./resources/state_machine_26.txt"))):
+            contents = serialize_binary(automaton)
+
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "automaton.dfab")
+                save_bytes_to_file(path, contents)
+
+                self.assertTrue(is_binary_automaton_file(path))
+                result = deserialize_binary(path)
+
+            self.assertEqual([state.state_id for state in automaton.states],
+                             [state.state_id for state in result.states])
+            self.assertEqual(automaton.alphabet, result.alphabet)
+            self.assertTrue(automata_are_equivalent(automaton, result))
+
+    def test_binary_sections(self):
+        automaton, _ = state_machine_1()
+        sections = read_binary_sections(serialize_binary(automaton))
+
+        self.assertEqual(7, sections["state_count"])
+        self.assertEqual(2, sections["alphabet_size"])
+        self.assertEqual(("0", "1"), sections["alphabet"])
+        self.assertEqual(["1", "2", "3", "4", "5", "6", "7"], sections["state_ids"])
+        self.assertEqual(7 * 2 * 4, len(sections["transitions"]))
+        self.assertEqual(1, len(sections["accepting"]))
+
+    def test_invalid_binary(self):
+        contents = serialize_binary(state_machine_1()[0])
+
+        with self.assertRaises(AutomatonFormatError):
+            binary_to_dense_dfa(b"#not a binary file")
+
+        with self.assertRaises(AutomatonFormatError):
+            binary_to_dense_dfa(contents[:-8])
+
+        other_version = BINARY_MAGIC + struct.pack("<H", BINARY_VERSION + 1) + contents[6:]
+        with self.assertRaises(AutomatonFormatError):
+            binary_to_dense_dfa(other_version)
+
+        self.assertFalse(is_binary_automaton_file("./resources/state_machine03.txt"))
+
+    def test_sections_outside_the_file(self):
+        """
+        The offsets in the header and the lengths of the string tables are checked against the size of the file
+        """
+        contents = serialize_binary(state_machine_1()[0])
+        # The offsets of the sections are the four uint64 at the end of the header
+        alphabet_offset, state_ids_offset = struct.unpack_from("<QQ", contents, 24)
+
+        def replaced(offset: int, value: bytes) -> bytes:
+            return contents[:offset] + value + contents[offset + len(value):]
+
+        damaged = [
+            contents[:state_ids_offset + 2],
+            replaced(24, struct.pack("<Q", len(contents) - 2)),
+            replaced(32, struct.pack("<Q", 2 ** 40)),
+            replaced(alphabet_offset, struct.pack("<I", 2 ** 31)),
+            replaced(state_ids_offset, struct.pack("<I", len(contents))),
+            replaced(16, struct.pack("<I", 7)),
+            replaced(state_ids_offset + 4, b"\xff"),   # Only found when the state IDs are decoded
+        ]
+        for i, damaged_contents in enumerate(damaged):
+            with self.subTest(i=i):
+                with self.assertRaises(AutomatonFormatError):
+                    binary_to_dense_dfa(damaged_contents)
+                if i < len(damaged) - 1:
+                    with self.assertRaises(AutomatonFormatError):
+                        read_binary_sections(damaged_contents, decode_state_ids=False)
+
+    def test_map_binary_dfa(self):
+        """
+        A mapped DFA serves its transitions straight from the file and matches the same strings
+        """
+        automaton, _ = state_machine_2()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "automaton.dfab")
+            save_bytes_to_file(path, serialize_binary(automaton))
+            dfa = map_binary_dfa(path)
+
+        self.assertIsInstance(dfa.transitions, memoryview)
+        self.assertEqual(7, dfa.state_count)
+        self.assertEqual(2, dfa.alphabet_size)
+
+        matcher = DFAMatcher(dfa, find_dead_states=False)
+        for input_string in ("", "0", "1", "0101", "1100", "11001", "000"):
+            self.assertEqual(automaton.is_string_valid(input_string), matcher.matches(input_string), input_string)
+
+        self.assertEqual([state.state_id for state in automaton.states], list(dfa.state_ids))
+        self.assertTrue(automata_are_equivalent(automaton, dfa.to_automaton()))
+
+    def test_matcher_keeps_the_mapped_table(self):
+        """
+        The matcher of a mapped DFA reads the mapped pages, even when some of its columns could be merged
+        """
+        automaton = deserialize_automaton_str(">q0|a|q1\n>q0|b|q1\nq1|c|*q2\n")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "automaton.dfab")
+            save_bytes_to_file(path, serialize_binary(automaton))
+            dfa = map_binary_dfa(path)
+
+        matcher = DFAMatcher(dfa, find_dead_states=False)
+        self.assertIs(dfa.transitions, matcher._table)
+        self.assertEqual([True, True, False, False], [matcher.matches(input_string)
+                                                      for input_string in ("ac", "bc", "ab", "c")])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from automata.matcher import DFAMatcher, compile_automaton
+from benchmarks.generators import random_dfa
+from tests.automata_examples import state_machine_1, state_machine_nfa_1
+from utils.automata_utils import automata_are_equivalent, is_dfa
+from utils.client import AutomataClient, ServerError
+from utils.file_utils import deserialize_automaton, deserialize_automaton_str, serialize_automaton
+from utils.minimizer import minimize_automaton
+from utils.server import AutomataServer, INLINE_MAX_MATCH_CHARS
+
+
+class AutomataServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = AutomataServer(workers=1)
+        server = await self.server.start(host="127.0.0.1", port=0)
+        self.client = await AutomataClient.connect(port=server.sockets[0].getsockname()[1])
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def test_minimize(self):
+        automaton = deserialize_automaton("./resources/state_machine_26.txt")
+        expected = minimize_automaton(deserialize_automaton("./resources/state_machine_26.txt"))
+
+        minimized = await self.client.minimize(automaton)
+        self.assertEqual(len(expected.states), len(minimized.automaton.states))
+        self.assertTrue(automata_are_equivalent(expected, minimized.automaton))
+
+        # The second time the result is found by the ID of the automaton
+        automaton_id = await self.client.load(automaton)
+        self.assertEqual(minimized.automaton_id, (await self.client.minimize(automaton_id)).automaton_id)
+        self.assertEqual(1, self.server.stats["derived_hits"])
+        self.assertEqual(minimized.automaton_id, (await self.client.minimize(minimized.automaton_id)).automaton_id)
+
+    async def test_determinize_and_equivalent(self):
+        nfa, dfa = state_machine_nfa_1()
+
+        determinized = await self.client.determinize(nfa)
+        self.assertTrue(is_dfa(determinized.automaton))
+        self.assertTrue(automata_are_equivalent(dfa, determinized.automaton))
+
+        self.assertTrue(await self.client.equivalent(nfa, determinized.automaton_id))
+        self.assertFalse(await self.client.equivalent(nfa, state_machine_1()[0]))
+
+        result = await self.client.request("equivalent", a={"automaton": serialize_automaton(nfa)},
+                                           b={"automaton": serialize_automaton(state_machine_1()[0])})
+        counterexample = result["counterexample"]
+        self.assertNotEqual(compile_automaton(nfa).matches(counterexample),
+                            compile_automaton(state_machine_1()[0]).matches(counterexample))
+
+    async def test_match(self):
+        nfa, _ = state_machine_nfa_1()
+        matcher = compile_automaton(nfa)
+        input_strings = ["".join(chars) for length in range(6) for chars in itertools.product("01", repeat=length)]
+
+        automaton_id = await self.client.load(nfa)
+        self.assertEqual([matcher.matches(input_string) for input_string in input_strings],
+                         await self.client.match(automaton_id, input_strings))
+        self.assertEqual([matcher.matches("0101")], await self.client.match(nfa, ["0101"]))
+
+    async def test_match_batches(self):
+        """
+        Match requests that arrive together for the same automaton are run as a single batch
+        """
+        automaton, _ = state_machine_1()
+        automaton_id = (await self.server.handle_request({"op": "load",
+                                                          "automaton": serialize_automaton(automaton)}))["result"]
+        automaton_id = automaton_id["automaton_id"]
+
+        responses = await asyncio.gather(*(self.server.handle_request({"id": i, "op": "match",
+                                                                       "automaton_id": automaton_id,
+                                                                       "strings": ["0" * i, "1" * i]})
+                                           for i in range(10)))
+
+        self.assertEqual(list(range(10)), [response["id"] for response in responses])
+        for i, response in enumerate(responses):
+            self.assertEqual([automaton.is_string_valid("0" * i), automaton.is_string_valid("1" * i)],
+                             response["result"]["matches"])
+        self.assertEqual(1, self.server.stats["match_batches"])
+        self.assertEqual(20, self.server.stats["strings_matched"])
+
+    async def test_match_batches_use_accepts_many(self):
+        automaton, _ = state_machine_1()
+        automaton_id = await self.client.load(automaton)
+
+        with mock.patch.object(DFAMatcher, "accepts_many", autospec=True, side_effect=DFAMatcher.accepts_many) as many:
+            responses = await asyncio.gather(*(self.server.handle_request({"op": "match", "automaton_id": automaton_id,
+                                                                           "strings": ["10" * i, "1" * i]})
+                                               for i in range(5)))
+
+        self.assertEqual(1, many.call_count)
+        self.assertEqual(10, len(many.call_args.args[1]))
+        for i, response in enumerate(responses):
+            self.assertEqual([automaton.is_string_valid("10" * i), automaton.is_string_valid("1" * i)],
+                             response["result"]["matches"])
+
+    async def test_single_state_result(self):
+        """
+        The minimal DFA of {""} and of the empty language have a single state, they are sent with their sink
+        """
+        for text, matches in ((">*q0|a|q1\nq1|b|q1\n", [True, False]), (">q0|a|q1\nq1|b|q1\n", [False, False])):
+            minimized = await self.client.minimize(deserialize_automaton_str(text))
+            self.assertTrue(is_dfa(minimized.automaton))
+            self.assertTrue(automata_are_equivalent(deserialize_automaton_str(text), minimized.automaton))
+            self.assertEqual(matches, await self.client.match(minimized.automaton_id, ["", "a"]))
+
+    async def test_failed_match_batch(self):
+        """
+        An error while matching is the answer of every request of the batch, instead of leaving them waiting
+        """
+        automaton_id = await self.client.load(state_machine_1()[0])
+
+        with mock.patch("utils.server.compile_automaton", side_effect=RuntimeError("No matcher")):
+            responses = await asyncio.wait_for(asyncio.gather(
+                *(self.server.handle_request({"op": "match", "automaton_id": automaton_id, "strings": ["0"]})
+                  for _ in range(3))), timeout=5)
+        self.assertEqual(["RuntimeError: No matcher"] * 3, [response["error"] for response in responses])
+
+        self.assertEqual([False, True], await self.client.match(automaton_id, ["1", "10"]))
+
+    async def test_long_match_batch(self):
+        automaton, _ = state_machine_1()
+        input_strings = ["10" * (INLINE_MAX_MATCH_CHARS // 4), "1" * (INLINE_MAX_MATCH_CHARS // 2 + 1)]
+
+        self.assertEqual([automaton.is_string_valid(input_string) for input_string in input_strings],
+                         await self.client.match(automaton, input_strings))
+        self.assertEqual(1, self.server.stats["offloaded_matches"])
+
+    async def test_dropped_result(self):
+        """
+        A minimized automaton that was dropped is loaded again from the result of the first minimization
+        """
+        self.server.max_automata = 2
+        automaton_id = await self.client.load(state_machine_1()[0])
+        minimized = await self.client.minimize(automaton_id)
+        await self.client.load(state_machine_1()[0])
+        await self.client.load(state_machine_nfa_1()[0])
+        self.assertNotIn(minimized.automaton_id, self.server._automata)
+
+        self.assertEqual(minimized.automaton_id, (await self.client.minimize(automaton_id)).automaton_id)
+        self.assertEqual(1, self.server.stats["derived_hits"])
+        self.assertEqual([True], await self.client.match(minimized.automaton_id, ["10"]))
+
+    async def test_offloaded_to_workers(self):
+        automaton = random_dfa(300, alphabet_size=3, seed=1)
+
+        results = await asyncio.gather(self.client.minimize(automaton), self.client.minimize(automaton))
+        self.assertEqual(results[0].automaton_id, results[1].automaton_id)
+        self.assertEqual(1, self.server.stats["offloaded"])
+        self.assertTrue(automata_are_equivalent(minimize_automaton(random_dfa(300, alphabet_size=3, seed=1)),
+                                                results[0].automaton))
+
+    async def test_errors(self):
+        with self.assertRaises(ServerError):
+            await self.client.minimize("not an ID")
+        with self.assertRaises(ServerError):
+            await self.client.request("transmogrify")
+        with self.assertRaises(ServerError):
+            await self.client.request("load", automaton="q0|a")
+
+        # The connection is still usable
+        self.assertEqual(3, (await self.client.request("stats"))["errors"])
+
+    async def test_least_recently_used_are_dropped(self):
+        self.server.max_automata = 2
+        first_id = await self.client.load(state_machine_1()[0])
+        await self.client.load(state_machine_nfa_1()[0])
+        await self.client.load(state_machine_nfa_1()[1])
+
+        with self.assertRaises(ServerError):
+            await self.client.match(first_id, ["0"])
+        self.assertEqual(2, (await self.client.request("stats"))["automata"])
+
+    @unittest.skipUnless(hasattr(asyncio, "start_unix_server"), "Unix sockets are not available")
+    async def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "automata.sock")
+            await self.server.start(path)
+
+            async with await AutomataClient.connect(path) as client:
+                self.assertEqual([True, False], await client.match(state_machine_1()[0], ["10", "1"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
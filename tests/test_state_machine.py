@@ -82,6 +82,45 @@ class AutomatonTest(unittest.TestCase):
         self.assertTrue(ordered[3] is s4)
         self.assertTrue(ordered[4] is s5)
 
+    def test_transitions(self):
+        s1, s2, s3 = State("1"), State("2"), State("3")
+
+        # A single target is given back as a tuple, looking up a missing symbol with [] adds an empty list
+        s1.transitions["a"] = [s2]
+        self.assertEqual((s2,), s1.transitions.get("a"))
+        self.assertIs(s2, s1.transitions.target("a"))
+        self.assertIsNone(s1.transitions.get("b"))
+        self.assertEqual([], s1.transitions.get("b", []))
+        self.assertEqual([], s1.transitions["b"])
+        self.assertIn("b", s1.transitions)
+
+        # Appending to the list of a symbol keeps working as with a defaultdict
+        s1.transitions["a"].append(s3)
+        s1.transitions["b"].append(s3)
+        self.assertEqual([s2, s3], s1.transitions.get("a"))
+        self.assertEqual({"a": [s2, s3], "b": (s3,)}, s1.transitions)
+        with self.assertRaises(ValueError):
+            s1.transitions.target("a")
+
+        s2.transitions.add("c", s1)
+        s2.transitions.add("c", s3)
+        s2.transitions.add("d", s3)
+        self.assertEqual([("c", [s1, s3]), ("d", (s3,))], s2.transitions.items())
+        self.assertEqual(["c", "d"], list(s2.transitions))
+        self.assertEqual(2, len(s2.transitions))
+
+        s2.transitions.clear()
+        self.assertEqual(0, len(s2.transitions))
+
+    def test_states_are_slim(self):
+        state = State("1")
+        with self.assertRaises(AttributeError):
+            state.color = "red"
+
+        # Symbols are interned
+        state.transitions["".join(["a", "b"])] = [state]
+        self.assertIs(next(iter(state.transitions)), "ab")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,97 @@
+import json
+import unittest
+
+from tests.automata_examples import state_machine_1
+from utils.file_utils import deserialize_automaton
+from utils.minimizer import minimize_automaton, minimize_automaton_by_table_filling
+from utils.automata_utils import automata_are_equivalent, clean_epsilon_transition
+from utils.stats import collect_stats, phase, count, measured, is_collecting, format_stats_table, format_stats_json
+
+
+class TestStats(unittest.TestCase):
+    def test_disabled(self):
+        self.assertFalse(is_collecting())
+
+        # Without a collection, phases and counters do nothing
+        with phase("nothing"):
+            count("nothing")
+        self.assertIs(phase("a"), phase("b"))
+
+    def test_phases_and_counters(self):
+        @measured("outer")
+        def outer():
+            count("calls")
+            with phase("inner"):
+                count("items", 5)
+                count("items", 2)
+                data = [0] * 100000
+            return len(data)
+
+        with collect_stats() as collector:
+            self.assertTrue(is_collecting())
+            self.assertEqual(100000, outer())
+            count("loose")
+
+        self.assertFalse(is_collecting())
+        phases = collector.to_list()
+
+        self.assertEqual(["outer", "inner", "total"], [phase_stats["name"] for phase_stats in phases])
+        self.assertEqual([None, "outer", None], [phase_stats["parent"] for phase_stats in phases])
+        self.assertEqual({"calls": 1}, phases[0]["counters"])
+        self.assertEqual({"items": 7}, phases[1]["counters"])
+        self.assertEqual({"loose": 1}, phases[2]["counters"])
+
+        # The list is 800 KB, which is part of the peak of both phases
+        self.assertGreaterEqual(phases[1]["peak_bytes"], 800000)
+        self.assertGreaterEqual(phases[0]["peak_bytes"], phases[1]["peak_bytes"])
+        self.assertGreaterEqual(phases[0]["seconds"], phases[1]["seconds"])
+
+    def test_without_memory(self):
+        with collect_stats(trace_memory=False) as collector:
+            with phase("a"):
+                pass
+
+        self.assertIsNone(collector.to_list()[0]["peak_bytes"])
+
+    def test_pipeline_counters(self):
+        with collect_stats() as collector:
+            automaton = deserialize_automaton("./resources/state_machine_26.txt")
+            minimized = minimize_automaton(automaton)
+            automata_are_equivalent(minimized, minimize_automaton_by_table_filling(automaton))
+            clean_epsilon_transition(state_machine_1()[0])
+
+        phases = {}
+        for phase_stats in collector.to_list():
+            phases.setdefault(phase_stats["name"], []).append(phase_stats)
+
+        self.assertEqual(len(automaton.states), phases["parse"][0]["counters"]["states"])
+        self.assertEqual("minimize", phases["determinize"][0]["parent"])
+        self.assertEqual("determinize", phases["epsilon_closures"][0]["parent"])
+        self.assertIn("dfa_subsets", phases["determinize"][0]["counters"])
+
+        refinement = phases["refinement"][0]["counters"]
+        self.assertEqual(len(minimized.states), refinement["blocks"])
+        self.assertGreater(refinement["splitters_processed"], 0)
+        self.assertGreater(phases["pair_table"][0]["counters"]["pair_records"], 0)
+        self.assertGreater(phases["refinement"][1]["counters"]["refinement_sweeps"], 0)
+        self.assertGreater(phases["equivalence"][0]["counters"]["pairs_followed"], 0)
+        self.assertIn("epsilon_transitions_removed", phases["epsilon_removal"][0]["counters"])
+
+        merged = phases["merge"][0]["counters"]["states_merged"]
+        self.assertEqual(phases["determinize"][0]["counters"]["dfa_states"] - len(minimized.states), merged)
+
+    def test_formats(self):
+        with collect_stats() as collector:
+            minimize_automaton(deserialize_automaton("./resources/state_machine03.txt"))
+
+        phases = collector.to_list()
+        self.assertEqual(phases, json.loads(format_stats_json(phases))["phases"])
+
+        table = format_stats_table(phases).splitlines()
+        self.assertEqual(len(phases) + 1, len(table))
+        self.assertTrue(table[1].startswith("parse"))
+        self.assertIn("  refinement", table[-2])
+
+
+if __name__ == '__main__':
+    unittest.main()
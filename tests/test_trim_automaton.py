@@ -0,0 +1,78 @@
+import unittest
+
+from automata.state_machine import Automaton, State
+from tests.automata_examples import state_machine_1, state_machine_2
+from utils.automata_utils import trim_automaton, automata_are_equivalent, is_dfa, nfa_2_dfa
+from utils.file_utils import deserialize_automaton
+from utils.minimizer import minimize_automaton, minimize_automaton_by_table_filling
+from utils.stats import collect_stats
+
+
+class TrimAutomatonTest(unittest.TestCase):
+
+    def test_unreachable_and_dead_states(self):
+        """
+        In state_machine_26 Q and Q3 can't be reached, and Q1, Q4 and Q5 can't reach the final state Q6
+        """
+        automaton = deserialize_automaton("./resources/state_machine_26.txt")
+
+        with collect_stats(trace_memory=False) as collector:
+            result = trim_automaton(automaton)
+
+        self.assertEqual(["Q0", "Q2", "Q6"], sorted(state.state_id for state in result.states))
+        self.assertIs(result.initial_state, result.states[0])
+        self.assertEqual({"unreachable_states": 2, "dead_states": 3}, collector.to_list()[0]["counters"])
+        self.assertEqual(["Q6", "Q2"], [target.state_id for target in result.initial_state.transitions["f"]])
+        self.assertNotIn("c", result.initial_state.transitions)
+
+        # The input is not modified
+        self.assertEqual(8, len(automaton.states))
+        self.assertEqual(2, len(automaton.initial_state.transitions["c"]))
+
+        self.assertTrue(automata_are_equivalent(nfa_2_dfa(automaton), nfa_2_dfa(result)))
+        self.assertLessEqual(len(nfa_2_dfa(result).states), len(nfa_2_dfa(automaton).states))
+
+    def test_keep_sink(self):
+        """
+        The dead states of a complete DFA are merged into one that goes to itself, so it stays complete
+        """
+        automaton, _ = state_machine_2()
+        unreachable = State("99", is_final=True)
+        for symbol in automaton.alphabet:
+            unreachable.transitions[symbol] = [automaton.initial_state]
+        automaton = Automaton(automaton.states + [unreachable])
+
+        result = trim_automaton(automaton, keep_sink=True)
+        self.assertTrue(is_dfa(result))
+        self.assertEqual(len(automaton.states) - 1, len(result.states))
+        self.assertTrue(automata_are_equivalent(automaton, result))
+
+        # Without dead or unreachable states there is nothing to do
+        automaton, _ = state_machine_1()
+        self.assertIs(automaton, trim_automaton(automaton))
+
+        # If the initial state is dead, it is the sink
+        s_a = State("A", is_initial=True)
+        s_b = State("B")
+        s_a.transitions["x"] = [s_b]
+        s_b.transitions["x"] = [s_b]
+        result = trim_automaton(Automaton([s_a, s_b]), keep_sink=True)
+        self.assertEqual(["A"], [state.state_id for state in result.states])
+        self.assertEqual([result.states[0]], list(result.states[0].transitions["x"]))
+        self.assertEqual([], list(trim_automaton(Automaton([s_a, s_b])).states[0].transitions.keys()))
+
+    def test_minimization_skips_junk(self):
+        automaton = deserialize_automaton("./resources/state_machine_26.txt")
+
+        with collect_stats(trace_memory=False) as collector:
+            result = minimize_automaton(automaton)
+
+        # The NFA is trimmed before it is converted to a DFA, which has no unreachable states left
+        trims = [phase_stats["counters"] for phase_stats in collector.to_list() if phase_stats["name"] == "trim"]
+        self.assertEqual([{"unreachable_states": 2, "dead_states": 3}, {"unreachable_states": 0}], trims)
+        self.assertTrue(automata_are_equivalent(result, minimize_automaton_by_table_filling(automaton)))
+        self.assertEqual(len(minimize_automaton_by_table_filling(automaton).states), len(result.states))
+
+
+if __name__ == '__main__':
+    unittest.main()
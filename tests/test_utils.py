@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 
 from automata.state_machine import Automaton
@@ -35,10 +37,12 @@ class MyTestCase(unittest.TestCase):
 
     # test to check both initial and final
     def test_write_file(self) -> None:
-        self.test_automaton = save_str_to_file('automata.txt',serialize_automaton(self.load_automaton("./resources/state_machine01.txt")))
+        with tempfile.TemporaryDirectory() as directory:
+            self.test_automaton = save_str_to_file(os.path.join(directory, 'automata.txt'),serialize_automaton(self.load_automaton("./resources/state_machine01.txt")))
 
     def test_write_file2(self) -> None:
-        self.test_automaton = save_str_to_file('automat7.txt',serialize_automaton(self.load_automaton("./resources/state_machine_22.txt")))
+        with tempfile.TemporaryDirectory() as directory:
+            self.test_automaton = save_str_to_file(os.path.join(directory, 'automat7.txt'),serialize_automaton(self.load_automaton("./resources/state_machine_22.txt")))
 
     @staticmethod
     def load_automaton(file) -> Automaton:
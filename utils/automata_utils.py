@@ -1,124 +1,417 @@
 from collections import deque
 
+from automata.dense_dfa import DenseDFA, symbol_classes
 from automata.state_machine import Automaton, State
+from utils.stats import count, measured, is_collecting
 
 
-def nfa_2_dfa(input: Automaton) -> Automaton:
+@measured("determinize")
+def nfa_2_dfa(input: Automaton, subset_names: dict = None, max_states: int = None) -> Automaton:
     """
-           Function to convert from a non deterministic finite automaton to a deterministic one
-     """
-    states_list = []
-    existing_state = {}
-    alphabet = get_alphabet(input)
-    if ' ' in alphabet:
-        input = clean_epsilon_transition(input)
-        alphabet.remove(' ')
-
-    states_queue = [input.initial_state]
-    limbo_state = State(state_id='limbo')
-    for symbol in alphabet:
-        limbo_state.transitions[symbol] = [limbo_state]
-
-    while len(states_queue) > 0:
-        current_state = states_queue.pop(0)
-        existing_state[current_state.state_id] = current_state
-        for symbol in alphabet:
-            needs_limbo = 0
-            state_id = ''
-            is_final = False
-            for id in current_state.state_id.split('-'):
-                for node in input.states:
-                    if id == node.state_id:
-                        element = node
-                        break
+    Function to convert from a non deterministic finite automaton to a deterministic one by using the subset
+    construction.
+
+    The states of the NFA are numbered and every subset of them is kept as an int bitmask, so finding out if a subset
+    was already seen is a dict lookup. The DFA states are named D0, D1, ... in the order their subsets are found,
+    and LIMBO is the state for the empty subset, which is only added if some subset needs it.
+    :param input: a NF Automaton
+    :param subset_names: if a dict is given, it is filled with the subset behind each DFA state, as the IDs of the
+                         NFA states joined by '-', e.g. {"D3": "A-B-C"}
+    :param max_states: if given, the conversion is given up as soon as it finds more subsets than this
+    :return: the equivalent DF Automaton, or None if it would have more than max_states subsets
+    """
+    nfa_states = input.states
+    state_index = {state: i for i, state in enumerate(nfa_states)}
+
+    # The epsilon transitions are folded into the others, without modifying the NFA
+    transition_masks, finals = epsilon_free_transitions(nfa_states, state_index)
+    alphabet = sorted(symbol for symbol in get_alphabet(input) if symbol != ' ')
+
+    # moves[symbol][state] is the mask of the states reached from state with symbol. Symbols with the same moves are
+    #  a class (e.g. the letters of a [a-z] range), the subset reached with them is only calculated once
+    moves = [[masks.get(symbol, 0) for masks in transition_masks] for symbol in alphabet]
+    class_of, representatives = symbol_classes(map(tuple, moves))
+    class_moves = [moves[symbol] for symbol in representatives]
+
+    final_mask = 0
+    for i, is_final in enumerate(finals):
+        if is_final:
+            final_mask |= 1 << i
+
+    initial_mask = 1 << state_index[input.initial_state]
+    subsets = [initial_mask]
+    existing_state = {initial_mask: State("D0", is_initial=True, is_final=bool(initial_mask & final_mask))}
+    states_list = [existing_state[initial_mask]]
+    limbo_state = None
+
+    # The subsets list doubles as the queue of DFA states whose transitions are pending
+    for mask in subsets:
+        current_state = existing_state[mask]
+        members = _mask_members(mask)
+
+        class_targets = []
+        for move in class_moves:
+            target_mask = 0
+            for member in members:
+                target_mask |= move[member]
+
+            if not target_mask:
+                if limbo_state is None:
+                    limbo_state = State("LIMBO")
+                    for limbo_symbol in alphabet:
+                        limbo_state.transitions[limbo_symbol] = [limbo_state]
+                class_targets.append(limbo_state)
+                continue
+
+            target_state = existing_state.get(target_mask)
+            if target_state is None:
+                if max_states is not None and len(subsets) >= max_states:
+                    count("nfa_states", len(nfa_states))
+                    count("dfa_subsets", len(subsets))
+                    return None
+
+                target_state = State("D{}".format(len(subsets)), is_final=bool(target_mask & final_mask))
+                existing_state[target_mask] = target_state
+                subsets.append(target_mask)
+                states_list.append(target_state)
+
+            class_targets.append(target_state)
+
+        for symbol, symbol_class in zip(alphabet, class_of):
+            current_state.transitions[symbol] = [class_targets[symbol_class]]
+
+    if subset_names is not None:
+        for state, mask in zip(states_list, subsets):
+            subset_names[state.state_id] = '-'.join(sorted(nfa_states[i].state_id for i in _mask_members(mask)))
+
+    if limbo_state is not None:
+        states_list.append(limbo_state)
+
+    count("nfa_states", len(nfa_states))
+    count("symbol_classes", len(representatives))
+    count("dfa_subsets", len(subsets))
+    count("dfa_states", len(states_list))
+
+    # The states are valid by construction, with the initial state first
+    return Automaton.from_trusted_states(states_list, states_list[0], tuple(alphabet))
+
+
+def reverse_automaton(input: Automaton) -> Automaton:
+    """
+    Builds a NFA that recognizes the reverse of every string the input recognizes.
 
-                if element.transitions.get(symbol, None) is None:
-                    needs_limbo += 1
-                else:
-                    for transition in element.transitions[symbol]:
-                        if transition.state_id != 'limbo':
-                            if transition.state_id not in state_id.split('-'):
-                                state_id = state_id + '-' + transition.state_id
-                                is_final = is_final or transition.is_final
-
-            if needs_limbo == len(current_state.state_id.split('-')):
-                current_state.transitions[symbol] = [limbo_state]
-                states_list = add_state(states_list, limbo_state)
-            else:
-                if '-' in state_id:
-                    state_id = state_id[1:]
-                    temp_list = state_id.split('-')
-                    temp_list.sort()
-                    state_id = '-'.join(temp_list)
+    Every transition is turned around, the initial state becomes the only final state and a new initial state START
+    goes to the final states with epsilon transitions. The states are named R0, R1, ... in the order of the input.
+    :param input: a DF or NF Automaton
+    :return: the reversed NF Automaton
+    """
+    reversed_states = [State("R{}".format(i), is_final=state is input.initial_state)
+                       for i, state in enumerate(input.states)]
+    state_index = {state: i for i, state in enumerate(input.states)}
 
-                if existing_state.get(state_id, None) is None:
-                    existing_state[state_id] = State(state_id, is_final=is_final)
-                    states_queue.append(existing_state[state_id])
+    for state, reversed_state in zip(input.states, reversed_states):
+        for symbol, targets in state.transitions.items():
+            for target in targets:
+                reversed_states[state_index[target]].transitions.add(symbol, reversed_state)
 
-                current_state.transitions[symbol] = [existing_state[state_id]]
+    initial_state = State("START", is_initial=True)
+    for state, reversed_state in zip(input.states, reversed_states):
+        if state.is_final:
+            initial_state.transitions.add(' ', reversed_state)
 
-                states_list = add_state(states_list, current_state)
+    alphabet = set(input.alphabet)
+    if initial_state.transitions:
+        alphabet.add(' ')
 
-    return Automaton(states=states_list)
+    # The IDs are unique and START is the only initial state
+    return Automaton.from_trusted_states([initial_state] + reversed_states, initial_state, tuple(sorted(alphabet)))
 
 
-def add_state(states_list, current_state):
+def _mask_members(mask: int) -> list:
     """
-               Function to add state to automaton if it is not already added
+    Lists the positions of the bits set in a mask, from the lowest to the highest
     """
-    for state in states_list:
-        if state.state_id == current_state.state_id:
-            return states_list
+    members = []
 
-    states_list.append(current_state)
-    return states_list
+    while mask:
+        lowest_bit = mask & -mask
+        members.append(lowest_bit.bit_length() - 1)
+        mask ^= lowest_bit
 
+    return members
 
+
+@measured("trim")
+def trim_automaton(input: Automaton, keep_sink: bool = False) -> Automaton:
+    """
+    Removes the states that can't be reached from the initial state and the dead states, the ones from which no
+    final state can be reached, so that the later stages don't process them.
+
+    The reachable states are found with a breadth first search from the initial state and the states that can reach
+    a final state with another one over the inverse transitions, so it runs in linear time. The initial state is
+    always kept. The numbers of states removed are counted in the stats as unreachable_states and dead_states.
+    :param input: a DF or NF Automaton, it is not modified
+    :param keep_sink: instead of removing the dead states, merge them into one of them whose transitions go to
+                      itself, so that a complete DFA stays complete
+    :return: a new Automaton, or the input itself if there is nothing to remove. The states are shared with the input
+             if only unreachable states are removed, otherwise they are copies
+    """
+    states = input.states
+    state_index = {state: i for i, state in enumerate(states)}
+    initial = state_index[input.initial_state]
+
+    # The transitions of every state as (symbol, list of target numbers)
+    edges = [[(symbol, [state_index[target] for target in targets]) for symbol, targets in state.transitions.items()]
+             for state in states]
+    successors = [[target for _, targets in state_edges for target in targets] for state_edges in edges]
+
+    reachable = [False] * len(states)
+    reachable[initial] = True
+    pending = deque([initial])
+    while pending:
+        for target in successors[pending.popleft()]:
+            if not reachable[target]:
+                reachable[target] = True
+                pending.append(target)
+
+    predecessors = [[] for _ in states]
+    for source, targets in enumerate(successors):
+        if reachable[source]:
+            for target in targets:
+                predecessors[target].append(source)
+
+    live = [False] * len(states)
+    pending = deque(i for i, state in enumerate(states) if state.is_final and reachable[i])
+    for i in pending:
+        live[i] = True
+    while pending:
+        for source in predecessors[pending.popleft()]:
+            if not live[source]:
+                live[source] = True
+                pending.append(source)
+
+    unreachable_states = len(states) - sum(reachable)
+    dead = [i for i in range(len(states)) if reachable[i] and not live[i]]
+    sink = dead[0] if keep_sink and dead else None     # The initial state comes first, if it is dead it's the sink
+
+    count("unreachable_states", unreachable_states)
+    count("dead_states", len(dead) - (sink is not None))
+    if len(dead) == (sink is not None):
+        if not unreachable_states:
+            return input
+
+        # Nothing reachable goes into an unreachable state, so the transitions of the states that are kept don't
+        #  change and the states can be shared
+        return Automaton.from_trusted_states([state for i, state in enumerate(states) if reachable[i]],
+                                             input.initial_state, input.alphabet)
+
+    copies = {i: State(state.state_id, is_initial=state.is_initial, is_final=state.is_final)
+              for i, state in enumerate(states) if live[i] or i == initial or i == sink}
+
+    # The copy every state goes to: its own, the sink's for the dead states if there is a sink, or None
+    copy_of = [copies.get(i) for i in range(len(states))]
+    if sink is not None:
+        for i in dead:
+            copy_of[i] = copies[sink]
+
+    for i, copy in copies.items():
+        for symbol, targets in edges[i]:
+            kept_targets = [copy_of[target] for target in targets if copy_of[target]]
+            if kept_targets:
+                copy.transitions[symbol] = list(dict.fromkeys(kept_targets))
+
+    # The states keep their order, with the initial state first
+    return Automaton.from_trusted_states(list(copies.values()), copies[initial], input.alphabet)
+
+
+@measured("epsilon_removal")
 def clean_epsilon_transition(input: Automaton) -> Automaton:
     """
           Function to calculate the epsilon lock for each state, hence it removes all of the epsilon transitions from
           the automaton
+
+          The closures of all the states are calculated before any state is modified, so the result doesn't depend
+          on the order of the states.
     """
-    reachable_states = {}
+    states = input.states
+    state_index = {state: i for i, state in enumerate(states)}
+    transition_masks, finals = epsilon_free_transitions(states, state_index)
 
-    for state in input.states:
-        current_states = []
-        next_states = []
-        is_epsilon_connected = False
-        reachable_states[state] = set()
-        for value in state.transitions.get(' ', []):
-            current_states.append(value)
-            is_epsilon_connected = True
-
-        while is_epsilon_connected:
-            for current in current_states:
-                for value in current.transitions.get(' ', []):
-                    next_states.append(value)
-                reachable_states[state].add(current)
-
-            if len(next_states) > 0:
-                current_states = next_states
-                next_states = []
-            else:
-                break
+    if is_collecting():
+        count("epsilon_transitions_removed", sum(len(state.transitions.get(' ', ())) for state in states))
 
-    for state in input.states:
-        for each in reachable_states[state]:
-            if each.is_final:
-                state.is_final = True
-            for k, v in each.transitions.items():
-                if k in state.transitions.keys():
-                    state.transitions[k].extend(v)
-                    temp_set = set(state.transitions[k])
-                    state.transitions[k] = list(temp_set)
-                else:
-                    state.transitions[k] = v
-        if ' ' in state.transitions.keys():
-            state.transitions.pop(' ')
+    for state, masks, is_final in zip(states, transition_masks, finals):
+        state.is_final = is_final
+        state.transitions.clear()
+
+        for symbol, mask in masks.items():
+            state.transitions[symbol] = [states[i] for i in _mask_members(mask)]
 
     return input
 
 
+@measured("epsilon_closures")
+def epsilon_free_transitions(states: list, state_index: dict) -> (list, list):
+    """
+    Calculates the transitions that every state gets once the epsilon transitions are removed: a state can go with
+    a symbol wherever any state in its epsilon closure goes, and it is final if any state in its closure is final.
+
+    Each closure is calculated once. States that reach each other through epsilon transitions (a strongly connected
+    component) share the same closure, so the components are collapsed with Tarjan's algorithm. Tarjan finds the
+    components in reverse topological order, so the transitions of a component are the ones of its own states plus
+    the already calculated ones of the components it reaches, all kept as bitmasks.
+    :param states: the states of the automaton
+    :param state_index: the position of each State in states
+    :return: a list with a dict {symbol: mask of target states} per state, without epsilon, and a list of final flags
+    """
+    components, component_successors = _epsilon_components(states, state_index)
+
+    component_masks = []
+    component_finals = []
+    component_of = [0] * len(states)
+
+    for component, members in enumerate(components):
+        masks = {}
+        is_final = False
+
+        for member in members:
+            component_of[member] = component
+            is_final = is_final or states[member].is_final
+
+            for symbol, targets in states[member].transitions.items():
+                if symbol == ' ':
+                    continue
+
+                mask = masks.get(symbol, 0)
+                for target in targets:
+                    mask |= 1 << state_index[target]
+                masks[symbol] = mask
+
+        for successor in component_successors[component]:
+            is_final = is_final or component_finals[successor]
+
+            for symbol, mask in component_masks[successor].items():
+                masks[symbol] = masks.get(symbol, 0) | mask
+
+        component_masks.append(masks)
+        component_finals.append(is_final)
+
+    transition_masks = [component_masks[component_of[i]] for i in range(len(states))]
+    finals = [component_finals[component_of[i]] for i in range(len(states))]
+
+    count("states", len(states))
+    count("epsilon_components", len(components))
+
+    return transition_masks, finals
+
+
+def epsilon_closures(states: list, state_index: dict) -> list:
+    """
+    Calculates the epsilon closure of every state as a bitmask, a state is always part of its own closure
+    """
+    components, component_successors = _epsilon_components(states, state_index)
+    component_closures = []
+    closures = [0] * len(states)
+
+    for component, members in enumerate(components):
+        closure = 0
+        for member in members:
+            closure |= 1 << member
+
+        for successor in component_successors[component]:
+            closure |= component_closures[successor]
+
+        component_closures.append(closure)
+        for member in members:
+            closures[member] = closure
+
+    return closures
+
+
+def _epsilon_components(states: list, state_index: dict) -> (list, list):
+    """
+    Finds the strongly connected components of the graph of epsilon transitions, see strongly_connected_components
+    """
+    successors = [[state_index[target] for target in state.transitions.get(' ', [])] for state in states]
+
+    return strongly_connected_components(successors)
+
+
+def strongly_connected_components(successors: list) -> (list, list):
+    """
+    Finds the strongly connected components of a graph with an iterative version of Tarjan's algorithm.
+    :param successors: the list of successor nodes of every node, the nodes are numbered from 0
+    :return: the list of members of every component, in reverse topological order, and the set of components that
+             every component has an edge to
+    """
+    state_count = len(successors)
+
+    order = [-1] * state_count          # The order in which the DFS finds each state
+    lowlink = [0] * state_count         # The lowest order reachable from the state through the DFS
+    component_of = [-1] * state_count
+    on_stack = [False] * state_count
+    stack = []
+    components = []
+    component_successors = []
+    counter = 0
+
+    for root in range(state_count):
+        if order[root] != -1:
+            continue
+
+        order[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        dfs = [(root, 0)]   # Pairs of (state, position of the next successor to visit)
+
+        while dfs:
+            state, position = dfs[-1]
+
+            if position < len(successors[state]):
+                dfs[-1] = (state, position + 1)
+                successor = successors[state][position]
+
+                if order[successor] == -1:
+                    order[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = True
+                    dfs.append((successor, 0))
+                elif on_stack[successor]:
+                    lowlink[state] = min(lowlink[state], order[successor])
+                continue
+
+            dfs.pop()
+            if dfs:
+                parent = dfs[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[state])
+
+            if lowlink[state] == order[state]:
+                # The state is the root of a component, its members are on top of the stack
+                component = len(components)
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component_of[member] = component
+                    members.append(member)
+                    if member == state:
+                        break
+
+                # Every component reachable from this one was already found, that's the reverse topological order
+                reached = set()
+                for member in members:
+                    for successor in successors[member]:
+                        if component_of[successor] != component:
+                            reached.add(component_of[successor])
+
+                components.append(members)
+                component_successors.append(reached)
+
+    return components, component_successors
+
+
 def get_alphabet(input: Automaton) -> list:
     """
            Function to creates a unique set of the symbols of the alphabet being used in the automaton
@@ -168,56 +461,108 @@ def is_dfa(input: Automaton) -> bool:
 
 def automata_are_equivalent(automaton_a: Automaton, automaton_b: Automaton) -> bool:
     """
-    Calculates if two DFA are equivalent by using Moore's algorithm.
+    Calculates if two DFA are equivalent, see dense_dfas_are_equivalent.
     Two automata are equivalent if the recognize the same language, regardless of their number of states.
     Doesn't support NFA, for them, convert them to DFA first
 
-    :param automaton_a: a DF Automaton to compare
-    :param automaton_b: another DF Automaton to compare
+    :param automaton_a: a DF Automaton to compare, it may be partial
+    :param automaton_b: another DF Automaton to compare, it may be partial
     :return: True if they are equivalent, False if otherwise
     """
-    # Check if s0 and s0' are compatible, if they are not, don't do anything else
-    if not states_are_compatible(automaton_a.initial_state, automaton_b.initial_state) :
-        return False
-
-    # Create a table for the transitions of each symbol
+    return dense_dfas_are_equivalent(DenseDFA.from_automaton(automaton_a), DenseDFA.from_automaton(automaton_b))
 
-    p = automaton_a.initial_state
-    q = automaton_b.initial_state
 
-    # So that we don't process a pair more than once, initialize to the initial states
-    processed_pairs = {
-        "{},{}".format(p.state_id, q.state_id): True
-    }
-
-    # A queue of pair of states to follow
-    states_to_follow_queue = deque([(p, q)])
+@measured("equivalence")
+def dense_dfas_are_equivalent(dfa_a: DenseDFA, dfa_b: DenseDFA) -> bool:
+    """
+    Calculates if two DenseDFA are equivalent with the algorithm of Hopcroft and Karp.
 
-    # Repeat until we find an incompatible state or we loop through all states
-    while states_to_follow_queue:
-        p, q = states_to_follow_queue.popleft()
+    Starting from the pair of initial states, we follow both DFA with every symbol and merge the states reached in
+    a union-find structure. Every merge is a pair that must be compatible (both final or both not final), and pairs
+    whose states are already in the same set are skipped, so at most n_a + n_b pairs are followed and the whole
+    check runs in near-linear time.
 
-        if not states_are_compatible(p, q):
+    The alphabets don't need to match and transitions can be missing: a missing transition, or a symbol out of the
+    alphabet of one DFA, goes to an implicit reject (sink) state.
+    :param dfa_a: a DenseDFA to compare
+    :param dfa_b: another DenseDFA to compare
+    :return: True if they are equivalent, False if otherwise
+    """
+    alphabet = sorted(set(dfa_a.alphabet) | set(dfa_b.alphabet))
+
+    # The states of dfa_a are 0..n_a - 1 and its sink is n_a, the states of dfa_b and its sink follow them
+    sink_a = dfa_a.state_count
+    offset_b = sink_a + 1
+    sink_b = offset_b + dfa_b.state_count
+
+    def targets_of(dfa: DenseDFA, offset: int, sink: int) -> list:
+        """
+        Makes a function that gives the (global) targets of a state for every symbol of the joint alphabet
+        """
+        symbol_indexes = dfa.symbol_indexes()
+        columns = [symbol_indexes.get(symbol, -1) for symbol in alphabet]
+        transitions, alphabet_size = dfa.transitions, dfa.alphabet_size
+
+        def targets(state: int) -> list:
+            if state == sink:
+                return [sink] * len(columns)
+
+            row = (state - offset) * alphabet_size
+            result = []
+            for column in columns:
+                target = transitions[row + column] if column >= 0 else -1
+                result.append(sink if target == -1 else target + offset)
+            return result
+
+        return targets
+
+    targets_a = targets_of(dfa_a, 0, sink_a)
+    targets_b = targets_of(dfa_b, offset_b, sink_b)
+
+    def is_final(state: int) -> bool:
+        if state < sink_a:
+            return dfa_a.is_final(state)
+        if offset_b <= state < sink_b:
+            return dfa_b.is_final(state - offset_b)
+        return False    # A sink
+
+    parent = list(range(sink_b + 1))
+    size = [1] * (sink_b + 1)
+
+    def find(state: int) -> int:
+        while parent[state] != state:
+            parent[state] = parent[parent[state]]   # Path halving
+            state = parent[state]
+        return state
+
+    def union(root_p: int, root_q: int):
+        if size[root_p] < size[root_q]:
+            root_p, root_q = root_q, root_p
+        parent[root_q] = root_p
+        size[root_p] += size[root_q]
+
+    p, q = dfa_a.initial_state, dfa_b.initial_state + offset_b
+    union(p, q)
+    pairs_to_follow = [(p, q)]
+    pairs_followed = 0
+
+    while pairs_to_follow:
+        p, q = pairs_to_follow.pop()
+        pairs_followed += 1
+
+        if is_final(p) != is_final(q):
+            count("pairs_followed", pairs_followed)
             return False
 
-        # Check where to transition, and check if both states have transitions for the symbol, if not, return False
-        for symbol in p.transitions.keys():
-
-            if symbol not in q.transitions:
-                return False
-
-            new_p = p.transitions.get(symbol)[0]    # Transitions are lists, for DFA, they are of length == 1
-            new_q = q.transitions.get(symbol)[0]
-
-            # Check if we have not already visited this pair, if we have, skip it
-            str_pair = "{},{}".format(new_p.state_id, new_q.state_id)
+        for new_p, new_q in zip(targets_a(p), targets_b(q)):
+            root_p, root_q = find(new_p), find(new_q)
 
-            if str_pair not in processed_pairs:
-                # Add it to the states to visit queue
-                processed_pairs[str_pair] = True
-                states_to_follow_queue.append((new_p, new_q))
+            if root_p != root_q:
+                union(root_p, root_q)
+                pairs_to_follow.append((new_p, new_q))
 
-    # If, after iterating over all states, there were no incompatible pairs, the automata are equivalent
+    # If, after following all the pairs, there were no incompatible pairs, the automata are equivalent
+    count("pairs_followed", pairs_followed)
     return True
 
 
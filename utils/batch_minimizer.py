@@ -0,0 +1,130 @@
+import glob
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from automata.dense_dfa import DenseDFA
+from utils.file_utils import BINARY_EXTENSION, load_automaton_file, save_automaton_file
+from utils.cache import MinimizationCache, DEFAULT_CACHE_SIZE
+from utils.minimizer import minimize_automaton
+from utils.stats import collect_stats, phase, count
+
+AUTOMATON_FILE_EXTENSIONS = (".txt", BINARY_EXTENSION)
+MINIMIZED_SUFFIX = ".min"
+
+# The outcome of minimizing one file. snapshot is the minimized automaton as a DenseDFA if minimize_files was asked
+#  for snapshots (it is cheap to send back from a worker process, but all of them are kept until the batch is over)
+#  and None otherwise, error is None unless the file could not be minimized and stats is the list of phases
+#  measured by the worker (see utils.stats), or None if they were not collected
+BatchResult = namedtuple("BatchResult", ["input_path", "output_path", "original_states", "minimized_states",
+                                         "snapshot", "error", "stats"], defaults=[None])
+
+
+def find_automaton_files(patterns: list) -> list:
+    """
+    Expands directories and glob patterns into the list of automaton files to minimize.
+
+    A directory gives every file in it with one of the AUTOMATON_FILE_EXTENSIONS, anything else is used as a glob
+    pattern. Files that were already minimized (their name ends in MINIMIZED_SUFFIX) are skipped.
+    :param patterns: directories, file paths or glob patterns
+    :return: a sorted list of file paths without repetitions
+    """
+    paths = set()
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(os.path.join(pattern, file_name) for file_name in os.listdir(pattern)
+                         if file_name.endswith(AUTOMATON_FILE_EXTENSIONS))
+        else:
+            paths.update(glob.glob(pattern))
+
+    return sorted(path for path in paths
+                  if os.path.isfile(path) and not os.path.splitext(path)[0].endswith(MINIMIZED_SUFFIX))
+
+
+def minimized_file_path(input_path: str, output_dir: str = None, binary: bool = False) -> str:
+    """
+    Builds the path where the minimized version of input_path is saved: <name>.min.txt or <name>.min.dfab, in
+    output_dir or next to the input file
+    """
+    directory, file_name = os.path.split(input_path)
+    stem = os.path.splitext(file_name)[0]
+    extension = BINARY_EXTENSION if binary else ".txt"
+
+    return os.path.join(output_dir if output_dir is not None else directory, stem + MINIMIZED_SUFFIX + extension)
+
+
+def minimize_files(input_paths: list, output_dir: str = None, workers: int = None, chunksize: int = 1,
+                   binary: bool = False, stats: bool = False, cache_dir: str = None,
+                   cache_size: int = DEFAULT_CACHE_SIZE, snapshots: bool = False) -> list:
+    """
+    Minimizes many automaton files across a pool of processes, each file is read, minimized and saved by a worker.
+
+    A file that can't be minimized (e.g. its format is invalid) does not stop the batch, its BatchResult carries the
+    error instead.
+    :param input_paths: the automaton files, in Byron TXT or binary format
+    :param output_dir: where to save the minimized automata, they are saved next to each input file if None
+    :param workers: how many processes to use, os.cpu_count() if None
+    :param chunksize: how many files are sent to a worker at a time, bigger chunks pay off with many small files
+    :param binary: save the minimized automata in binary format instead of Byron TXT
+    :param stats: collect the stats of the phases of every file, with their peak memory
+    :param cache_dir: the directory of a MinimizationCache shared by the workers, None to not use a cache
+    :param cache_size: how many bytes the cache can take
+    :param snapshots: send the minimized automata back as DenseDFA in the results, only the counts are sent otherwise
+    :return: a list with a BatchResult per input file, in the same order as input_paths
+    """
+    if chunksize < 1:
+        raise ValueError("The chunksize must be at least 1 but it is {}".format(chunksize))
+
+    output_paths = [minimized_file_path(path, output_dir, binary) for path in input_paths]
+
+    seen_paths = set()
+    for output_path in output_paths:
+        if output_path in seen_paths:
+            raise ValueError("More than one input file would be minimized to {}".format(output_path))
+        seen_paths.add(output_path)
+
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    cache = (cache_dir, cache_size) if cache_dir is not None else None
+    jobs = [(input_path, output_path, stats, cache, snapshots)
+            for input_path, output_path in zip(input_paths, output_paths)]
+    if not jobs:
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_minimize_file, jobs, chunksize=chunksize))
+
+
+def _minimize_file(job: tuple) -> BatchResult:
+    # The worker runs in another process, so it must be a module level function and it only gets and returns
+    #  picklable values
+    input_path, output_path, with_stats, cache, with_snapshot = job
+
+    if with_stats:
+        with collect_stats() as collector:
+            result = _minimize_file((input_path, output_path, False, cache, with_snapshot))
+        return result._replace(stats=collector.to_list())
+
+    try:
+        input_automaton = load_automaton_file(input_path)
+        if cache is not None:
+            minimized_automaton = MinimizationCache(*cache).minimize(input_automaton)
+        else:
+            minimized_automaton = minimize_automaton(input_automaton)
+        save_automaton_file(output_path, minimized_automaton)
+        count("states", len(minimized_automaton.states))
+
+        snapshot = None
+        if with_snapshot:
+            with phase("snapshot"):
+                snapshot = DenseDFA.from_automaton(minimized_automaton)
+
+    except Exception as e:
+        # Whatever goes wrong with a file (a malformed or a huge automaton) is reported in its result, so the other
+        #  files of the batch are still minimized
+        return BatchResult(input_path, None, None, None, None, "{}: {}".format(type(e).__name__, e))
+
+    return BatchResult(input_path, output_path, len(input_automaton.states), len(minimized_automaton.states),
+                       snapshot, None)
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from automata.state_machine import Automaton
+from utils.file_utils import BINARY_EXTENSION, deserialize_binary, serialize_binary
+from utils.minimizer import minimize_automaton
+from utils.stats import phase, count
+
+# Changing how automata are minimized (or how the keys are calculated) must change this, so that old results are
+#  not used anymore
+CACHE_VERSION = 4
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+# A temporary file this old is not being written anymore, its writer crashed before renaming it
+STALE_TEMPORARY_SECONDS = 3600
+TEMPORARY_SUFFIX = ".tmp"
+
+
+def cache_key(input_automaton: Automaton) -> str:
+    """
+    Calculates a hash of an automaton that doesn't depend on the order of its states nor of its transitions, so that
+    the same automaton read from files with the lines in a different order gets the same key.
+
+    The automaton is described by its initial state, its final states and its transitions, all sorted, and the key is
+    the sha256 of that description as JSON.
+    :param input_automaton: an Automaton, NFA or DFA
+    :return: the key as a hex string
+    """
+    transitions = sorted((state.state_id, symbol, target.state_id)
+                         for state in input_automaton.states
+                         for symbol, targets in state.transitions.items()
+                         for target in targets)
+    description = {
+        "version": CACHE_VERSION,
+        "initial": input_automaton.initial_state.state_id,
+        "states": sorted(state.state_id for state in input_automaton.states),
+        "finals": sorted(state.state_id for state in input_automaton.states if state.is_final),
+        "transitions": transitions,
+    }
+
+    return hashlib.sha256(json.dumps(description, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+class MinimizationCache:
+    """
+    A cache of minimized automata on disk, shared by every process that uses the same directory.
+
+    Every result is saved in binary format in a file named after the cache_key of the input automaton. Files are
+    written to a temporary file first and then renamed, so other processes see either the whole file or nothing.
+    Reading a result touches its file, and when the files take more than max_bytes the least recently used ones are
+    deleted, along with the temporary files older than STALE_TEMPORARY_SECONDS that crashed writers left behind.
+
+    Looking at the size of every file takes a scan of the directory, so each MinimizationCache keeps a running total
+    of the bytes it saved since its last scan and only scans again when that total goes over max_bytes. The results
+    that other processes save are seen at that scan.
+    """
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_SIZE):
+        if max_bytes < 0:
+            raise ValueError("The size of the cache can't be negative but it is {}".format(max_bytes))
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._total_bytes = None    # The size of the cache as of the last scan plus what was saved since, if known
+        os.makedirs(directory, exist_ok=True)
+
+    def path_of(self, key: str) -> str:
+        return os.path.join(self.directory, key + BINARY_EXTENSION)
+
+    def get(self, key: str):
+        """
+        Reads the minimized automaton saved for a key.
+        :return: the Automaton, or None if there is none
+        """
+        path = self.path_of(key)
+
+        try:
+            result = deserialize_binary(path)
+        except FileNotFoundError:
+            return None     # It was never saved or it was just evicted
+        except ValueError:
+            self._remove(path)  # A damaged file is as good as a missing one
+            return None
+
+        try:
+            os.utime(path)  # Mark it as recently used
+        except FileNotFoundError:
+            pass
+
+        return result
+
+    def put(self, key: str, minimized_automaton: Automaton):
+        """
+        Saves the minimized automaton for a key and evicts the least recently used results if the cache got too big
+        """
+        contents = serialize_binary(minimized_automaton)
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, prefix=".", suffix=TEMPORARY_SUFFIX)
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                file.write(contents)
+            os.replace(temporary_path, self.path_of(key))
+        except BaseException:
+            self._remove(temporary_path)
+            raise
+
+        if self._total_bytes is not None:
+            self._total_bytes += len(contents)
+        if self._total_bytes is None or self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def minimize(self, input_automaton: Automaton) -> Automaton:
+        """
+        Minimizes an automaton like minimize_automaton, unless the result for the same automaton was already saved,
+        then it is read from the cache instead
+        """
+        with phase("cache_lookup"):
+            key = cache_key(input_automaton)
+            result = self.get(key)
+            count("cache_hits" if result is not None else "cache_misses")
+
+        if result is None:
+            result = minimize_automaton(input_automaton)
+
+            with phase("cache_store"):
+                self.put(key, result)
+
+        return result
+
+    def size(self) -> int:
+        """
+        The bytes taken by the files of the cache, the temporary ones included
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Deletes the stale temporary files, and then the least recently used results until the cache takes at most
+        max_bytes
+        """
+        stale_before = time.time_ns() - STALE_TEMPORARY_SECONDS * 10 ** 9
+        results = []
+        total_bytes = 0
+
+        for path, size, last_use in self._entries():
+            if not path.endswith(TEMPORARY_SUFFIX):
+                results.append((path, size, last_use))
+                total_bytes += size
+            elif last_use < stale_before:
+                self._remove(path)
+                count("cache_stale_temporaries")
+            else:
+                total_bytes += size     # Still being written, it will be a result soon
+
+        if total_bytes > self.max_bytes:
+            for path, size, _ in sorted(results, key=lambda entry: entry[2]):
+                self._remove(path)
+                count("cache_evictions")
+                total_bytes -= size
+                if total_bytes <= self.max_bytes:
+                    break
+
+        self._total_bytes = total_bytes
+
+    def _entries(self) -> list:
+        # (path, size, last use) of every result and temporary file, files that disappear while looking at them are
+        #  skipped
+        entries = []
+
+        with os.scandir(self.directory) as directory:
+            for entry in directory:
+                if not entry.name.endswith((BINARY_EXTENSION, TEMPORARY_SUFFIX)):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+
+        return entries
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,151 @@
+"""
+The client of utils.server, see the module docstring there for the protocol.
+
+    client = await AutomataClient.connect(port=7401)
+    minimized = await client.minimize(automaton)
+    matches = await client.match(minimized.automaton_id, ["ab", "ba"])
+    await client.close()
+
+The automata can be given as Automaton objects, which are sent in Byron TXT format, or as the ID the server gave them,
+which saves sending and parsing them again. Many requests can be awaited at the same time on one connection.
+"""
+import asyncio
+import itertools
+import json
+from collections import namedtuple
+
+from automata.state_machine import Automaton
+from utils.file_utils import deserialize_automaton_str, serialize_automaton
+from utils.server import DEFAULT_HOST, DEFAULT_PORT, MAX_MESSAGE_BYTES
+
+# An automaton made by the server and the ID to refer to it in later requests
+RemoteAutomaton = namedtuple("RemoteAutomaton", ["automaton_id", "automaton"])
+
+
+class ServerError(Exception):
+    """
+    Raised when the server answers a request with an error, the message is the one of the server
+    """
+
+
+class AutomataClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._request_ids = itertools.count(1)
+        self._pending = {}      # request ID -> the future of its response
+        self._read_task = asyncio.ensure_future(self._read_responses())
+
+    @classmethod
+    async def connect(cls, path: str = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> "AutomataClient":
+        """
+        Connects to a server on a Unix socket if path is given, or on a TCP port otherwise
+        """
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=MAX_MESSAGE_BYTES)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_MESSAGE_BYTES)
+
+        return cls(reader, writer)
+
+    async def close(self):
+        self._writer.close()
+        self._read_task.cancel()
+        try:
+            await self._read_task
+        except asyncio.CancelledError:
+            pass
+
+    async def __aenter__(self) -> "AutomataClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, op: str, **fields) -> dict:
+        """
+        Sends a request and waits for its response
+        :param op: the operation, see utils.server
+        :param fields: the fields of the request
+        :return: the result of the request
+        :raise ServerError: if the server answers with an error
+        """
+        if self._read_task.done():
+            raise ConnectionError("The connection to the server is closed")
+
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+
+        try:
+            message = dict(fields, id=request_id, op=op)
+            self._writer.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+            await self._writer.drain()
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def load(self, automaton: Automaton) -> str:
+        """
+        Sends an automaton to the server
+        :return: its ID
+        """
+        return (await self.request("load", **_automaton_fields(automaton)))["automaton_id"]
+
+    async def minimize(self, automaton) -> RemoteAutomaton:
+        """
+        Minimizes an Automaton, or the automaton with the given ID, see minimize_automaton
+        """
+        return _remote_automaton(await self.request("minimize", **_automaton_fields(automaton)))
+
+    async def determinize(self, automaton) -> RemoteAutomaton:
+        """
+        Converts an Automaton, or the automaton with the given ID, to a DFA
+        """
+        return _remote_automaton(await self.request("determinize", **_automaton_fields(automaton)))
+
+    async def equivalent(self, automaton_a, automaton_b) -> bool:
+        """
+        Tells whether two automata (Automaton objects or IDs, NFA or DFA) recognize the same language
+        """
+        result = await self.request("equivalent", a=_automaton_fields(automaton_a), b=_automaton_fields(automaton_b))
+        return result["equivalent"]
+
+    async def match(self, automaton, input_strings: list) -> list:
+        """
+        Matches strings against an Automaton, or the automaton with the given ID
+        :return: a list with whether each string is accepted
+        """
+        return (await self.request("match", strings=list(input_strings), **_automaton_fields(automaton)))["matches"]
+
+    async def _read_responses(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+
+                response = json.loads(line)
+                future = self._pending.get(response.get("id"))
+                if future is None or future.done():
+                    continue    # An answer to a request that was cancelled, or to a line the server couldn't read
+
+                if "error" in response:
+                    future.set_exception(ServerError(response["error"]))
+                else:
+                    future.set_result(response["result"])
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("The connection to the server was closed"))
+
+
+def _automaton_fields(automaton) -> dict:
+    if isinstance(automaton, str):
+        return {"automaton_id": automaton}
+
+    return {"automaton": serialize_automaton(automaton)}
+
+
+def _remote_automaton(result: dict) -> RemoteAutomaton:
+    return RemoteAutomaton(result["automaton_id"], deserialize_automaton_str(result["automaton"]))
@@ -1,4 +1,8 @@
-import re
+import mmap
+import struct
+import sys
+from array import array
+from itertools import islice, repeat
 from os import linesep
 
 try:
@@ -7,56 +11,257 @@ try:
 except ImportError:
     IS_GRAPHVIZ_AVAILABLE = False
 
-from automata.state_machine import Automaton, State
+from automata.compact_nfa import CompactNFA
+from automata.dense_dfa import DenseDFA
+from automata.state_machine import Automaton
+from utils.stats import phase, count, measured
+
+BINARY_MAGIC = b"DFAB"
+BINARY_VERSION = 1
+BINARY_EXTENSION = ".dfab"
+
+# magic, version, flags, state count, alphabet size, initial state, padding and the offsets of the alphabet table,
+#  the state ID table, the transition array and the accepting bitmap
+_BINARY_HEADER = struct.Struct("<4sHHIII4xQQQQ")
+
+
+class AutomatonFormatError(ValueError):
+    """
+    Raised when a file with an automaton can't be parsed, for Byron TXT files the message tells the line where the
+    problem is
+    """
+    def __init__(self, message: str, line_number: int = None):
+        if line_number is not None:
+            message = "Line {}: {}".format(line_number, message)
+
+        super().__init__(message)
+        self.line_number = line_number
 
 
 def deserialize_automaton(input_file_path: str) -> Automaton:
-    states = []
-    visited_state = {}
+    compact_automaton = parse_automaton(input_file_path)
+
+    with phase("build_states"):
+        return compact_automaton.to_automaton()
+
+
+def deserialize_automaton_str(contents: str) -> Automaton:
+    """
+    Reads an automaton in Byron TXT format from a string, e.g. one made by serialize_automaton
+    """
+    compact_automaton = parse_automaton_lines(contents.splitlines(keepends=True))
+
+    with phase("build_states"):
+        return compact_automaton.to_automaton()
+
+
+def load_automaton_file(input_file_path: str) -> Automaton:
+    """
+    Reads an automaton from a file either in Byron TXT format or in binary format
+    """
+    if is_binary_automaton_file(input_file_path):
+        return deserialize_binary(input_file_path)
+
+    return deserialize_automaton(input_file_path)
+
+
+@measured("save")
+def save_automaton_file(output_file_path: str, input_automaton: Automaton):
+    """
+    Saves an automaton in binary format if the path ends with BINARY_EXTENSION, or in Byron TXT format otherwise
+    """
+    if output_file_path.endswith(BINARY_EXTENSION):
+        save_bytes_to_file(output_file_path, serialize_binary(input_automaton))
+    else:
+        save_str_to_file(output_file_path, serialize_automaton(input_automaton))
+
+
+@measured("parse")
+def parse_automaton(input_file_path: str, batch_size: int = 1 << 20) -> CompactNFA:
+    """
+    Reads an automaton in Byron TXT format, one transition per line as 'state|symbol|state', where a state marked
+    with '>' is initial and one marked with '*' is final. Lines starting with '#' and blank lines are ignored.
+    :param input_file_path: the path of the file to read
+    :param batch_size: roughly how many characters are read and parsed at a time
+    :return: a CompactNFA with the automaton
+    """
+    reader = _AutomatonReader()
 
     with open(input_file_path, "r") as file:
-        for line in file:
+        while True:
+            lines = file.readlines(batch_size)
+            if not lines:
+                break
+            reader.read_lines(lines)
+
+    return reader.build()
+
+
+@measured("parse")
+def parse_automaton_lines(lines, batch_size: int = 1 << 14) -> CompactNFA:
+    """
+    Parses an automaton in Byron TXT format from an iterable of lines (e.g. a socket or a generator), the lines are
+    consumed in batches and never kept in memory
+    :param lines: an iterable of lines
+    :param batch_size: how many lines are parsed at a time
+    :return: a CompactNFA with the automaton
+    """
+    reader = _AutomatonReader()
+    lines = iter(lines)
+
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            break
+        reader.read_lines(batch)
+
+    return reader.build()
+
+
+class _Numbering(dict):
+    """
+    A dict that gives a number to every key the first time it is looked up, by calling new_number(key)
+    """
+    def __init__(self, new_number):
+        super().__init__()
+        self.new_number = new_number
+
+    def __missing__(self, key):
+        number = self.new_number(key)
+        self[key] = number
+        return number
+
+
+class _AutomatonReader:
+    """
+    Builds a CompactNFA from batches of lines without keeping the lines nor any State object in memory.
+
+    State IDs and symbols are numbered the first time they are found. The numbers are looked up by the raw field,
+    marks included, so '>q0', 'q0' and '*q0' are three entries that go to the same state, and the marks of a field
+    are only looked at once. Batches without comments, blank lines or errors (which should be almost all of them)
+    are split all at once and their fields are numbered with map(), which keeps the Python loop out of the common
+    path. Other batches are parsed line by line so that errors can tell the line where they are.
+
+    A symbol written as a bracket expression, e.g. 'q0|[a-z0-9_]|q1', is a range: the line stands for a transition
+    with every symbol in it (see expand_symbol_range). Batches with ranges are parsed line by line.
+    """
+    def __init__(self):
+        self.state_numbers = {}
+        self.state_ids = []
+        self.finals = bytearray()
+        self.initial_states = set()
+        self.alphabet = []
+
+        self.field_numbers = _Numbering(self._number_state_field)
+        self.symbol_numbers = _Numbering(self._number_symbol)
+        self.range_numbers = _Numbering(self._number_symbol_range)
+
+        self.sources = array("i")
+        self.symbols = array("i")
+        self.targets = array("i")
+
+        self.line_number = 0        # The number of the last line read
+        self.current_line = None    # The number of the line being parsed line by line, for the errors
+
+    def read_lines(self, lines: list):
+        first_line_number = self.line_number + 1
+        self.line_number += len(lines)
+
+        text = "".join(lines)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        if text.endswith("\n"):
+            text = text[:-1]
+
+        clean_lines = text.split("\n")
+        if "\n#" in text or text.startswith("#") or not all(clean_lines):
+            clean_lines = [line for line in clean_lines if line and line[0] != "#"]
+
+        if clean_lines and "|[" not in text and set(map(str.count, clean_lines, repeat("|", len(clean_lines)))) == {2}:
+            try:
+                fields = "|".join(clean_lines).split("|")
+                self.symbols.extend(map(self.symbol_numbers.__getitem__, fields[1::3]))
+
+                # Number the states in the order they appear, the same as when parsing line by line
+                del fields[1::3]
+                state_numbers = array("i", map(self.field_numbers.__getitem__, fields))
+                self.sources.extend(state_numbers[0::2])
+                self.targets.extend(state_numbers[1::2])
+                return
+            except AutomatonFormatError:
+                pass    # Parse the batch line by line to tell where the error is
+
+        self._read_line_by_line(lines, first_line_number)
+
+    def _read_line_by_line(self, lines: list, first_line_number: int):
+        for self.current_line, line in enumerate(lines, start=first_line_number):
 
             if line.startswith("#") or line.strip() == '':
                 continue
 
-            curated_line = line.strip('\n').split("|")
-            s_init = curated_line[0]
-            transition = curated_line[1]
-            s_out = curated_line[2]
-
-            is_in_initial = is_init(s_init)
-            is_in_final = is_final(s_init)
-            in_id = remove_char(s_init)
-
-            out_initial_tag = is_init(s_out)
-            out_final_tag = is_final(s_out)
-            out_id = remove_char(s_out)
-
-            if out_id in visited_state.keys():
-                out_tmp_state = visited_state[out_id]
-                if out_initial_tag and not out_tmp_state.is_initial:
-                    out_tmp_state.is_initial = out_initial_tag
-                if out_final_tag and not out_tmp_state.is_final:
-                    out_tmp_state.is_final = out_final_tag
-            else:
-                out_tmp_state = State(out_id, out_initial_tag, out_final_tag)
-                visited_state[out_id] = out_tmp_state
-                states.append(out_tmp_state)
-
-            if in_id not in visited_state.keys():
-                state = State(in_id, is_initial=is_in_initial, is_final=is_in_final)
-                visited_state[in_id] = state
-                state.transitions[transition] = [out_tmp_state]
-                states.append(state)
+            fields = line.rstrip("\r\n").split("|")
+            if len(fields) != 3:
+                raise AutomatonFormatError("Expected a transition as 'state|symbol|state' but found '{}'"
+                                           .format(line.rstrip("\r\n")), self.current_line)
+
+            source = self.field_numbers[fields[0]]
+            if is_symbol_range(fields[1]):
+                symbols = self.range_numbers[fields[1]]
+                target = self.field_numbers[fields[2]]
+
+                self.sources.extend([source] * len(symbols))
+                self.symbols.extend(symbols)
+                self.targets.extend([target] * len(symbols))
             else:
-                state = visited_state[in_id]
-                state.transitions[transition].append(out_tmp_state)
+                self.sources.append(source)
+                self.symbols.append(self.symbol_numbers[fields[1]])
+                self.targets.append(self.field_numbers[fields[2]])
+
+        self.current_line = None
+
+    def _number_state_field(self, field: str) -> int:
+        state_id = remove_char(field) if is_init(field) or is_final(field) else field
+
+        number = self.state_numbers.get(state_id)
+        if number is None:
+            if not state_id:
+                raise AutomatonFormatError("A State was given an empty ID but it is mandatory!", self.current_line)
+
+            number = len(self.state_ids)
+            self.state_numbers[state_id] = number
+            self.state_ids.append(state_id)
+            self.finals.append(0)
+
+        if is_init(field):
+            self.initial_states.add(number)
+        if is_final(field):
+            self.finals[number] = 1
+
+        return number
+
+    def _number_symbol(self, symbol: str) -> int:
+        self.alphabet.append(symbol)
+        return len(self.alphabet) - 1
+
+    def _number_symbol_range(self, field: str) -> array:
+        return array("i", map(self.symbol_numbers.__getitem__, expand_symbol_range(field, self.current_line)))
+
+    def build(self) -> CompactNFA:
+        if len(self.initial_states) != 1:
+            raise AutomatonFormatError("{} states found, but the Automaton must have 1 and only 1 initial state"
+                                       .format(len(self.initial_states)))
 
-            if is_in_initial:
-                state.is_initial = True
+        # State IDs are case insensitive, the same as in Automaton
+        state_ids = [state_id.upper() for state_id in self.state_ids]
+        if len(set(state_ids)) < len(state_ids):
+            raise AutomatonFormatError("More than one state has the same ID, they should be unique!")
 
-    return Automaton(states)
+        count("lines", self.line_number)
+        count("states", len(state_ids))
+        count("transitions", len(self.sources))
+
+        return CompactNFA(state_ids, self.alphabet, self.sources, self.symbols, self.targets, self.finals,
+                          next(iter(self.initial_states)))
 
 
 def is_init(state):
@@ -68,7 +273,45 @@ def is_final(state):
 
 
 def remove_char(tag):
-    return re.sub("[>*]", "", tag)
+    return tag.replace(">", "").replace("*", "")
+
+
+def is_symbol_range(symbol: str) -> bool:
+    return len(symbol) > 2 and symbol[0] == "[" and symbol[-1] == "]"
+
+
+def expand_symbol_range(field: str, line_number: int = None) -> list:
+    """
+    Lists the symbols of a bracket expression like '[a-z0-9_]': every 'x-y' stands for the characters from x to y
+    and any other character for itself, a '-' at the start or at the end is a '-'. The space can't be in a range
+    because it is the epsilon symbol, nor can '|' because it separates the fields
+    :param field: the symbol field, brackets included
+    :param line_number: the line of the field, for the errors
+    :return: the symbols without repetitions, sorted
+    """
+    contents = field[1:-1]
+    code_points = set()
+
+    i = 0
+    while i < len(contents):
+        if i + 2 < len(contents) and contents[i + 1] == "-":
+            first, last = ord(contents[i]), ord(contents[i + 2])
+            if first > last:
+                raise AutomatonFormatError("The range '{}' in '{}' is reversed".format(contents[i:i + 3], field),
+                                           line_number)
+            code_points.update(range(first, last + 1))
+            i += 3
+        else:
+            code_points.add(ord(contents[i]))
+            i += 1
+
+    if ord(" ") in code_points:
+        raise AutomatonFormatError("The range '{}' has a space, which is the epsilon symbol".format(field),
+                                   line_number)
+    if ord("|") in code_points:
+        raise AutomatonFormatError("The range '{}' has a '|', which can't be a symbol".format(field), line_number)
+
+    return [chr(code_point) for code_point in sorted(code_points)]
 
 
 def serialize_automaton(input_automaton: Automaton) -> str:
@@ -101,6 +344,229 @@ def serialize_automaton(input_automaton: Automaton) -> str:
     return "".join(output_str_elements)
 
 
+def serialize_binary(input_automaton: Automaton) -> bytes:
+    """
+    Serializes a DF Automaton (it may be partial) to the binary format, see serialize_binary_dfa
+    """
+    return serialize_binary_dfa(DenseDFA.from_automaton(input_automaton))
+
+
+def serialize_binary_dfa(dfa: DenseDFA) -> bytes:
+    """
+    Serializes a DenseDFA to the binary format, which is meant to be loaded much faster than Byron TXT.
+
+    All numbers are little-endian. The file is made of:
+    1. A header with the magic number, the format version, the state count, the alphabet size, the initial state
+       and the offset of each of the following sections, every section starts at a multiple of 8
+    2. The alphabet table: the byte length of the table as a uint32 followed by the symbols in UTF-8, separated by
+       new lines (neither states nor symbols can have a new line in Byron TXT)
+    3. The state ID table, with the same layout as the alphabet table
+    4. The transition array: state_count * alphabet_size int32, the same table a DenseDFA has
+    5. The accepting bitmap: one bit per state, the bit of state i is (i & 7) of byte (i >> 3)
+    :param dfa: the DenseDFA to serialize
+    :return: the bytes of the file
+    """
+    sections = [
+        _string_table(dfa.alphabet),
+        _string_table(dfa.state_ids),
+        _little_endian_bytes(dfa.transitions),
+        bytes(dfa.accepting),
+    ]
+
+    offsets = []
+    body = bytearray()
+    for section in sections:
+        offsets.append(_BINARY_HEADER.size + len(body))
+        body += section
+        body += bytes(-len(body) % 8)
+
+    header = _BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, dfa.state_count, dfa.alphabet_size,
+                                 dfa.initial_state, *offsets)
+
+    return header + bytes(body)
+
+
+def deserialize_binary(input_file_path: str) -> Automaton:
+    dfa = deserialize_binary_dfa(input_file_path)
+
+    with phase("build_states"):
+        return dfa.to_automaton()
+
+
+@measured("parse_binary")
+def deserialize_binary_dfa(input_file_path: str) -> DenseDFA:
+    with open(input_file_path, "rb") as file:
+        dfa = binary_to_dense_dfa(file.read())
+
+    count("states", dfa.state_count)
+    count("symbols", dfa.alphabet_size)
+    return dfa
+
+
+def map_binary_dfa(input_file_path: str) -> DenseDFA:
+    """
+    Loads a DenseDFA from a file in the binary format without reading it: the file is mmap-ed and the transition
+    table and the accepting bitmap of the DenseDFA are memoryviews of the mapped pages. Processes that map the same
+    file share a single copy of it in the page cache, and loading costs the mmap call only, the pages are read by the
+    OS as the matching touches them.
+
+    The state IDs are only decoded the first time they are used. The file must not be modified while it is mapped.
+
+    For matching, use DFAMatcher(dfa, find_dead_states=False), finding the dead states needs a copy of the table.
+    :param input_file_path: the path of the file in binary format
+    :return: a DenseDFA backed by the mapped file
+    """
+    if sys.byteorder == "big":
+        return deserialize_binary_dfa(input_file_path)     # The tables need to be byte-swapped, so copied
+
+    with open(input_file_path, "rb") as file:
+        mapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    sections = read_binary_sections(mapped_file, decode_state_ids=False)
+
+    return DenseDFA(sections["state_ids"], sections["alphabet"], sections["transitions"].cast("i"),
+                    sections["accepting"], sections["initial_state"])
+
+
+def binary_to_dense_dfa(buffer) -> DenseDFA:
+    """
+    Builds a DenseDFA from the bytes of a file in the binary format, the tables are copied out of the buffer with
+    array.frombytes
+    :param buffer: a bytes-like object
+    :return: the DenseDFA
+    """
+    sections = read_binary_sections(buffer)
+
+    transitions = array("i")
+    transitions.frombytes(sections["transitions"])
+    if sys.byteorder == "big":
+        transitions.byteswap()
+
+    return DenseDFA(sections["state_ids"], sections["alphabet"], transitions, bytearray(sections["accepting"]),
+                    sections["initial_state"])
+
+
+def read_binary_sections(buffer, decode_state_ids: bool = True) -> dict:
+    """
+    Reads the header of a file in the binary format and slices its sections, without copying them.
+    :param buffer: a bytes-like object, e.g. bytes or a mmap
+    :param decode_state_ids: whether to decode the state IDs right away, or to decode them on first use
+    :return: a dict with the state_count, alphabet_size, initial_state, the alphabet and the state_ids (decoded)
+             and memoryviews of the transitions and accepting sections
+    """
+    view = memoryview(buffer)
+    if len(view) < _BINARY_HEADER.size or bytes(view[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise AutomatonFormatError("The file is not an automaton in binary format")
+
+    magic, version, flags, state_count, alphabet_size, initial_state, alphabet_offset, state_ids_offset, \
+        transitions_offset, accepting_offset = _BINARY_HEADER.unpack_from(view)
+
+    if version != BINARY_VERSION:
+        raise AutomatonFormatError("Version {} of the binary format is not supported, only version {} is"
+                                   .format(version, BINARY_VERSION))
+
+    if state_count == 0 or initial_state >= state_count:
+        raise AutomatonFormatError("The initial state {} is not one of the {} states".format(initial_state,
+                                                                                            state_count))
+
+    # Every section must be inside the file, otherwise a damaged file would fail with struct.error or IndexError
+    _check_string_table(view, alphabet_offset, "alphabet")
+    _check_string_table(view, state_ids_offset, "state ID")
+    transitions_end = _check_section(view, transitions_offset, 4 * state_count * alphabet_size, "transition")
+    accepting_end = _check_section(view, accepting_offset, (state_count + 7) // 8, "accepting")
+
+    alphabet = _read_string_table(view, alphabet_offset, alphabet_size)
+    if decode_state_ids:
+        state_ids = _read_string_table(view, state_ids_offset, state_count)
+    else:
+        state_ids = _LazyStringTable(view, state_ids_offset, state_count)
+
+    return {
+        "state_count": state_count,
+        "alphabet_size": alphabet_size,
+        "initial_state": initial_state,
+        "alphabet": tuple(alphabet),
+        "state_ids": state_ids,
+        "transitions": view[transitions_offset:transitions_end],
+        "accepting": view[accepting_offset:accepting_end],
+    }
+
+
+def is_binary_automaton_file(input_file_path: str) -> bool:
+    with open(input_file_path, "rb") as file:
+        return file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def _string_table(strings) -> bytes:
+    blob = "\n".join(strings).encode("utf8")
+    return struct.pack("<I", len(blob)) + blob
+
+
+def _check_section(view: memoryview, offset: int, length: int, name: str) -> int:
+    """
+    Checks that a section of a file in the binary format is inside the file
+    :return: the offset where the section ends
+    """
+    if offset < _BINARY_HEADER.size or offset + length > len(view):
+        raise AutomatonFormatError("The {} section at offset {} with {} bytes is outside the file of {} bytes"
+                                   .format(name, offset, length, len(view)))
+    return offset + length
+
+
+def _check_string_table(view: memoryview, offset: int, name: str):
+    _check_section(view, offset, 4, name)
+    length, = struct.unpack_from("<I", view, offset)
+    _check_section(view, offset + 4, length, name)
+
+
+def _read_string_table(view: memoryview, offset: int, count: int) -> list:
+    length, = struct.unpack_from("<I", view, offset)
+    try:
+        strings = str(view[offset + 4:offset + 4 + length], "utf8").split("\n") if count else []
+    except UnicodeDecodeError:
+        raise AutomatonFormatError("The strings in the table at offset {} are not valid UTF-8".format(offset))
+
+    if len(strings) != count:
+        raise AutomatonFormatError("Expected {} strings in the table at offset {} but found {}"
+                                   .format(count, offset, len(strings)))
+    return strings
+
+
+class _LazyStringTable:
+    """
+    A read-only list of strings that is decoded from a string table the first time one of them is used
+    """
+    def __init__(self, view: memoryview, offset: int, count: int):
+        self._view = view
+        self._offset = offset
+        self._count = count
+        self._strings = None
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return self._decoded()[index]
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def _decoded(self) -> list:
+        if self._strings is None:
+            self._strings = _read_string_table(self._view, self._offset, self._count)
+            self._view = None
+
+        return self._strings
+
+
+def _little_endian_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
 def serialize_graph_automaton(input_automaton: Automaton):
     if not IS_GRAPHVIZ_AVAILABLE:
         print("The graphviz library is not available, the automaton will not be drawn.")
@@ -151,3 +617,7 @@ def save_str_to_file(output_file_path: str, contents: str):
     with open(output_file_path, mode="w", encoding="utf8") as fl:
         print(contents, file=fl)
 
+
+def save_bytes_to_file(output_file_path: str, contents: bytes):
+    with open(output_file_path, mode="wb") as fl:
+        fl.write(contents)
@@ -0,0 +1,188 @@
+"""
+Canonical forms and fingerprints of regular languages.
+
+Two automata recognize the same language if and only if their minimal DFA are the same up to the names of the
+states. The canonical form fixes those names: dead states are dropped (so the alphabet and whether the DFA is complete
+don't matter), symbols that no transition uses are dropped and the states are numbered C0, C1, ... in breadth first
+order from the initial state, following the symbols in sorted order. The fingerprint is a hash of the canonical form,
+so equivalent automata get the same fingerprint no matter how they were written, and a LanguageRegistry can find an
+equivalent automaton with one hash lookup instead of calling automata_are_equivalent against each of them.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from array import array
+
+from automata.dense_dfa import DenseDFA, accepting_bitmap
+from automata.matcher import _find_dead_states
+from automata.state_machine import Automaton
+from utils.minimizer import minimize_automaton
+from utils.stats import count, measured
+
+REGISTRY_VERSION = 2
+# Part of what is hashed, changing how the canonical form is encoded must change it so old fingerprints don't match
+FINGERPRINT_VERSION = 1
+
+
+@measured("canonicalize")
+def canonical_dfa(automaton: Automaton) -> DenseDFA:
+    """
+    Builds the canonical form of the language of an automaton, see the module docstring
+    :param automaton: a NFA or a DFA, complete or partial
+    :return: a partial DenseDFA whose initial state is C0, it has no states at all but C0 if the language is empty
+    """
+    dfa = DenseDFA.from_automaton(minimize_automaton(automaton))
+    dead = _find_dead_states(dfa)
+    transitions, alphabet_size = dfa.transitions, dfa.alphabet_size
+    columns = sorted(range(alphabet_size), key=dfa.alphabet.__getitem__)
+
+    if dead[dfa.initial_state]:
+        count("states", 1)
+        return DenseDFA(["C0"], (), array("i"), accepting_bitmap([False]))
+
+    # The number of every state in the canonical form, in the order the breadth first search finds them
+    numbers = [-1] * dfa.state_count
+    numbers[dfa.initial_state] = 0
+    order = [dfa.initial_state]
+    used_columns = set()
+
+    for state in order:
+        row = state * alphabet_size
+        for column in columns:
+            target = transitions[row + column]
+            if target == -1 or dead[target]:
+                continue
+
+            used_columns.add(column)
+            if numbers[target] == -1:
+                numbers[target] = len(order)
+                order.append(target)
+
+    columns = [column for column in columns if column in used_columns]
+    canonical_transitions = array("i")
+    for state in order:
+        row = state * alphabet_size
+        for column in columns:
+            target = transitions[row + column]
+            canonical_transitions.append(-1 if target == -1 or dead[target] else numbers[target])
+
+    count("states", len(order))
+
+    return DenseDFA(["C{}".format(i) for i in range(len(order))], tuple(dfa.alphabet[column] for column in columns),
+                    canonical_transitions, accepting_bitmap([dfa.is_final(state) for state in order]))
+
+
+def fingerprint(automaton: Automaton) -> str:
+    """
+    Calculates a hash of the language of an automaton, equivalent automata get the same one
+    :param automaton: a NFA or a DFA, complete or partial
+    :return: the sha256 of the encoding of the canonical form, as a hex string
+    """
+    return dfa_fingerprint(canonical_dfa(automaton))
+
+
+def dfa_fingerprint(canonical: DenseDFA) -> str:
+    """
+    Calculates the fingerprint of a DenseDFA that is already in canonical form, see canonical_dfa. The hash is of an
+    encoding of its own rather than of a file format, so changing the binary format doesn't change the fingerprints
+    """
+    encoding = json.dumps([FINGERPRINT_VERSION, canonical.state_count, list(canonical.alphabet),
+                           list(canonical.transitions),
+                           [state for state in range(canonical.state_count) if canonical.is_final(state)]],
+                          separators=(",", ":"))
+    return hashlib.sha256(encoding.encode("utf-8")).hexdigest()
+
+
+class LanguageRegistry:
+    """
+    Maps the fingerprints of languages to the IDs of the automata that recognize them, so that finding whether an
+    equivalent automaton was already registered costs one minimization and one dict lookup.
+
+    The first automaton registered with a language is its representative. The registry can be saved as JSON and
+    loaded back.
+    """
+    def __init__(self):
+        self._ids = {}      # fingerprint -> list of automaton IDs, the representative first
+        self._fingerprints = {}     # automaton ID -> fingerprint
+
+    def __len__(self) -> int:
+        """
+        The number of different languages
+        """
+        return len(self._ids)
+
+    def __contains__(self, automaton_id: str) -> bool:
+        return automaton_id in self._fingerprints
+
+    def register(self, automaton_id: str, automaton: Automaton) -> str:
+        """
+        Adds an automaton to the registry, registering the same ID again does nothing
+        :param automaton_id: the ID of the automaton, e.g. its path or its cache_key
+        :param automaton: the automaton, NFA or DFA
+        :return: the ID of the representative of its language, automaton_id if it is new
+        """
+        return self.register_fingerprint(automaton_id, fingerprint(automaton))
+
+    def register_fingerprint(self, automaton_id: str, language_fingerprint: str) -> str:
+        """
+        Adds an automaton whose fingerprint is already known, see register
+        """
+        previous = self._fingerprints.get(automaton_id)
+        if previous is not None and previous != language_fingerprint:
+            raise ValueError("The automaton {} was already registered with another language".format(automaton_id))
+
+        ids = self._ids.setdefault(language_fingerprint, [])
+        if previous is None:
+            ids.append(automaton_id)
+            self._fingerprints[automaton_id] = language_fingerprint
+
+        return ids[0]
+
+    def find(self, automaton: Automaton):
+        """
+        Finds an automaton that recognizes the same language as the given one
+        :return: the ID of the representative of the language, or None if no equivalent automaton was registered
+        """
+        ids = self._ids.get(fingerprint(automaton))
+        return ids[0] if ids else None
+
+    def equivalent_ids(self, automaton_id: str) -> list:
+        """
+        The IDs of the registered automata that recognize the same language as a registered one, itself included
+        """
+        return list(self._ids[self._fingerprints[automaton_id]])
+
+    def fingerprint_of(self, automaton_id: str) -> str:
+        return self._fingerprints[automaton_id]
+
+    def save(self, path: str):
+        """
+        Saves the registry as JSON, the file is replaced at once so a reader never sees half of it
+        """
+        contents = json.dumps({"version": REGISTRY_VERSION, "languages": self._ids}, separators=(",", ":"))
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "w") as file:
+                file.write(contents)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "LanguageRegistry":
+        with open(path) as file:
+            contents = json.load(file)
+
+        if contents.get("version") != REGISTRY_VERSION:
+            raise ValueError("The registry in {} has version {} but only version {} can be read"
+                             .format(path, contents.get("version"), REGISTRY_VERSION))
+
+        registry = cls()
+        for language_fingerprint, ids in contents["languages"].items():
+            for automaton_id in ids:
+                registry.register_fingerprint(automaton_id, language_fingerprint)
+
+        return registry
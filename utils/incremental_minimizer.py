@@ -0,0 +1,432 @@
+from array import array
+
+from automata.dense_dfa import DenseDFA, accepting_bitmap
+from automata.state_machine import Automaton, State
+from utils.automata_utils import strongly_connected_components
+from utils.minimizer import _hopcroft_partition, refine_partition, _build_merged_states, _add_sink_state
+from utils.stats import phase, count
+
+
+class IncrementalMinimizer:
+    """
+    Keeps a DFA together with its partition into blocks of equivalent states, so that the minimal DFA can be updated
+    after every edit of a transition or of a final flag instead of being minimized again from scratch.
+
+    The DFA is kept complete by wiring the missing transitions to an implicit sink state. Along with the partition,
+    the inverse transitions are kept, and every block is registered by its signature: whether it is final and the
+    block that every symbol takes it to. Blocks are equivalence classes of a minimal DFA, so two different blocks
+    never have the same signature.
+
+    An edit of a state only changes the language of the states that can reach it, the affected states. They are
+    taken out of their blocks and put back one strongly connected component at a time, in reverse topological order,
+    so that the blocks of their targets are always known:
+    1. A component of a single state without a loop joins the block with its signature, or starts a new one.
+    2. The states of a component with a loop are either all equivalent to blocks that already exist or none of them
+       is, since they reach each other. A state of the component that goes out of it gives the candidate blocks
+       (those going with the same symbol into the same block), and each candidate is checked by following both at
+       once. If none matches, the component is split with Hopcroft's algorithm, with the blocks it goes out to as
+       fixed states, and every block found is a new one.
+
+    Every edit takes time proportional to the affected states and their transitions, except for a component with a
+    loop that doesn't go out of itself, for which every block with the same finality is a candidate.
+    """
+    def __init__(self, dfa: DenseDFA):
+        state_count = dfa.state_count
+        alphabet_size = dfa.alphabet_size
+
+        self.state_ids = list(dfa.state_ids)
+        self.alphabet = list(dfa.alphabet)
+        self.initial_state = dfa.initial_state
+        self._state_index = {state_id: i for i, state_id in enumerate(self.state_ids)}
+        self._symbol_index = dfa.symbol_indexes()
+
+        # The sink is one more state, it is not final and all of its transitions go to itself
+        self._sink = state_count
+        self._finals = [dfa.is_final(state) for state in range(state_count)] + [False]
+        self._transitions = [self._sink if target == -1 else target for target in dfa.transitions]
+        self._transitions.extend([self._sink] * alphabet_size)
+        self._build_inverse()
+
+        block_of = _hopcroft_partition(state_count + 1, alphabet_size, self._transitions, self._finals)
+        self._block_of = block_of
+        self._blocks = {}
+        for state, block in enumerate(block_of):
+            self._blocks.setdefault(block, set()).add(state)
+        self._next_block = len(self._blocks)
+        self._build_register()
+
+    @classmethod
+    def from_automaton(cls, automaton: Automaton) -> "IncrementalMinimizer":
+        """
+        Builds an IncrementalMinimizer for a DF Automaton, it may be partial
+        """
+        return cls(DenseDFA.from_automaton(automaton))
+
+    @property
+    def state_count(self) -> int:
+        """
+        The number of states of the minimal DFA, the same as len(self.to_automaton().states)
+        """
+        block_of = self._kept_blocks()
+        state_count = len(set(block_of) - {None})
+
+        # See to_automaton, the sink is added to a result of a single final state without transitions
+        if self.alphabet and not self._has_transitions(block_of) and not self._recognizes_nothing():
+            state_count += 1
+
+        return state_count
+
+    def set_transition(self, source_id: str, symbol: str, target_id: str) -> int:
+        """
+        Adds the transition source -symbol-> target, replacing the one that source had for symbol, if any.
+
+        A symbol that is not in the alphabet is added to it.
+        :return: the number of states whose language could change
+        """
+        if symbol == " ":
+            raise ValueError("Epsilon transitions can't be added to a DFA")
+
+        if symbol not in self._symbol_index:
+            self._add_symbol(symbol)
+
+        return self._set_target(self._state(source_id), self._symbol_index[symbol], self._state(target_id))
+
+    def remove_transition(self, source_id: str, symbol: str) -> int:
+        """
+        Removes the transition that source has for symbol, the symbol then takes it to the implicit reject state.
+        :return: the number of states whose language could change
+        """
+        symbol_index = self._symbol_index.get(symbol)
+        if symbol_index is None:
+            return 0
+
+        return self._set_target(self._state(source_id), symbol_index, self._sink)
+
+    def set_final(self, state_id: str, is_final: bool = True) -> int:
+        """
+        Marks a state as final or not final.
+        :return: the number of states whose language could change
+        """
+        state = self._state(state_id)
+        if self._finals[state] == is_final:
+            return 0
+
+        self._finals[state] = is_final
+        return self._update(state)
+
+    def equivalence_classes(self) -> list:
+        """
+        Lists the sets of IDs of equivalent states, the states equivalent to the implicit reject state are together
+        """
+        return [{self.state_ids[state] for state in members if state != self._sink}
+                for members in self._blocks.values() if members != {self._sink}]
+
+    def to_automaton(self) -> Automaton:
+        """
+        Builds the minimal DFA as a new Automaton, its states are named like the ones of minimize_automaton and, like
+        there, the unreachable states are left out and a partial DFA gets no state for the sink
+        """
+        states = [State(state_id, is_initial=(i == self.initial_state), is_final=self._finals[i])
+                  for i, state_id in enumerate(self.state_ids)]
+        transitions = [-1 if target == self._sink else target
+                       for target in self._transitions[:self._sink * len(self.alphabet)]]
+        block_of = self._kept_blocks()
+
+        merged_states = _build_merged_states(states, tuple(self.alphabet), transitions, block_of)
+        if not self._has_transitions(block_of):
+            # A single state without transitions can't be written in Byron TXT, see minimize_partial_dfa
+            limbo_state = merged_states[0] if self._recognizes_nothing() else None
+            _add_sink_state(merged_states, tuple(self.alphabet), limbo_state)
+
+        return Automaton(merged_states)
+
+    def to_dense_dfa(self) -> DenseDFA:
+        """
+        Gets the DFA with all of the edits, without minimizing it
+        """
+        transitions = array("i", [-1 if target == self._sink else target
+                                  for target in self._transitions[:self._sink * len(self.alphabet)]])
+
+        return DenseDFA(list(self.state_ids), tuple(self.alphabet), transitions,
+                        accepting_bitmap(self._finals[:self._sink]), self.initial_state)
+
+    def _kept_blocks(self) -> list:
+        """
+        The partition covers every state, but the minimal DFA leaves out the states that can't be reached from the
+        initial state and, if some transition goes to the implicit sink, the states equivalent to the sink
+        :return: the block of every state in the minimal DFA, None for the states left out
+        """
+        sink_block = self._block_of[self._sink]
+        is_partial = any(len(symbol_inverse.get(self._sink, ())) > 1 for symbol_inverse in self._inverse)
+        dropped_block = sink_block if is_partial and self._block_of[self.initial_state] != sink_block else None
+
+        return [block if is_reachable and block != dropped_block else None
+                for block, is_reachable in zip(self._block_of, self._reachable_states())]
+
+    def _recognizes_nothing(self) -> bool:
+        return self._block_of[self.initial_state] == self._block_of[self._sink]
+
+    def _has_transitions(self, block_of: list) -> bool:
+        for state in range(self._sink):
+            if block_of[state] is not None and any(target != self._sink and block_of[target] is not None
+                                                   for target in self._row(state)):
+                return True
+
+        return False
+
+    def _reachable_states(self) -> list:
+        """
+        Finds the states that can be reached from the initial state, the sink is never one of them
+        :return: a list with whether each state is reachable
+        """
+        alphabet_size = len(self.alphabet)
+        transitions = self._transitions
+        reachable = [False] * self._sink
+        reachable[self.initial_state] = True
+        pending = [self.initial_state]
+
+        while pending:
+            row = pending.pop() * alphabet_size
+            for target in transitions[row:row + alphabet_size]:
+                if target != self._sink and not reachable[target]:
+                    reachable[target] = True
+                    pending.append(target)
+
+        return reachable
+
+    def _state(self, state_id: str) -> int:
+        state = self._state_index.get(state_id.upper())
+        if state is None:
+            raise ValueError("The automaton has no state {}".format(state_id))
+
+        return state
+
+    def _build_inverse(self):
+        alphabet_size = len(self.alphabet)
+        self._inverse = [{} for _ in range(alphabet_size)]
+
+        for cell, target in enumerate(self._transitions):
+            self._inverse[cell % alphabet_size].setdefault(target, set()).add(cell // alphabet_size)
+
+    def _build_register(self):
+        self._signature_of = {}
+        self._register = {}
+
+        for block, members in self._blocks.items():
+            self._register_block(block, next(iter(members)))
+
+    def _register_block(self, block: int, representative: int):
+        signature = self._signature(representative)
+        self._signature_of[block] = signature
+        self._register[signature] = block
+
+    def _signature(self, state: int) -> tuple:
+        alphabet_size = len(self.alphabet)
+        block_of = self._block_of
+        row = state * alphabet_size
+
+        return (self._finals[state],) + tuple(block_of[target]
+                                              for target in self._transitions[row:row + alphabet_size])
+
+    def _add_symbol(self, symbol: str):
+        # Every state, the sink included, goes to the sink with the new symbol, which changes no language
+        alphabet_size = len(self.alphabet)
+        self._symbol_index[symbol] = alphabet_size
+        self.alphabet.append(symbol)
+
+        transitions = []
+        for state in range(self._sink + 1):
+            transitions.extend(self._transitions[state * alphabet_size:(state + 1) * alphabet_size])
+            transitions.append(self._sink)
+
+        self._transitions = transitions
+        self._inverse.append({self._sink: set(range(self._sink + 1))})
+        self._build_register()
+
+    def _set_target(self, source: int, symbol: int, target: int) -> int:
+        cell = source * len(self.alphabet) + symbol
+        previous_target = self._transitions[cell]
+        if previous_target == target:
+            return 0
+
+        sources = self._inverse[symbol][previous_target]
+        sources.discard(source)
+        if not sources:
+            del self._inverse[symbol][previous_target]
+        self._inverse[symbol].setdefault(target, set()).add(source)
+        self._transitions[cell] = target
+
+        return self._update(source)
+
+    def _update(self, edited_state: int) -> int:
+        with phase("incremental_update"):
+            affected = self._reaching_states(edited_state)
+            count("affected_states", len(affected))
+
+            # Take the affected states out of their blocks, blocks left empty are forgotten
+            for state in affected:
+                block = self._block_of[state]
+                members = self._blocks[block]
+                members.discard(state)
+                if not members:
+                    del self._blocks[block]
+                    del self._register[self._signature_of.pop(block)]
+
+            local_index = {state: i for i, state in enumerate(affected)}
+            alphabet_size = len(self.alphabet)
+            successors = []
+            for state in affected:
+                row = self._transitions[state * alphabet_size:(state + 1) * alphabet_size]
+                successors.append([local_index[target] for target in row if target in local_index])
+
+            pending = set(affected)
+            components, _ = strongly_connected_components(successors)
+            for component in components:
+                members = [affected[i] for i in component]
+
+                if len(members) == 1 and members[0] not in self._row(members[0]):
+                    self._place_state(members[0])
+                else:
+                    self._place_component(members, pending)
+
+                pending.difference_update(members)
+
+            return len(affected)
+
+    def _row(self, state: int) -> list:
+        alphabet_size = len(self.alphabet)
+        return self._transitions[state * alphabet_size:(state + 1) * alphabet_size]
+
+    def _reaching_states(self, state: int) -> list:
+        # The states that can reach state, itself included, through the inverse transitions
+        reaching = [state]
+        seen = {state}
+
+        for current in reaching:
+            for symbol_inverse in self._inverse:
+                for source in symbol_inverse.get(current, ()):
+                    if source not in seen:
+                        seen.add(source)
+                        reaching.append(source)
+
+        return reaching
+
+    def _add_to_block(self, state: int, block: int):
+        self._block_of[state] = block
+        self._blocks.setdefault(block, set()).add(state)
+
+    def _new_block(self) -> int:
+        block = self._next_block
+        self._next_block += 1
+        return block
+
+    def _place_state(self, state: int):
+        # All the targets of the state already have their block, so its signature tells its block
+        block = self._register.get(self._signature(state))
+
+        if block is None:
+            block = self._new_block()
+            self._add_to_block(state, block)
+            self._register_block(block, state)
+        else:
+            self._add_to_block(state, block)
+
+    def _place_component(self, members: list, pending: set):
+        component = set(members)
+        alphabet_size = len(self.alphabet)
+
+        # Find the exit (a transition that leaves the component) into the smallest block
+        exit_state, exit_symbol, exit_block = None, None, None
+        for state in members:
+            for symbol, target in enumerate(self._row(state)):
+                if target not in component:
+                    block = self._block_of[target]
+                    if exit_block is None or len(self._blocks[block]) < len(self._blocks[exit_block]):
+                        exit_state, exit_symbol, exit_block = state, symbol, block
+
+        if exit_state is None:
+            count("closed_components")
+            exit_state = members[0]
+            candidates = list(self._blocks)
+        else:
+            # The blocks that go into the exit block with the exit symbol
+            candidates = set()
+            symbol_inverse = self._inverse[exit_symbol]
+            for target in self._blocks[exit_block]:
+                for source in symbol_inverse.get(target, ()):
+                    if source not in pending:
+                        candidates.add(self._block_of[source])
+
+        is_final = self._finals[exit_state]
+        for candidate in candidates:
+            representative = next(iter(self._blocks[candidate]))
+            if self._finals[representative] != is_final:
+                continue
+
+            count("candidate_checks")
+            mapping = self._match(component, exit_state, candidate)
+            if mapping is not None:
+                for state, block in mapping.items():
+                    self._add_to_block(state, block)
+                return
+
+        # No state of the component is equivalent to an existing block, split it with the blocks it goes out to
+        #  as fixed states that are never put together
+        local_index = {state: i for i, state in enumerate(members)}
+        exit_index = {}
+        transitions = []
+        for state in members:
+            for target in self._row(state):
+                if target in local_index:
+                    transitions.append(local_index[target])
+                else:
+                    block = self._block_of[target]
+                    transitions.append(exit_index.setdefault(block, len(members) + len(exit_index)))
+
+        for node in range(len(members), len(members) + len(exit_index)):
+            transitions.extend([node] * alphabet_size)
+
+        initial_blocks = [self._finals[state] for state in members] + [("exit", block) for block in exit_index]
+        local_blocks = refine_partition(len(initial_blocks), alphabet_size, transitions, initial_blocks)
+
+        new_blocks = {}
+        for state, local_block in zip(members, local_blocks):
+            if local_block not in new_blocks:
+                new_blocks[local_block] = (self._new_block(), state)
+            self._add_to_block(state, new_blocks[local_block][0])
+
+        for block, representative in new_blocks.values():
+            self._register_block(block, representative)
+
+    def _match(self, component: set, state: int, block: int):
+        """
+        Follows a state of the component and a block at the same time, like the equivalence check of Hopcroft and
+        Karp. Every state of the component that is reached is paired with a block, and states out of the component
+        must be in the same block they are paired with.
+        :return: a dict with the block of every state of the component, or None if the state is not equivalent to
+                 the block
+        """
+        mapping = {state: block}
+        to_follow = [state]
+
+        while to_follow:
+            current = to_follow.pop()
+            representative = next(iter(self._blocks[mapping[current]]))
+            if self._finals[current] != self._finals[representative]:
+                return None
+
+            for target, block_target in zip(self._row(current), self._row(representative)):
+                expected_block = self._block_of[block_target]
+
+                if target in component:
+                    paired_block = mapping.get(target)
+                    if paired_block is None:
+                        mapping[target] = expected_block
+                        to_follow.append(target)
+                    elif paired_block != expected_block:
+                        return None
+
+                elif self._block_of[target] != expected_block:
+                    return None
+
+        return mapping
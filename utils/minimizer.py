@@ -1,33 +1,734 @@
+from array import array
+from collections import deque
+
+from automata.dense_dfa import DenseDFA, accepting_bitmap, symbol_classes
 from automata.state_machine import Automaton, State
-from utils.automata_utils import states_are_compatible, is_dfa, nfa_2_dfa
+from automata.matcher import is_deterministic
+from utils.automata_utils import states_are_compatible, is_dfa, nfa_2_dfa, reverse_automaton, trim_automaton, \
+    _mask_members
+from utils.stats import phase, count, measured
+
+MINIMIZATION_ALGORITHMS = ("auto", "hopcroft", "brzozowski", "valmari")
 
+# With the "auto" algorithm, how many DFA states per NFA state the subset construction can build before the
+#  minimization switches to Brzozowski's algorithm
+SUBSET_BUDGET_FACTOR = 4
+MIN_SUBSET_BUDGET = 1024
 
-def minimize_automaton(input_automaton: Automaton) -> Automaton:
+
+@measured("minimize")
+def minimize_automaton(input_automaton: Automaton, algorithm: str = "auto", add_sink: bool = False) -> Automaton:
     """
     Minimizes an input Automaton and returns it as a new Automaton.
 
-    This method supports DFA only, NFA need to be transformed first.
+    The equivalent states are found with Hopcroft's partition refinement algorithm, which runs in O(k·n log n) for
+    n states and k symbols. Partial DFA are minimized without completing them, with the algorithm of Valmari and
+    Lehtinen (see minimize_partial_dfa). NFA are transformed to DFA first, unless their DFA turns out to be too big,
+    then Brzozowski's algorithm is used instead (see choose_minimization_algorithm). The algorithm used is counted in
+    the stats as algorithm_hopcroft, algorithm_valmari or algorithm_brzozowski.
+
+    The states that can't be reached from the initial state are left out of the result. The dead states (the ones
+    that can't reach a final state) of a NFA are trimmed before the subset construction, where they would make
+    subsets that only differ in dead states look different (see trim_automaton); in a DFA they all end up merged
+    into a single sink.
+    :param input_automaton: an Automaton to minimize
+    :param algorithm: one of the MINIMIZATION_ALGORITHMS: auto, hopcroft, brzozowski or valmari
+    :param add_sink: with the valmari algorithm, wire the missing transitions of the result to an explicit sink so
+                     it is a complete DFA
+    :return: a new minimized Automaton
+    """
+    if algorithm not in MINIMIZATION_ALGORITHMS:
+        raise ValueError("Unknown minimization algorithm '{}', it must be one of {}"
+                         .format(algorithm, ", ".join(MINIMIZATION_ALGORITHMS)))
+
+    deterministic = is_deterministic(input_automaton)
+    if not deterministic:
+        input_automaton = trim_automaton(input_automaton)
+
+    dfa_automaton = None
+    if algorithm == "auto":
+        algorithm, dfa_automaton = _choose_algorithm(input_automaton, deterministic)
+    count("algorithm_" + algorithm)
+
+    if algorithm == "brzozowski":
+        return minimize_automaton_by_brzozowski(input_automaton)
+    if algorithm == "valmari":
+        return minimize_partial_dfa(input_automaton, add_sink)
+
+    if dfa_automaton is not None:
+        input_automaton = dfa_automaton
+    elif not is_dfa(input_automaton):
+        input_automaton = nfa_2_dfa(input_automaton)
+
+    with phase("pack"):
+        dfa = DenseDFA.from_automaton(input_automaton)
+
+    states = input_automaton.states
+    with phase("trim"):
+        reachable = _reachable_states(dfa)
+        count("unreachable_states", dfa.state_count - len(reachable))
+        if len(reachable) < dfa.state_count:
+            dfa = _restrict_dense_dfa(dfa, reachable)
+            states = [states[i] for i in reachable]
+
+    with phase("refinement"):
+        # The symbols of a class split the blocks the same way, so the partition is refined with one of each
+        _, representatives = dfa.symbol_classes()
+        count("symbol_classes", len(representatives))
+        class_dfa = dfa.restrict_symbols(representatives)
+
+        finals = [dfa.is_final(state) for state in range(dfa.state_count)]
+        block_of = _hopcroft_partition(class_dfa.state_count, class_dfa.alphabet_size, class_dfa.transitions, finals)
+
+    with phase("merge"):
+        merged_states = _build_merged_states(states, dfa.alphabet, dfa.transitions, block_of)
+        count("states_merged", len(states) - len(merged_states))
+
+        return Automaton(merged_states)
+
+
+def _reachable_states(dfa: DenseDFA) -> list:
+    """
+    Finds the states of a DenseDFA that can be reached from its initial state
+    :return: their numbers, in increasing order
+    """
+    alphabet_size = dfa.alphabet_size
+    transitions = dfa.transitions
+
+    reachable = bytearray(dfa.state_count)
+    reachable[dfa.initial_state] = 1
+    pending = [dfa.initial_state]
+    while pending:
+        offset = pending.pop() * alphabet_size
+        for target in transitions[offset:offset + alphabet_size]:
+            if target != -1 and not reachable[target]:
+                reachable[target] = 1
+                pending.append(target)
+
+    return [state for state in range(dfa.state_count) if reachable[state]]
+
+
+def _restrict_dense_dfa(dfa: DenseDFA, kept_states: list) -> DenseDFA:
+    """
+    Builds the DenseDFA of some of the states of a DFA, renumbered in the same order. Transitions into states that
+    are not kept become -1
+    """
+    numbers = [-1] * dfa.state_count
+    for number, state in enumerate(kept_states):
+        numbers[state] = number
+
+    alphabet_size = dfa.alphabet_size
+    transitions = dfa.transitions
+    restricted = array("i")
+    for state in kept_states:
+        offset = state * alphabet_size
+        restricted.extend(-1 if target == -1 else numbers[target]
+                          for target in transitions[offset:offset + alphabet_size])
+
+    return DenseDFA([dfa.state_ids[state] for state in kept_states], dfa.alphabet, restricted,
+                    accepting_bitmap([dfa.is_final(state) for state in kept_states]), numbers[dfa.initial_state])
+
+
+def choose_minimization_algorithm(input_automaton: Automaton, subset_budget: int = None) -> (str, Automaton):
+    """
+    Picks the algorithm that minimizes an automaton faster.
+
+    Hopcroft's algorithm needs the DFA of the automaton, which for some NFA is exponentially bigger than the minimal
+    DFA (e.g. "the n-th symbol from the end is a 1"). Brzozowski's algorithm only builds the DFA of the reversed
+    automaton and the minimal DFA, but it pays for two subset constructions, so it is only worth it when the DFA
+    blows up. Complete DFA always get Hopcroft, the DFA of their reverse is often exponentially big, and partial DFA
+    get Valmari and Lehtinen's algorithm, which doesn't need to complete them.
+
+    For a NFA the subset construction is run with a budget of SUBSET_BUDGET_FACTOR states per NFA state (at least
+    MIN_SUBSET_BUDGET): if the DFA fits, Hopcroft minimizes it, otherwise Brzozowski is used. How nondeterministic
+    the NFA is (the states and symbols with more than one target or with epsilon transitions) is counted as
+    branching_transitions, but it is not a reliable predictor on its own: a single branching transition is enough to
+    make the DFA blow up.
+    :param input_automaton: the Automaton to minimize
+    :param subset_budget: the number of DFA states after which Brzozowski is preferred, instead of the default
+    :return: a tuple with "hopcroft", "brzozowski" or "valmari" and, for "hopcroft", the DFA to minimize if it is
+             already known (the input itself or the DFA built for the decision), None otherwise
+    """
+    return _choose_algorithm(input_automaton, is_deterministic(input_automaton), subset_budget)
+
+
+def _choose_algorithm(input_automaton: Automaton, deterministic: bool, subset_budget: int = None) -> (str, Automaton):
+    if deterministic:
+        if is_dfa(input_automaton):
+            return "hopcroft", input_automaton
+        return "valmari", None
+
+    count("branching_transitions", sum(1 for state in input_automaton.states
+                                       for symbol, targets in state.transitions.items()
+                                       if len(targets) > 1 or (targets and symbol == ' ')))
+
+    if subset_budget is None:
+        subset_budget = max(MIN_SUBSET_BUDGET, SUBSET_BUDGET_FACTOR * len(input_automaton.states))
+
+    dfa_automaton = nfa_2_dfa(input_automaton, max_states=subset_budget)
+    if dfa_automaton is None:
+        return "brzozowski", None
+
+    return "hopcroft", dfa_automaton
+
+
+@measured("minimize_by_brzozowski")
+def minimize_automaton_by_brzozowski(input_automaton: Automaton) -> Automaton:
+    """
+    Minimizes an input Automaton with Brzozowski's algorithm: reverse, determinize, reverse and determinize again.
+
+    Determinizing the reverse of a DFA whose states are all reachable gives the minimal DFA of the reversed
+    language, so the second pass gives the minimal DFA of the automaton. The DFA of the input is never built, which
+    pays off for NFA that blow up in the subset construction. The states are named D0, D1, ... as in nfa_2_dfa.
+    :param input_automaton: a DF or NF Automaton to minimize
+    :return: a new minimized Automaton
+    """
+    with phase("reverse"):
+        reversed_nfa = reverse_automaton(input_automaton)
+    reversed_dfa = nfa_2_dfa(reversed_nfa)
+
+    with phase("pack"):
+        dfa = DenseDFA.from_automaton(reversed_dfa)
+
+    minimized_automaton = _determinize_reverse(dfa)
+
+    count("states_merged", len(input_automaton.states) - len(minimized_automaton.states))
+    return minimized_automaton
+
+
+@measured("determinize_reverse")
+def _determinize_reverse(dfa: DenseDFA) -> Automaton:
+    """
+    Runs the subset construction on the reverse of a DFA, without building it: the initial subset is the set of
+    final states of the DFA, a subset goes with a symbol to the states that go into any of its states with the symbol
+    and a subset is final if it has the initial state of the DFA.
+
+    This is not the same as nfa_2_dfa(reverse_automaton(...)), whose initial subset would be the extra initial state
+    of the reversed automaton alone. That subset recognizes the same strings as the subset of the final states,
+    which could be reached later on, and then the result would not be minimal.
+    :param dfa: a DenseDFA whose states are all reachable
+    :return: the minimal DF Automaton of the reversed language
+    """
+    alphabet = dfa.alphabet
+    alphabet_size = dfa.alphabet_size
+
+    # sources[symbol][state] is the mask of the states that go into state with symbol
+    sources = [[0] * dfa.state_count for _ in alphabet]
+    for i, target in enumerate(dfa.transitions):
+        if target != -1:
+            sources[i % alphabet_size][target] |= 1 << (i // alphabet_size)
+
+    initial_bit = 1 << dfa.initial_state
+    initial_mask = 0
+    for state in range(dfa.state_count):
+        if dfa.is_final(state):
+            initial_mask |= 1 << state
+
+    subsets = [initial_mask]
+    existing_state = {initial_mask: State("D0", is_initial=True, is_final=bool(initial_mask & initial_bit))}
+    states_list = [existing_state[initial_mask]]
+    limbo_state = None if initial_mask else states_list[0]     # Without final states the language is empty
+
+    # The subsets list doubles as the queue of DFA states whose transitions are pending
+    for mask in subsets:
+        current_state = existing_state[mask]
+        members = _mask_members(mask)
+
+        for symbol, symbol_sources in zip(alphabet, sources):
+            target_mask = 0
+            for member in members:
+                target_mask |= symbol_sources[member]
+
+            if not target_mask:
+                if limbo_state is None:
+                    limbo_state = State("LIMBO")
+                    for limbo_symbol in alphabet:
+                        limbo_state.transitions[limbo_symbol] = [limbo_state]
+                current_state.transitions[symbol] = [limbo_state]
+                continue
+
+            target_state = existing_state.get(target_mask)
+            if target_state is None:
+                target_state = State("D{}".format(len(subsets)), is_final=bool(target_mask & initial_bit))
+                existing_state[target_mask] = target_state
+                subsets.append(target_mask)
+                states_list.append(target_state)
+
+            current_state.transitions[symbol] = [target_state]
+
+    if limbo_state is not None and limbo_state is not states_list[0]:
+        states_list.append(limbo_state)
+
+    count("dfa_subsets", len(subsets))
+    count("dfa_states", len(states_list))
+
+    # The states are valid by construction, with the initial state first
+    return Automaton.from_trusted_states(states_list, states_list[0], alphabet)
+
+
+@measured("minimize_partial")
+def minimize_partial_dfa(input_automaton: Automaton, add_sink: bool = False) -> Automaton:
+    """
+    Minimizes a partial DFA, where a missing transition means the string is rejected, with the algorithm of Valmari
+    and Lehtinen.
+
+    Hopcroft's algorithm needs a complete DFA, so every missing transition has to be wired to a sink state and then
+    processed like any other. Here only the transitions that exist are looked at: the states that can't be reached
+    from the initial state, or that can't reach a final state, are dropped (the latter behave like the sink), and the
+    partition is refined with "cords", the transitions with the same symbol into the same block. This runs in
+    O(m log n) for m transitions and n states, however big the alphabet is.
+    :param input_automaton: a DF Automaton, complete or partial
+    :param add_sink: wire the missing transitions of the result to an explicit LIMBO state, so it is a complete DFA
+    :return: a new minimized Automaton, partial unless add_sink is True or the result would have no transitions
+    """
+    states = input_automaton.states
+    alphabet = tuple(symbol for symbol in input_automaton.alphabet if symbol != ' ')
+
+    with phase("pack"):
+        state_index = {state: i for i, state in enumerate(states)}
+        tails, labels, heads = [], [], []
+        for i, state in enumerate(states):
+            for symbol, targets in state.transitions.items():
+                if not targets:
+                    continue
+                if len(targets) > 1 or symbol == ' ':
+                    raise ValueError("State {} is not deterministic for symbol '{}', convert the NFA to a DFA first"
+                                     .format(state.state_id, symbol))
+
+                tails.append(i)
+                labels.append(symbol)
+                heads.append(state_index[targets[0]])
+
+    with phase("trim"):
+        useful = _useful_states(len(states), state_index[input_automaton.initial_state], tails, heads,
+                                [state.is_final for state in states])
+
+    with phase("refinement"):
+        block_of = _partial_dfa_partition(states, useful, tails, labels, heads)
+
+    with phase("merge"):
+        recognizes_nothing = block_of[state_index[input_automaton.initial_state]] is None
+        if recognizes_nothing:
+            # Only the initial state is left, and it is the sink itself
+            block_of[state_index[input_automaton.initial_state]] = 0
+
+        merged_states, representatives = _merge_blocks(states, block_of)
+        for tail, label, head in zip(tails, labels, heads):
+            block = block_of[tail]
+            if block is not None and representatives[block] == tail and block_of[head] is not None:
+                merged_states[block].transitions[label] = [merged_states[block_of[head]]]
+
+        merged_states = list(merged_states.values())
+        count("states_merged", len(states) - len(merged_states))
+
+        # A single state without transitions (the language is empty or only has the empty string) can't be written
+        #  in Byron TXT, so it gets the sink too
+        if add_sink or not any(merged_state.transitions for merged_state in merged_states):
+            _add_sink_state(merged_states, alphabet, merged_states[0] if recognizes_nothing else None)
+
+        return Automaton(merged_states)
+
+
+def _useful_states(state_count: int, initial_state: int, tails: list, heads: list, finals: list) -> list:
+    """
+    Finds the states that can be reached from the initial state and from which a final state can be reached
+    :return: a list with a flag per state
+    """
+    successors = [[] for _ in range(state_count)]
+    predecessors = [[] for _ in range(state_count)]
+    for tail, head in zip(tails, heads):
+        successors[tail].append(head)
+        predecessors[head].append(tail)
+
+    reachable = [False] * state_count
+    reachable[initial_state] = True
+    pending = [initial_state]
+    while pending:
+        for head in successors[pending.pop()]:
+            if not reachable[head]:
+                reachable[head] = True
+                pending.append(head)
+
+    useful = [False] * state_count
+    pending = [state for state in range(state_count) if finals[state] and reachable[state]]
+    for state in pending:
+        useful[state] = True
+    while pending:
+        for tail in predecessors[pending.pop()]:
+            if reachable[tail] and not useful[tail]:
+                useful[tail] = True
+                pending.append(tail)
+
+    count("unreachable_states", state_count - sum(reachable))
+    count("dead_states", sum(reachable) - sum(useful))
+    return useful
+
+
+def _partial_dfa_partition(states: list, useful: list, tails: list, labels: list, heads: list) -> list:
+    """
+    Splits the useful states of a partial DFA in blocks of equivalent states, with the algorithm of Valmari and
+    Lehtinen.
+
+    Two partitions are refined together: the blocks of states and the cords of transitions. At first there are two
+    blocks, final and non final states, and a cord per symbol. Every cord splits the blocks into the states that have
+    a transition in the cord and the ones that don't, and every new block splits the cords into the transitions that
+    go into the block and the ones that don't. As in Hopcroft's algorithm only the smaller half of a split is a new
+    set, which bounds the work to O(m log n).
+    :return: a list with the block number of every state, None for the states that are not useful
+    """
+    numbers = [None] * len(states)     # The useful states are numbered from 0
+    useful_states = []
+    for i, is_useful in enumerate(useful):
+        if is_useful:
+            numbers[i] = len(useful_states)
+            useful_states.append(i)
+
+    # Only the transitions between useful states are kept, grouped by symbol for the first cords
+    transitions_by_label = {}
+    for tail, label, head in zip(tails, labels, heads):
+        if useful[tail] and useful[head]:
+            transitions_by_label.setdefault(label, []).append((numbers[tail], numbers[head]))
+
+    # Symbols with the same transitions would make cords that are split the same way, one of each class is enough
+    first_cords = list(transitions_by_label.values())
+    _, representatives = symbol_classes(map(tuple, first_cords))
+    count("symbol_classes", len(representatives))
+
+    transition_tails = []
+    incoming = [[] for _ in useful_states]
+    cord_sizes = []
+    for label_transitions in [first_cords[label] for label in representatives]:
+        cord_sizes.append(len(label_transitions))
+        for tail, head in label_transitions:
+            incoming[head].append(len(transition_tails))
+            transition_tails.append(tail)
+
+    blocks = _RefinablePartition([len(useful_states)])
+    for number, i in enumerate(useful_states):
+        if states[i].is_final:
+            blocks.mark(number)
+    blocks.split()
+
+    cords = _RefinablePartition(cord_sizes)
+
+    block, cord = 1, 0
+    while cord < cords.set_count:
+        for transition in cords.members(cord):
+            blocks.mark(transition_tails[transition])
+        blocks.split()
+        cord += 1
+
+        while block < blocks.set_count:
+            for state in blocks.members(block):
+                for transition in incoming[state]:
+                    cords.mark(transition)
+            cords.split()
+            block += 1
+
+    count("blocks", blocks.set_count)
+    count("cords", cords.set_count)
+
+    return [None if number is None else blocks.set_of[number] for number in numbers]
+
+
+class _RefinablePartition:
+    """
+    A partition of the numbers 0..n-1 where marking an element and splitting the marked elements off their sets
+    costs time proportional to the elements marked.
+
+    The elements of a set are kept together in the elements list, between first[set] and past[set], with the marked
+    ones at the beginning. When a set is split, the smaller part (marked or unmarked) becomes a new set at the end,
+    so a set keeps its number and the sets that are still to be processed can be walked by number.
+    """
+    __slots__ = ("elements", "location", "set_of", "first", "past", "marked", "touched")
+
+    def __init__(self, set_sizes: list):
+        """
+        :param set_sizes: the sizes of the initial sets, set 0 gets the first elements and so on. Empty sets are
+                          left out
+        """
+        self.elements = list(range(sum(set_sizes)))
+        self.location = list(range(len(self.elements)))
+        self.set_of = []
+        self.first = []
+        self.past = []
+
+        for size in set_sizes:
+            if size:
+                self.set_of.extend([len(self.first)] * size)
+                self.first.append(len(self.set_of) - size)
+                self.past.append(len(self.set_of))
+
+        self.marked = [0] * len(self.first)
+        self.touched = []
+
+    @property
+    def set_count(self) -> int:
+        return len(self.first)
+
+    def members(self, set_number: int) -> list:
+        return self.elements[self.first[set_number]:self.past[set_number]]
+
+    def mark(self, element: int):
+        """
+        Marks an element, it must not be marked already
+        """
+        elements, location = self.elements, self.location
+        set_number = self.set_of[element]
+        i = location[element]
+        j = self.first[set_number] + self.marked[set_number]
+
+        # Swap the element with the first unmarked element of its set
+        elements[i] = elements[j]
+        location[elements[i]] = i
+        elements[j] = element
+        location[element] = j
+
+        if not self.marked[set_number]:
+            self.touched.append(set_number)
+        self.marked[set_number] += 1
+
+    def split(self):
+        """
+        Splits the marked elements off every set that has only some of its elements marked, and unmarks them
+        """
+        first, past, marked = self.first, self.past, self.marked
+
+        while self.touched:
+            set_number = self.touched.pop()
+            boundary = first[set_number] + marked[set_number]
+            marked[set_number] = 0
+            if boundary == past[set_number]:
+                continue    # The whole set was marked
+
+            new_set = len(first)
+            if boundary - first[set_number] <= past[set_number] - boundary:
+                first.append(first[set_number])
+                past.append(boundary)
+                first[set_number] = boundary
+            else:
+                first.append(boundary)
+                past.append(past[set_number])
+                past[set_number] = boundary
+            marked.append(0)
+
+            for i in range(first[new_set], past[new_set]):
+                self.set_of[self.elements[i]] = new_set
+
+
+def _add_sink_state(states: list, alphabet: tuple, limbo_state: State = None):
+    """
+    Wires every missing transition of a partial DFA to a sink state: limbo_state if it is one of the states, or a
+    LIMBO state that is added if some transition is missing
+    """
+    if limbo_state is None:
+        if all(len(state.transitions) == len(alphabet) for state in states):
+            return
+
+        used_ids = {state.state_id for state in states}
+        limbo_state = State("LIMBO")
+        while limbo_state.state_id in used_ids:
+            limbo_state.state_id += "'"
+        states.append(limbo_state)
+
+    for state in states:
+        for symbol in alphabet:
+            if symbol not in state.transitions:
+                state.transitions[symbol] = [limbo_state]
+
+
+@measured("minimize_by_table_filling")
+def minimize_automaton_by_table_filling(input_automaton: Automaton) -> Automaton:
+    """
+    Minimizes an input Automaton by filling a table with all of the pairs of states and crossing out the
+    incompatible ones until nothing changes.
+
+    This is the original O(n²·k) algorithm, it is kept as a reference to check the results of minimize_automaton.
+    The unreachable and dead states are trimmed first, so they don't make the table bigger. A complete DFA keeps one
+    dead state as its sink.
     :param input_automaton: an Automaton to minimize
     :return: a new minimized Automaton
     """
+    input_automaton = trim_automaton(input_automaton, keep_sink=is_dfa(input_automaton))
     if not is_dfa(input_automaton):
         input_automaton = nfa_2_dfa(input_automaton)
 
     # Build a table with all the states, we'll use a map for that, here we'll keep track of inconsistent states
-    state_map = _build_state_map(input_automaton)
+    with phase("pair_table"):
+        state_map = _build_state_map(input_automaton)
+        count("pair_records", len(state_map))
 
     # With the state map formed, we need to loop over the map until we have crossed out all transitions with
     # non-equivalent states
-    state_map = _cross_out_redundant_states(state_map)
+    with phase("refinement"):
+        state_map = _cross_out_redundant_states(state_map)
 
     # Merged the states to prepare for the new automaton
-    merged_states = _merge_non_redundant_states(state_map, input_automaton.states)
-    new_initial_state = [state for state in merged_states if state.is_initial][0]
+    with phase("merge"):
+        merged_states = _merge_non_redundant_states(state_map, input_automaton.states)
+        count("states_merged", len(input_automaton.states) - len(merged_states))
 
     # With the crossed-out redundant states out, we can build our automaton
     return Automaton(merged_states)
 
 
+def _hopcroft_partition(state_count: int, alphabet_size: int, transitions: list, finals: list) -> list:
+    """
+    Splits the states of a DFA in blocks of equivalent states by using Hopcroft's algorithm.
+
+    We start with two blocks, the final and the non-final states, and we keep a worklist of (block, symbol) splitters.
+    For every splitter we look up, through the inverse transitions, the states that go into the block with the
+    symbol, and every block that has only some of those states gets split in two. Only the smaller half of a split
+    needs to be queued again, which is what gives the n log n bound.
+
+    Missing transitions (-1) go to an implicit reject state that is added at the end of the partition.
+    :param state_count: the number of states
+    :param alphabet_size: the number of symbols
+    :param transitions: a flat list (or array) of size state_count * alphabet_size with the index of the target states
+    :param finals: a list of flags telling whether each state is final
+    :return: a list with the block number of every state
+    """
+    # Wire the missing transitions to an extra sink state so that every state has a transition for every symbol
+    if -1 in transitions:
+        sink = state_count
+        transitions = [sink if target == -1 else target for target in transitions] + [sink] * alphabet_size
+        finals = list(finals) + [False]
+        state_count += 1
+
+    return refine_partition(state_count, alphabet_size, transitions, [0 if is_final else 1 for is_final in finals])
+
+
+def refine_partition(state_count: int, alphabet_size: int, transitions: list, initial_blocks: list) -> list:
+    """
+    Splits the blocks of an initial partition of the states of a complete DFA until the states of every block are
+    equivalent, with Hopcroft's algorithm (see _hopcroft_partition). States in different initial blocks are never
+    put together, which lets the caller keep some states apart.
+    :param state_count: the number of states
+    :param alphabet_size: the number of symbols
+    :param transitions: a flat list of size state_count * alphabet_size with the index of the target states, no -1
+    :param initial_blocks: the number of the initial block of every state, any numbers can be used
+    :return: a list with the block number of every state, numbered from 0
+    """
+    # inverse[symbol][target] holds the states that go into target with symbol
+    inverse = [{} for _ in range(alphabet_size)]
+    for source in range(state_count):
+        offset = source * alphabet_size
+        for symbol in range(alphabet_size):
+            inverse[symbol].setdefault(transitions[offset + symbol], []).append(source)
+
+    blocks = []
+    block_of = [0] * state_count
+    block_numbers = {}
+    for state in range(state_count):
+        block = block_numbers.setdefault(initial_blocks[state], len(blocks))
+        if block == len(blocks):
+            blocks.append(set())
+        blocks[block].add(state)
+        block_of[state] = block
+
+    # Every block but the largest one is a splitter to begin with
+    worklist = deque()
+    in_worklist = set()
+    largest = max(range(len(blocks)), key=lambda block: len(blocks[block]), default=0)
+    for block in range(len(blocks)):
+        if block != largest:
+            for symbol in range(alphabet_size):
+                worklist.append((block, symbol))
+                in_worklist.add((block, symbol))
+
+    splitters_processed = 0
+    while worklist:
+        splitters_processed += 1
+        splitter = worklist.popleft()
+        in_worklist.discard(splitter)
+        block, symbol = splitter
+        symbol_inverse = inverse[symbol]
+
+        # Group the states that go into the splitter block by the block they are in
+        touched = {}
+        for target in blocks[block]:
+            for source in symbol_inverse.get(target, ()):
+                touched.setdefault(block_of[source], []).append(source)
+
+        for touched_block, sources in touched.items():
+            members = blocks[touched_block]
+            if len(sources) == len(members):
+                continue    # The whole block goes into the splitter, there is nothing to split
+
+            new_block = len(blocks)
+            new_members = set(sources)
+            members.difference_update(new_members)
+            blocks.append(new_members)
+            for state in new_members:
+                block_of[state] = new_block
+
+            for split_symbol in range(alphabet_size):
+                if (touched_block, split_symbol) in in_worklist:
+                    pending = (new_block, split_symbol)
+                elif len(new_members) <= len(members):
+                    pending = (new_block, split_symbol)
+                else:
+                    pending = (touched_block, split_symbol)
+                worklist.append(pending)
+                in_worklist.add(pending)
+
+    count("splitters_processed", splitters_processed)
+    count("blocks", len(blocks))
+    return block_of
+
+
+def _build_merged_states(states: list, alphabet: tuple, transitions: list, block_of: list) -> list:
+    """
+    Creates a new State for every block of equivalent states, its ID is the concatenation of the IDs of the merged
+    states. Transitions into the implicit reject state (if any) are left out.
+    """
+    merged_states, representatives = _merge_blocks(states, block_of)
+
+    alphabet_size = len(alphabet)
+    for block, merged_state in merged_states.items():
+        offset = representatives[block] * alphabet_size
+
+        for symbol_index, symbol in enumerate(alphabet):
+            target = transitions[offset + symbol_index]
+            if target != -1 and block_of[target] in merged_states:
+                merged_state.transitions[symbol] = [merged_states[block_of[target]]]
+
+    return list(merged_states.values())
+
+
+def _merge_blocks(states: list, block_of: list) -> (dict, dict):
+    """
+    Creates the State (without transitions) of every block of equivalent states, states whose block is None are
+    left out
+    :return: a dict with the State of every block and a dict with the index of a state of every block
+    """
+    merged_states = {}
+    representatives = {}
+
+    for i, state in enumerate(states):
+        block = block_of[i]
+        if block is None:
+            continue
+
+        merged_state = merged_states.get(block)
+
+        if merged_state is None:
+            merged_states[block] = State(state.state_id, is_initial=state.is_initial, is_final=state.is_final)
+            representatives[block] = i
+        else:
+            merged_state.state_id += state.state_id
+            merged_state.is_initial = merged_state.is_initial or state.is_initial
+
+    # Concatenated IDs can clash (1 + 23 and 12 + 3), tell them apart with primes
+    used_ids = set()
+    for merged_state in merged_states.values():
+        while merged_state.state_id in used_ids:
+            merged_state.state_id += "'"
+        used_ids.add(merged_state.state_id)
+
+    return merged_states, representatives
+
+
 def _build_state_map(input_automaton: Automaton):
     state_map = {}
 
@@ -53,9 +754,11 @@ def _build_state_map(input_automaton: Automaton):
 
 
 def _cross_out_redundant_states(state_map: dict) -> dict:
+    sweeps = 0
 
     while True:
         record_was_crossed_out = False
+        sweeps += 1
 
         for key, pair_record in state_map.items():
             if pair_record["isDiscarded"]:
@@ -72,6 +775,8 @@ def _cross_out_redundant_states(state_map: dict) -> dict:
 
         if not record_was_crossed_out:
             break  # We are done now
+
+    count("refinement_sweeps", sweeps)
     return state_map
 
 
@@ -0,0 +1,278 @@
+"""
+Boolean operations over automata with the product construction.
+
+A state of the product of two DFA is a pair (p, q) of a state of each one, and whether it is final depends only on
+whether p and q are final: both of them for the intersection, any of them for the union, p but not q for the
+difference. Only the pairs reachable from the pair of initial states are built. The states that can't reach a final
+state are replaced by the sink, and a pair with a side in the sink is not explored further when the operation can't
+accept it anymore, e.g. any such pair of an intersection. Other pairs that can't reach a final pair, like those of two
+live states whose languages are disjoint, are still explored.
+
+A missing transition goes to an implicit reject (sink) state, which is never final, so partial DFA and DFA with
+different alphabets can be combined. NFA are converted to DFA first.
+"""
+from array import array
+
+from automata.dense_dfa import DenseDFA, accepting_bitmap
+from automata.matcher import is_deterministic, _find_dead_states
+from automata.state_machine import Automaton
+from utils.automata_utils import nfa_2_dfa
+from utils.stats import count, measured
+
+EPSILON = " "
+
+# Whether a pair is final, given whether each of its states is final
+OPERATIONS = {
+    "intersection": lambda final_a, final_b: final_a and final_b,
+    "union": lambda final_a, final_b: final_a or final_b,
+    "difference": lambda final_a, final_b: final_a and not final_b,
+    # The pairs whose states are not compatible (see states_are_compatible), its language is empty when the
+    #  automata are equivalent
+    "symmetric_difference": lambda final_a, final_b: final_a != final_b,
+}
+
+
+def intersect(automaton_a: Automaton, automaton_b: Automaton) -> Automaton:
+    """
+    Builds a DFA that recognizes the strings recognized by both automata
+    """
+    return product(automaton_a, automaton_b, "intersection")
+
+
+def union(automaton_a: Automaton, automaton_b: Automaton) -> Automaton:
+    """
+    Builds a DFA that recognizes the strings recognized by any of the automata
+    """
+    return product(automaton_a, automaton_b, "union")
+
+
+def difference(automaton_a: Automaton, automaton_b: Automaton) -> Automaton:
+    """
+    Builds a DFA that recognizes the strings recognized by automaton_a but not by automaton_b
+    """
+    return product(automaton_a, automaton_b, "difference")
+
+
+def complement(automaton: Automaton, alphabet: tuple = None) -> Automaton:
+    """
+    Builds a DFA that recognizes the strings over the alphabet that the automaton doesn't recognize.
+    :param automaton: a DFA (it may be partial) or a NFA
+    :param alphabet: the symbols of the strings to consider, the alphabet of the automaton if None. The symbols of
+                     the automaton are always included
+    :return: the complement as a DF Automaton
+    """
+    return product(universal_automaton(tuple(alphabet or ()) + automaton.alphabet), automaton, "difference")
+
+
+def universal_automaton(alphabet: tuple) -> Automaton:
+    """
+    Builds the DFA of a single final state that recognizes every string over the alphabet
+    """
+    alphabet = tuple(sorted(set(alphabet) - {EPSILON}))
+    dfa = DenseDFA(["ALL"], alphabet, array("i", [0] * len(alphabet)), accepting_bitmap([True]))
+
+    return dfa.to_automaton()
+
+
+@measured("product")
+def product(automaton_a: Automaton, automaton_b: Automaton, operation: str) -> Automaton:
+    """
+    Builds the reachable part of the product of two automata.
+
+    The pairs are named P0, P1, ... in the order they are found and all of the pairs from which no final pair can be
+    reached are merged into a LIMBO state, which is only added if some pair needs it. The result is a complete DFA,
+    so it can be given to minimize_automaton as it is.
+    :param automaton_a: a DFA (it may be partial) or a NFA
+    :param automaton_b: another DFA or NFA
+    :param operation: one of the OPERATIONS: intersection, union, difference or symmetric_difference
+    :return: the product as a DF Automaton
+    """
+    space = _ProductSpace(automaton_a, automaton_b, operation)
+    alphabet_size = len(space.alphabet)
+
+    initial_pair = space.initial_pair()
+    pairs = [] if space.is_dead(initial_pair) else [initial_pair]
+    pair_index = {pair: i for i, pair in enumerate(pairs)}
+    transitions = array("i")
+    has_limbo = not pairs
+
+    # The pairs list doubles as the queue of pairs whose transitions are pending
+    for pair in pairs:
+        for target_pair in space.successors(pair):
+            if space.is_dead(target_pair):
+                transitions.append(-1)
+                has_limbo = True
+                continue
+
+            target = pair_index.get(target_pair)
+            if target is None:
+                target = len(pairs)
+                pair_index[target_pair] = target
+                pairs.append(target_pair)
+            transitions.append(target)
+
+    state_ids = ["P{}".format(i) for i in range(len(pairs))]
+    finals = [space.is_final(pair) for pair in pairs]
+    if has_limbo:
+        limbo = len(pairs)
+        state_ids.append("LIMBO")
+        finals.append(False)
+        transitions = array("i", (limbo if target == -1 else target for target in transitions))
+        transitions.extend([limbo] * alphabet_size)
+
+    count("product_pairs", len(pairs))
+
+    return DenseDFA(state_ids, space.alphabet, transitions, accepting_bitmap(finals)).to_automaton()
+
+
+@measured("product_search")
+def find_product_string(automaton_a: Automaton, automaton_b: Automaton, operation: str):
+    """
+    Finds a shortest string recognized by the product of two automata, without building it: the pairs are explored
+    breadth first and the search stops at the first final pair.
+    :param automaton_a: a DFA (it may be partial) or a NFA
+    :param automaton_b: another DFA or NFA
+    :param operation: one of the OPERATIONS
+    :return: the string, with its symbols joined, or None if the language of the product is empty
+    """
+    space = _ProductSpace(automaton_a, automaton_b, operation)
+
+    initial_pair = space.initial_pair()
+    if space.is_dead(initial_pair):
+        return None
+
+    # For every pair found, the pair it was reached from and the number of the symbol, to rebuild the string
+    reached_from = {initial_pair: None}
+    pairs = [initial_pair]
+
+    for pair in pairs:
+        if space.is_final(pair):
+            count("product_pairs", len(reached_from))
+            return space.string_to(pair, reached_from)
+
+        for symbol, target_pair in enumerate(space.successors(pair)):
+            if target_pair not in reached_from and not space.is_dead(target_pair):
+                reached_from[target_pair] = (pair, symbol)
+                pairs.append(target_pair)
+
+    count("product_pairs", len(reached_from))
+    return None
+
+
+def is_empty(automaton: Automaton) -> bool:
+    """
+    Tells whether an automaton recognizes no string at all
+    """
+    return find_product_string(automaton, universal_automaton(automaton.alphabet), "intersection") is None
+
+
+def intersection_is_empty(automaton_a: Automaton, automaton_b: Automaton) -> bool:
+    """
+    Tells whether no string is recognized by both automata, stopping as soon as one is found
+    """
+    return find_product_string(automaton_a, automaton_b, "intersection") is None
+
+
+def is_subset(automaton_a: Automaton, automaton_b: Automaton) -> bool:
+    """
+    Tells whether every string recognized by automaton_a is recognized by automaton_b, stopping as soon as a string
+    that is not is found
+    """
+    return find_product_string(automaton_a, automaton_b, "difference") is None
+
+
+class _ProductSpace:
+    """
+    The pairs of the product of two DFA, which are explored on demand.
+
+    A pair is a tuple (p, q) of state numbers of the DenseDFA of each automaton, where -1 is the sink. The states
+    that can't reach a final state behave like the sink from then on, so they are replaced by it and the product has
+    fewer pairs. Only the pairs with a side in the sink are known to be dead, see is_dead.
+    """
+    def __init__(self, automaton_a: Automaton, automaton_b: Automaton, operation: str):
+        if operation not in OPERATIONS:
+            raise ValueError("Unknown operation '{}', it must be one of {}".format(operation, ", ".join(OPERATIONS)))
+
+        self.accepts = OPERATIONS[operation]
+        self.dfa_a = _to_dense_dfa(automaton_a)
+        self.dfa_b = _to_dense_dfa(automaton_b)
+        self.alphabet = tuple(sorted(set(self.dfa_a.alphabet) | set(self.dfa_b.alphabet)))
+        self.dead_a = _find_dead_states(self.dfa_a)
+        self.dead_b = _find_dead_states(self.dfa_b)
+
+        # The targets of every state for every symbol of the joint alphabet, with the dead states mapped to -1
+        self.targets_a = _targets_by_symbol(self.dfa_a, self.dead_a, self.alphabet)
+        self.targets_b = _targets_by_symbol(self.dfa_b, self.dead_b, self.alphabet)
+
+        # With a side in the sink, whether the pair can still be final depends only on the other side. A live state
+        #  can reach a final state and maybe non final ones, a state in the sink is never final again
+        self.dead_with_sink_a = not (self.accepts(False, True) or self.accepts(False, False))
+        self.dead_with_sink_b = not (self.accepts(True, False) or self.accepts(False, False))
+        self.dead_with_sinks = not self.accepts(False, False)
+
+    def initial_pair(self) -> tuple:
+        initial_a, initial_b = self.dfa_a.initial_state, self.dfa_b.initial_state
+        return (-1 if self.dead_a[initial_a] else initial_a,
+                -1 if self.dead_b[initial_b] else initial_b)
+
+    def successors(self, pair: tuple):
+        """
+        The pairs reached from a pair with every symbol of the alphabet, in order
+        """
+        return zip(self.targets_a[pair[0]], self.targets_b[pair[1]])
+
+    def is_final(self, pair: tuple) -> bool:
+        p, q = pair
+        return bool(self.accepts(p >= 0 and self.dfa_a.is_final(p), q >= 0 and self.dfa_b.is_final(q)))
+
+    def is_dead(self, pair: tuple) -> bool:
+        """
+        Tells whether a pair is known to reach no final pair, which is only the case when a side is in the sink and the
+        operation can't accept with what the other side can still reach. A pair of two live states is never dead for
+        this method, even if none of the pairs it reaches is final
+        """
+        p, q = pair
+        if p < 0 and q < 0:
+            return self.dead_with_sinks
+        if p < 0:
+            return self.dead_with_sink_a
+        if q < 0:
+            return self.dead_with_sink_b
+        return False
+
+    def string_to(self, pair: tuple, reached_from: dict) -> str:
+        symbols = []
+
+        while reached_from[pair] is not None:
+            pair, symbol = reached_from[pair]
+            symbols.append(self.alphabet[symbol])
+
+        return "".join(reversed(symbols))
+
+
+def _to_dense_dfa(automaton: Automaton) -> DenseDFA:
+    if not is_deterministic(automaton):
+        automaton = nfa_2_dfa(automaton)
+
+    return DenseDFA.from_automaton(automaton)
+
+
+def _targets_by_symbol(dfa: DenseDFA, dead: bytearray, alphabet: tuple) -> dict:
+    """
+    Maps every state of the DFA, and the sink (-1), to the list of its targets for every symbol of the alphabet.
+    Missing transitions, symbols out of the alphabet of the DFA and dead states give -1
+    """
+    symbol_indexes = dfa.symbol_indexes()
+    columns = [symbol_indexes.get(symbol, -1) for symbol in alphabet]
+    transitions, alphabet_size = dfa.transitions, dfa.alphabet_size
+
+    targets = {-1: [-1] * len(alphabet)}
+    for state in range(dfa.state_count):
+        row = state * alphabet_size
+        state_targets = []
+        for column in columns:
+            target = transitions[row + column] if column >= 0 else -1
+            state_targets.append(-1 if target == -1 or dead[target] else target)
+        targets[state] = state_targets
+
+    return targets
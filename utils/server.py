@@ -0,0 +1,418 @@
+"""
+A long-running service that minimizes, determinizes, compares and matches automata over a local socket, so that
+clients don't pay for starting Python and parsing the same automata on every call.
+
+    python3 -m utils.server [--socket PATH | --host HOST --port N] [--workers N]
+
+The protocol is one JSON object per line in each direction. A request has an "id", which the response repeats so
+that many requests can be in flight on the same connection, an "op" and the fields of the operation:
+
+    load         {"automaton": TXT}                      -> {"automaton_id": ID, "states": N}
+    minimize     {"automaton": TXT or "automaton_id": ID} -> {"automaton_id": ID, "automaton": TXT, "states": N}
+    determinize  {"automaton": TXT or "automaton_id": ID} -> {"automaton_id": ID, "automaton": TXT, "states": N}
+    equivalent   {"a": {...}, "b": {...}}                 -> {"equivalent": bool, "counterexample": str or null}
+    match        {"automaton": TXT or "automaton_id": ID, "strings": [str, ...]} -> {"matches": [bool, ...]}
+    stats        {}                                       -> the counters of the server
+
+TXT is an automaton in Byron TXT format and ID is its cache_key. The response is {"id": ..., "result": {...}} or
+{"id": ..., "error": "..."}. The automata are kept by ID (the least recently used ones are dropped first) together
+with their compiled matcher and the IDs of their minimized and determinized versions. Match requests that arrive
+together for the same automaton are run as one batch, and minimizations and determinizations of automata bigger
+than inline_max_states run in a pool of processes so the event loop never stalls. For the same reason the automata
+sent inline are parsed in a thread, and so are the match batches longer than INLINE_MAX_MATCH_CHARS.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from automata.dense_dfa import DenseDFA
+from automata.matcher import compile_automaton
+from automata.state_machine import Automaton
+from utils.automata_utils import is_dfa, nfa_2_dfa
+from utils.cache import cache_key
+from utils.file_utils import deserialize_automaton_str, serialize_automaton
+from utils.minimizer import minimize_automaton
+from utils.product import find_product_string
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7401
+DEFAULT_MAX_AUTOMATA = 256
+# Smaller automata are processed in the event loop, sending them to a worker costs more than the work itself
+INLINE_MAX_STATES = 200
+# Match batches with more characters than this are matched in a thread, so that the event loop keeps answering
+INLINE_MAX_MATCH_CHARS = 64 * 1024
+MAX_MESSAGE_BYTES = 256 * 1024 * 1024
+
+
+class AutomataServer:
+    """
+    Serves the requests of the module docstring, see start() and handle_request()
+    :param workers: how many processes minimize and determinize, os.cpu_count() if None
+    :param max_automata: how many automata are kept loaded
+    :param inline_max_states: automata with more states than this are minimized and determinized by the workers
+    :param max_cached_states: how many DFA states the matcher of a NFA can keep, see LazyDFAMatcher
+    """
+    def __init__(self, workers: int = None, max_automata: int = DEFAULT_MAX_AUTOMATA,
+                 inline_max_states: int = INLINE_MAX_STATES, max_cached_states: int = 10000):
+        if max_automata < 1:
+            raise ValueError("The server must keep at least 1 automaton but max_automata is {}".format(max_automata))
+
+        self.max_automata = max_automata
+        self.inline_max_states = inline_max_states
+        self.max_cached_states = max_cached_states
+        self.stats = Counter()
+
+        self._workers = workers
+        self._executor = None   # Started the first time an automaton is too big to be processed inline
+        self._automata = OrderedDict()      # ID -> _LoadedAutomaton, the least recently used first
+        self._match_batches = {}            # ID -> list of (strings, future) waiting to be matched
+        self._servers = []
+
+        self._operations = {
+            "load": self._load_request,
+            "minimize": lambda request: self._derive_request(request, "minimize"),
+            "determinize": lambda request: self._derive_request(request, "determinize"),
+            "equivalent": self._equivalent_request,
+            "match": self._match_request,
+            "stats": self._stats_request,
+        }
+
+    async def start(self, path: str = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> asyncio.Server:
+        """
+        Starts listening on a Unix socket if path is given, or on a TCP port otherwise (0 picks a free one)
+        :return: the asyncio.Server, e.g. to find out the port with server.sockets[0].getsockname()
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self._serve_connection, path, limit=MAX_MESSAGE_BYTES)
+        else:
+            server = await asyncio.start_server(self._serve_connection, host, port, limit=MAX_MESSAGE_BYTES)
+
+        self._servers.append(server)
+        return server
+
+    async def close(self):
+        """
+        Stops listening and stops the workers
+        """
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def handle_request(self, request: dict) -> dict:
+        """
+        Runs a request and builds its response, errors are reported in the response rather than raised
+        """
+        self.stats["requests"] += 1
+        response = {"id": request.get("id")}
+
+        try:
+            operation = self._operations.get(request.get("op"))
+            if operation is None:
+                raise ValueError("Unknown operation '{}', it must be one of {}"
+                                 .format(request.get("op"), ", ".join(self._operations)))
+
+            response["result"] = await operation(request)
+        except Exception as e:
+            self.stats["errors"] += 1
+            response["error"] = "{}: {}".format(type(e).__name__, e)
+
+        return response
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Every request runs in a task of its own, so a slow minimization doesn't hold back the requests behind it
+        #  and the responses are written as they are ready
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(request: dict):
+            response = await self.handle_request(request)
+            await _write_message(writer, write_lock, response)
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object")
+                except ValueError as e:
+                    self.stats["errors"] += 1
+                    await _write_message(writer, write_lock, {"id": None, "error": "ValueError: {}".format(e)})
+                    continue
+
+                task = asyncio.ensure_future(respond(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, ValueError):
+            pass    # The client went away or sent a line longer than MAX_MESSAGE_BYTES
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def _load_request(self, request: dict) -> dict:
+        automaton_id, loaded = await self._get_automaton(request)
+        return {"automaton_id": automaton_id, "states": len(loaded.automaton.states)}
+
+    async def _derive_request(self, request: dict, operation: str) -> dict:
+        """
+        Minimizes or determinizes an automaton. The result is loaded too and its ID is remembered, so asking again
+        for the same automaton, even while the first request is still running, doesn't repeat the work
+        """
+        automaton_id, loaded = await self._get_automaton(request)
+
+        task = loaded.derived.get(operation)
+        if task is not None and task.done() and (task.cancelled() or task.exception() is not None):
+            task = None     # Try again after a failure
+
+        if task is None:
+            task = asyncio.ensure_future(self._derive(loaded, operation))
+            loaded.derived[operation] = task
+        else:
+            self.stats["derived_hits"] += 1
+
+        # The result may have been dropped since the task finished, it is loaded again then
+        result_id, result = await asyncio.shield(task)
+        if result_id in self._automata:
+            self._automata.move_to_end(result_id)
+        else:
+            result = self._keep_automaton(result_id, result)
+
+        return {"automaton_id": result_id, "automaton": result.text, "states": len(result.automaton.states)}
+
+    async def _derive(self, loaded: "_LoadedAutomaton", operation: str) -> tuple:
+        function = _minimize if operation == "minimize" else _determinize
+        dfa = await self._run(function, loaded)
+
+        # Building the State objects, the text and the ID of a big result takes a while too
+        automaton, text, automaton_id = await asyncio.get_running_loop().run_in_executor(None, _describe_dfa, dfa)
+        return automaton_id, self._keep_automaton(automaton_id, _LoadedAutomaton(automaton, text))
+
+    async def _equivalent_request(self, request: dict) -> dict:
+        _, loaded_a = await self._get_automaton(_field(request, "a", dict))
+        _, loaded_b = await self._get_automaton(_field(request, "b", dict))
+
+        counterexample = await self._run(_find_difference, loaded_a, loaded_b)
+        return {"equivalent": counterexample is None, "counterexample": counterexample}
+
+    async def _match_request(self, request: dict) -> dict:
+        strings = _field(request, "strings", list)
+        if not all(isinstance(input_string, str) for input_string in strings):
+            raise TypeError("The strings to match must be JSON strings")
+
+        automaton_id, loaded = await self._get_automaton(request)
+
+        # The requests for the same automaton that arrive before the batch runs join it, the batch runs as soon as
+        #  the event loop is done with what it has at hand
+        batch = self._match_batches.get(automaton_id)
+        if batch is None:
+            batch = self._match_batches[automaton_id] = []
+            asyncio.ensure_future(self._run_match_batch(automaton_id, loaded))
+
+        future = asyncio.get_running_loop().create_future()
+        batch.append((strings, future))
+
+        return {"matches": await future}
+
+    async def _run_match_batch(self, automaton_id: str, loaded: "_LoadedAutomaton"):
+        batch = self._match_batches.pop(automaton_id)
+        string_lists = [strings for strings, _ in batch]
+
+        try:
+            # The matcher of a NFA changes as it matches, so the batches of an automaton take turns
+            async with loaded.match_lock:
+                chars = sum(len(input_string) for strings in string_lists for input_string in strings)
+                if chars > INLINE_MAX_MATCH_CHARS or (loaded.matcher is None and
+                                                      len(loaded.automaton.states) > self.inline_max_states):
+                    self.stats["offloaded_matches"] += 1
+                    results = await asyncio.get_running_loop().run_in_executor(
+                        None, self._match_strings, loaded, string_lists)
+                else:
+                    results = self._match_strings(loaded, string_lists)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["match_batches"] += 1
+        for (strings, future), matches in zip(batch, results):
+            self.stats["strings_matched"] += len(strings)
+            if not future.done():   # Its request may have been cancelled
+                future.set_result(matches)
+
+    def _match_strings(self, loaded: "_LoadedAutomaton", string_lists: list) -> list:
+        if loaded.matcher is None:
+            loaded.matcher = compile_automaton(loaded.automaton, self.max_cached_states)
+
+        # The strings of every request are matched together, a DFAMatcher advances all of them at once with numpy
+        accepted = iter(loaded.matcher.accepts_many([input_string for strings in string_lists
+                                                     for input_string in strings]))
+        return [[bool(next(accepted)) for _ in strings] for strings in string_lists]
+
+    async def _stats_request(self, request: dict) -> dict:
+        return dict(self.stats, automata=len(self._automata))
+
+    async def _get_automaton(self, request: dict) -> tuple:
+        """
+        Finds the automaton of a request by its "automaton_id", or loads the one in its "automaton" field. Parsing
+        and hashing the automaton is done in a thread, so that big automata don't hold back the other connections
+        :return: the ID and the _LoadedAutomaton
+        """
+        if "automaton_id" in request:
+            automaton_id = _field(request, "automaton_id", str)
+            loaded = self._automata.get(automaton_id)
+            if loaded is None:
+                raise LookupError("There is no automaton with ID {}, it must be loaded again".format(automaton_id))
+
+            self._automata.move_to_end(automaton_id)
+            return automaton_id, loaded
+
+        text = _field(request, "automaton", str)
+        automaton, automaton_id = await asyncio.get_running_loop().run_in_executor(None, _read_automaton, text)
+        return automaton_id, self._keep_automaton(automaton_id, _LoadedAutomaton(automaton, text))
+
+    def _keep_automaton(self, automaton_id: str, loaded: "_LoadedAutomaton") -> "_LoadedAutomaton":
+        """
+        Adds an automaton to the loaded ones, unless it is already there
+        :return: the _LoadedAutomaton kept for the ID
+        """
+        kept = self._automata.get(automaton_id)
+        if kept is not None:
+            self.stats["automata_hits"] += 1
+            self._automata.move_to_end(automaton_id)
+            return kept
+
+        self.stats["automata_loaded"] += 1
+        self._automata[automaton_id] = loaded
+        while len(self._automata) > self.max_automata:
+            self._automata.popitem(last=False)
+            self.stats["automata_dropped"] += 1
+
+        return loaded
+
+    async def _run(self, function, *loaded_automata: "_LoadedAutomaton"):
+        """
+        Calls a function with the automata, in a worker process if any of them is bigger than inline_max_states. The
+        workers get the automata as Byron TXT, which is much cheaper to send than State objects
+        """
+        if all(len(loaded.automaton.states) <= self.inline_max_states for loaded in loaded_automata):
+            return function(*(loaded.automaton for loaded in loaded_automata))
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self._workers)
+
+        self.stats["offloaded"] += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, _run_on_text, function, *(loaded.text for loaded in loaded_automata))
+
+
+class _LoadedAutomaton:
+    __slots__ = ("automaton", "text", "matcher", "match_lock", "derived")
+
+    def __init__(self, automaton: Automaton, text: str):
+        self.automaton = automaton
+        self.text = text
+        self.matcher = None     # Compiled the first time it is matched against
+        self.match_lock = asyncio.Lock()
+        self.derived = {}       # minimize/determinize -> the task that finds the ID and _LoadedAutomaton of the result
+
+
+def _field(request: dict, name: str, field_type: type):
+    value = request.get(name)
+    if not isinstance(value, field_type):
+        raise TypeError("The request must have a '{}' field of type {}".format(name, field_type.__name__))
+
+    return value
+
+
+async def _write_message(writer: asyncio.StreamWriter, lock: asyncio.Lock, message: dict):
+    async with lock:
+        writer.write(json.dumps(message, separators=(",", ":")).encode("utf-8") + b"\n")
+        await writer.drain()
+
+
+def _read_automaton(text: str) -> tuple:
+    automaton = deserialize_automaton_str(text)
+    return automaton, cache_key(automaton)
+
+
+def _describe_dfa(dfa: DenseDFA) -> tuple:
+    automaton = dfa.to_automaton()
+    return automaton, serialize_automaton(automaton), cache_key(automaton)
+
+
+# The functions run by the workers must be module level functions, they get the automata in Byron TXT format and
+#  return DenseDFA, which are cheap to send back
+
+def _run_on_text(function, *texts: str):
+    return function(*(deserialize_automaton_str(text) for text in texts))
+
+
+def _minimize(automaton: Automaton) -> DenseDFA:
+    return DenseDFA.from_automaton(minimize_automaton(automaton))
+
+
+def _determinize(automaton: Automaton) -> DenseDFA:
+    return DenseDFA.from_automaton(automaton if is_dfa(automaton) else nfa_2_dfa(automaton))
+
+
+def _find_difference(automaton_a: Automaton, automaton_b: Automaton):
+    return find_product_string(automaton_a, automaton_b, "symmetric_difference")
+
+
+async def serve(path: str = None, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **options):
+    """
+    Runs an AutomataServer until the task is cancelled, the options are the arguments of AutomataServer
+    """
+    automata_server = AutomataServer(**options)
+    server = await automata_server.start(path, host, port)
+
+    try:
+        await server.serve_forever()
+    finally:
+        await automata_server.close()
+
+
+def _parse_args(argv: list) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serves minimization and matching of automata over a local socket")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="the TCP address to listen on ({})".format(DEFAULT_HOST))
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="the TCP port ({})".format(DEFAULT_PORT))
+    parser.add_argument("--workers", type=int, help="how many processes minimize big automata (all the CPUs)")
+    parser.add_argument("--max-automata", type=int, default=DEFAULT_MAX_AUTOMATA,
+                        help="how many automata are kept loaded, the least recently used are dropped first")
+    parser.add_argument("--inline-max-states", type=int, default=INLINE_MAX_STATES,
+                        help="bigger automata are minimized by the workers")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    print("Listening on {}...".format(args.socket or "{}:{}".format(args.host, args.port)))
+
+    try:
+        asyncio.run(serve(args.socket, args.host, args.port, workers=args.workers, max_automata=args.max_automata,
+                          inline_max_states=args.inline_max_states))
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Instrumentation of the phases of the minimizer (parsing, epsilon removal, determinization, refinement, ...).
+
+The instrumented code marks its phases with `with phase("name"):` or `@measured("name")` and reports algorithm
+counters with `count("name", amount)`. Nothing is recorded unless a collection was started with
+`with collect_stats() as stats:`. While it is disabled, phase() returns a shared no-op context manager and count()
+returns right away, so the instrumentation costs a global lookup per call. Counters are reported once per phase
+with their totals, never from inside the hot loops.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+_collector = None
+
+
+class PhaseStats:
+    """
+    What was measured for a phase: its name, the name of the phase it ran in (or None), the wall time in seconds,
+    the peak of memory allocated during the phase in bytes (None if memory was not traced) and its counters
+    """
+    def __init__(self, name: str, parent: str = None):
+        self.name = name
+        self.parent = parent
+        self.seconds = 0.0
+        self.peak_bytes = None
+        self.counters = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "seconds": self.seconds,
+            "peak_bytes": self.peak_bytes,
+            "counters": dict(self.counters),
+        }
+
+
+class StatsCollector:
+    """
+    Collects the PhaseStats of the phases run while it is active, in the order the phases started.
+
+    The tracemalloc peak is global, so it is reset whenever a phase starts or ends, and before every reset the peak so
+    far is handed to all of the phases that are running. This way nested phases each get their own peak.
+    Counters reported outside of any phase go to a phase named "total".
+    """
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.phases = []
+        self._running = []     # A stack of [PhaseStats, start time, traced memory at the start, highest peak]
+        self._unphased = None
+
+    def start_phase(self, name: str):
+        parent = self._running[-1][0].name if self._running else None
+        phase_stats = PhaseStats(name, parent)
+        self.phases.append(phase_stats)
+
+        current_bytes = self._flush_peak()
+        self._running.append([phase_stats, time.perf_counter(), current_bytes, current_bytes])
+
+    def end_phase(self):
+        phase_stats, start, start_bytes, _ = self._running[-1]
+        phase_stats.seconds = time.perf_counter() - start
+
+        self._flush_peak()
+        if self.trace_memory:
+            phase_stats.peak_bytes = self._running[-1][3] - start_bytes
+        self._running.pop()
+
+    def count(self, name: str, amount: int = 1):
+        if self._running:
+            counters = self._running[-1][0].counters
+        else:
+            if self._unphased is None:
+                self._unphased = PhaseStats("total")
+                self.phases.append(self._unphased)
+            counters = self._unphased.counters
+
+        counters[name] = counters.get(name, 0) + amount
+
+    def to_list(self) -> list:
+        return [phase_stats.to_dict() for phase_stats in self.phases]
+
+    def _flush_peak(self) -> int:
+        if not self.trace_memory:
+            return 0
+
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        for running in self._running:
+            running[3] = max(running[3], peak_bytes)
+        tracemalloc.reset_peak()
+
+        return current_bytes
+
+
+class _Phase:
+    """
+    The context manager returned by phase() while stats are being collected
+    """
+    __slots__ = ("collector", "name")
+
+    def __init__(self, collector: StatsCollector, name: str):
+        self.collector = collector
+        self.name = name
+
+    def __enter__(self):
+        self.collector.start_phase(self.name)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.collector.end_phase()
+
+
+class _NoPhase:
+    """
+    The context manager returned by phase() while stats are not being collected, it does nothing
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str):
+    """
+    Marks a phase of the pipeline, use it as `with phase("refinement"):`
+    """
+    if _collector is None:
+        return _NO_PHASE
+
+    return _Phase(_collector, name)
+
+
+def measured(name: str):
+    """
+    A decorator that runs every call of the function as a phase
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _collector is None:
+                return function(*args, **kwargs)
+
+            with _Phase(_collector, name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, amount: int = 1):
+    """
+    Adds amount to the counter name of the phase that is running
+    """
+    if _collector is not None:
+        _collector.count(name, amount)
+
+
+def is_collecting() -> bool:
+    """
+    Tells whether stats are being collected, for counters that are expensive to calculate
+    """
+    return _collector is not None
+
+
+@contextmanager
+def collect_stats(trace_memory: bool = True):
+    """
+    Collects the stats of the phases run inside the with block.
+    :param trace_memory: record the peak memory of every phase with tracemalloc, which makes the code slower
+    :return: the StatsCollector, its phases can be read once the with block is done
+    """
+    global _collector
+
+    previous_collector = _collector
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    _collector = StatsCollector(trace_memory)
+    try:
+        yield _collector
+    finally:
+        _collector = previous_collector
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def format_stats_table(phases: list) -> str:
+    """
+    Formats the phases of a StatsCollector.to_list() as a text table, nested phases are indented under their parent
+    """
+    lines = ["{:<32} {:>10} {:>14}  {}".format("phase", "seconds", "peak bytes", "counters")]
+    depth = {}
+
+    for phase_stats in phases:
+        level = depth.get(phase_stats["parent"], -1) + 1 if phase_stats["parent"] else 0
+        depth[phase_stats["name"]] = level
+
+        peak_bytes = phase_stats["peak_bytes"]
+        counters = ", ".join("{}={}".format(name, value) for name, value in phase_stats["counters"].items())
+        lines.append("{:<32} {:>10.4f} {:>14}  {}".format("  " * level + phase_stats["name"], phase_stats["seconds"],
+                                                          "-" if peak_bytes is None else peak_bytes, counters))
+
+    return "\n".join(lines)
+
+
+def format_stats_json(phases: list) -> str:
+    return json.dumps({"phases": phases}, indent=2)